@@ -4,6 +4,7 @@ Main API endpoints for the Gukas AI Agent with memory system.
 another one
 """
 
+import asyncio
 import logging
 import uuid
 from datetime import datetime
@@ -12,7 +13,8 @@ from dataclasses import asdict
 
 from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
 from app.config import settings
 from app.models import (
@@ -22,9 +24,11 @@ from app.models import (
 )
 from app.services import agent_service, context_service
 from app.database import db_manager
+from app.clients import shared_client
+from app.llm_client import cerebras_client
 from app.services.embedding import vector_memory_service
 from app.services.memory import memory_service
-from app.services.document_service import document_service
+from app.services.document_service import document_service, decode_document_cursor, encode_document_cursor
 from app.services.weather_service import weather_service
 from app.services.disease_detection import disease_detection_service
 
@@ -33,15 +37,23 @@ logging.basicConfig(
     level=getattr(logging, settings.log_level.upper()),
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
+logging.getLogger("app.services.agent_service").setLevel(
+    getattr(logging, settings.agent_log_level.upper())
+)
 logger = logging.getLogger(__name__)
 
+# Final line of a /chat/stream body whose generation failed part-way; the
+# status code is already 200 by then, so clients must check for this marker
+STREAM_ERROR_SENTINEL = "\n[stream-error] The response was interrupted, please try again.\n"
+
 # Create FastAPI application
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
     description="AI-powered coffee farming assistant for Kenyan farmers with memory",
     docs_url="/docs" if settings.debug else None,
-    redoc_url="/redoc" if settings.debug else None
+    redoc_url="/redoc" if settings.debug else None,
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -51,6 +63,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Session-ID"],  # Session ID of streamed chat responses
 )
 
 # Include memory intelligence router
@@ -70,6 +83,9 @@ async def startup_event():
         logger.info("Initializing document service...")
         await document_service.initialize()
         
+        # Warm the LLM connection pool without delaying startup
+        app.state.llm_warm_up = asyncio.create_task(cerebras_client.warm_up())
+        
         logger.info("All services initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize services: {e}")
@@ -80,11 +96,16 @@ async def startup_event():
 async def shutdown_event():
     """Clean up resources on shutdown."""
     try:
+        logger.info("Flushing buffered memory writes...")
+        await vector_memory_service.flush()
         logger.info("Closing database connections...")
         await db_manager.close()
-        logger.info("Shutdown complete")
     except Exception as e:
         logger.error(f"Error during shutdown: {e}")
+    finally:
+        logger.info("Closing shared HTTP client...")
+        await shared_client.aclose()
+        logger.info("Shutdown complete")
 
 
 @app.exception_handler(Exception)
@@ -93,7 +114,7 @@ async def global_exception_handler(request: Request, exc: Exception):
     request_id = str(uuid.uuid4())
     logger.error(f"Unhandled exception [{request_id}]: {str(exc)}", exc_info=True)
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content=ErrorResponse(
             error="Internal server error",
@@ -167,88 +188,116 @@ async def health_check():
         )
 
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
-    """
-    Main chat endpoint for farmer interactions with memory.
-    Processes messages and returns AI-generated responses with context.
+async def _enhance_chat_request(request: ChatRequest, session_id: Optional[str] = None) -> ChatRequest:
     """
-    try:
-        logger.info(f"Received chat request from user: {request.user_id}")
-        
-        # Get or create user profile
-        if request.user_id:
-            await memory_service.get_or_create_user_profile(request.user_id)
+    Load the user profile and attach relevant memories and documents to a chat request.
+    
+    Args:
+        request: Incoming chat request
+        session_id: Session identifier to use instead of the request's own
         
-        # Search for relevant memories
-        relevant_memories = []
-        if request.user_id and request.message:
-            relevant_memories = await memory_service.search_relevant_memories(
-                user_id=request.user_id,
-                query_text=request.message,
-                limit=3,
-                similarity_threshold=0.7,
-                exclude_session=request.session_id
-            )
+    Returns:
+        Chat request with memory and document context added
+    """
+    # Get or create user profile
+    if request.user_id:
+        await memory_service.get_or_create_user_profile(request.user_id)
+    
+    # Search for relevant memories
+    relevant_memories = []
+    if request.user_id and request.message:
+        relevant_memories = await memory_service.search_relevant_memories(
+            user_id=request.user_id,
+            query_text=request.message,
+            limit=3,
+            similarity_threshold=0.7,
+            exclude_session=request.session_id
+        )
+    
+    # Search for relevant documents (RAG)
+    relevant_documents = []
+    if request.message:
+        # Search in user's documents first, then fall back to general knowledge
+        relevant_documents = await document_service.search_documents(
+            query=request.message,
+            user_id=request.user_id,
+            limit=3,
+            similarity_threshold=0.3
+        )
         
-        # Search for relevant documents (RAG)
-        relevant_documents = []
-        if request.message:
-            # Search in user's documents first, then fall back to general knowledge
+        # If no user-specific documents found, search globally
+        if not relevant_documents:
             relevant_documents = await document_service.search_documents(
                 query=request.message,
-                user_id=request.user_id,
+                user_id=None,  # Search all documents
                 limit=3,
                 similarity_threshold=0.3
             )
-            
-            # If no user-specific documents found, search globally
-            if not relevant_documents:
-                relevant_documents = await document_service.search_documents(
-                    query=request.message,
-                    user_id=None,  # Search all documents
-                    limit=3,
-                    similarity_threshold=0.3
-                )
-        
-        # Add memory and document context to request
-        enhanced_context = {
-            **(request.context or {}),
-            "relevant_memories": relevant_memories,
-            "relevant_documents": relevant_documents
-        }
+    
+    # Add memory and document context to request
+    enhanced_context = {
+        **(request.context or {}),
+        "relevant_memories": relevant_memories,
+        "relevant_documents": relevant_documents
+    }
+    
+    # Create enhanced request
+    return ChatRequest(
+        message=request.message,
+        user_id=request.user_id,
+        session_id=session_id or request.session_id,
+        context=enhanced_context
+    )
+
+
+async def _store_chat_exchange(user_id: Optional[str], user_message: str, response: ChatResponse):
+    """
+    Store a user message and the agent's reply in conversation memory.
+    
+    Args:
+        user_id: User identifier; nothing is stored for anonymous requests
+        user_message: The farmer's message
+        response: The agent's reply
+    """
+    if not user_id:
+        return
+    
+    # Store user message in memory
+    await memory_service.store_conversation_message(
+        session_id=response.session_id,
+        user_id=user_id,
+        message_type="user",
+        content=user_message,
+        metadata={"timestamp": datetime.utcnow().isoformat()}
+    )
+    
+    # Store agent response in memory
+    await memory_service.store_conversation_message(
+        session_id=response.session_id,
+        user_id=user_id,
+        message_type="assistant",
+        content=response.response,
+        tokens_used=response.tokens_used,
+        model_used=response.model_used,
+        metadata={"timestamp": response.timestamp.isoformat()}
+    )
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(request: ChatRequest):
+    """
+    Main chat endpoint for farmer interactions with memory.
+    Processes messages and returns AI-generated responses with context.
+    """
+    try:
+        logger.info(f"Received chat request from user: {request.user_id}")
         
-        # Create enhanced request
-        enhanced_request = ChatRequest(
-            message=request.message,
-            user_id=request.user_id,
-            session_id=request.session_id,
-            context=enhanced_context
-        )
+        enhanced_request = await _enhance_chat_request(request)
         
         # Process the chat message with memory context
         response = await agent_service.process_chat_message(enhanced_request)
         
-        # Store user message in memory
-        if request.user_id:
-            await memory_service.store_conversation_message(
-                session_id=response.session_id,
-                user_id=request.user_id,
-                message_type="user",
-                content=request.message,
-                metadata={"timestamp": datetime.utcnow().isoformat()}
-            )
-            
-            # Store agent response in memory
-            await memory_service.store_conversation_message(
-                session_id=response.session_id,
-                user_id=request.user_id,
-                message_type="assistant",
-                content=response.response,
-                tokens_used=response.tokens_used,
-                model_used=response.model_used,
-                metadata={"timestamp": response.timestamp.isoformat()}
-            )
+        await _store_chat_exchange(request.user_id, request.message, response)
         
         return response
         
@@ -260,6 +309,57 @@ async def chat_endpoint(request: ChatRequest):
         )
 
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Streaming variant of the chat endpoint.
+    Sends response text as it is generated; the session ID is returned in the
+    X-Session-ID header and the exchange is stored once the stream completes.
+    If generation fails mid-stream the body ends with STREAM_ERROR_SENTINEL
+    and nothing is stored.
+    """
+    try:
+        logger.info(f"Received streaming chat request from user: {request.user_id}")
+        
+        session_id = request.session_id or f"session_{uuid.uuid4().hex[:8]}"
+        enhanced_request = await _enhance_chat_request(request, session_id)
+        
+    except Exception as e:
+        logger.error(f"Chat stream endpoint error: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to process chat message: {str(e)}"
+        )
+    
+    chunks = []
+    
+    async def stream_response():
+        try:
+            async for chunk in agent_service.stream_chat_message(enhanced_request):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            # Headers are already sent, so mark the truncated body for the client
+            logger.error(f"Chat stream error: {str(e)}")
+            chunks.clear()
+            yield STREAM_ERROR_SENTINEL
+    
+    async def store_exchange():
+        if chunks:
+            await _store_chat_exchange(request.user_id, request.message, ChatResponse(
+                response="".join(chunks),
+                session_id=session_id,
+                model_used=agent_service.llm_client.model
+            ))
+    
+    return StreamingResponse(
+        stream_response(),
+        media_type="text/plain; charset=utf-8",
+        headers={"X-Session-ID": session_id},
+        background=BackgroundTask(store_exchange)
+    )
+
+
 @app.get("/weather")
 async def get_weather(
     latitude: float = -0.4167,  # Default to Nyeri, Kenya
@@ -509,23 +609,28 @@ async def search_documents(request: DocumentSearchRequest):
 async def list_documents(
     user_id: str = None,
     limit: int = 20,
-    offset: int = 0
+    offset: int = 0,
+    after: str = None  # next_cursor from the previous page
 ):
     """List uploaded documents."""
     try:
         documents = await document_service.list_documents(
             user_id=user_id,
             limit=limit,
-            offset=offset
+            offset=offset,
+            after=decode_document_cursor(after) if after else None
         )
         
         return DocumentListResponse(
             documents=documents,
             total=len(documents),  # This is approximate, would need separate count query for exact total
             limit=limit,
-            offset=offset
+            offset=offset,
+            next_cursor=encode_document_cursor(documents[-1]) if documents and len(documents) == limit else None
         )
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Document list error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"List failed: {str(e)}")
@@ -612,7 +717,7 @@ async def predict_disease(
             )
         
         # Get prediction from disease detection service
-        result = disease_detection_service.predict_disease(image_data)
+        result = await disease_detection_service.predict_disease_async(image_data)
         
         if not result['success']:
             raise HTTPException(
@@ -1249,6 +1354,8 @@ async def get_intelligent_memory_context(
             max_memories=max_memories,
             include_insights=include_insights
         )
+        # The array view duplicates relevant_memories and is for in-process use only
+        context.pop("memory_arrays", None)
         return context
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
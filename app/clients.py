@@ -0,0 +1,13 @@
+"""
+Shared HTTP client for outbound API calls.
+A single pooled connection manager reused by the LLM and weather services.
+"""
+
+import httpx
+
+# Global HTTP client instance (closed on application shutdown)
+shared_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=100, max_connections=500),
+    timeout=httpx.Timeout(30.0, connect=5.0)
+)
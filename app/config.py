@@ -18,6 +18,7 @@ class Settings(BaseSettings):
     app_version: str = "1.0.0"
     debug: bool = False
     log_level: str = "INFO"
+    agent_log_level: str = "INFO"  # Per-request chat logging in app.services.agent_service
     
     # Server Configuration
     host: str = "0.0.0.0"
@@ -29,6 +30,7 @@ class Settings(BaseSettings):
     cerebras_model: str = "gpt-oss-120b"
     max_tokens: int = 1000
     temperature: float = 0.7
+    llm_timeout: float = 600.0  # Seconds; overrides the shared HTTP client's 30s default
     
     # Django Integration
     django_base_url: Optional[str] = None
@@ -44,6 +46,8 @@ class Settings(BaseSettings):
     # Qdrant Configuration
     qdrant_host: str = "localhost"
     qdrant_port: int = 6333
+    qdrant_grpc_port: int = 6334
+    qdrant_prefer_grpc: bool = True
     qdrant_collection_name: str = "memory_vectors"
     
     # Redis Configuration
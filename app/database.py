@@ -9,8 +9,11 @@ from contextlib import asynccontextmanager
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy import text
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    PayloadSchemaType
+)
 import redis.asyncio as redis
 import logging
 
@@ -31,6 +34,7 @@ class DatabaseManager:
         self.postgres_engine = None
         self.postgres_session_factory = None
         self.qdrant_client = None
+        self.async_qdrant_client = None
         self.redis_client = None
         
     async def initialize(self):
@@ -71,9 +75,21 @@ class DatabaseManager:
     async def _init_qdrant(self):
         """Initialize Qdrant vector database."""
         try:
+            # One long-lived client per process; gRPC sends vectors as protobuf
+            # over a persistent HTTP/2 channel instead of JSON per request
             self.qdrant_client = QdrantClient(
                 host=settings.qdrant_host,
                 port=settings.qdrant_port,
+                grpc_port=settings.qdrant_grpc_port,
+                prefer_grpc=settings.qdrant_prefer_grpc,
+                timeout=30
+            )
+            # Async client for bulk writes that should not block the event loop
+            self.async_qdrant_client = AsyncQdrantClient(
+                host=settings.qdrant_host,
+                port=settings.qdrant_port,
+                grpc_port=settings.qdrant_grpc_port,
+                prefer_grpc=settings.qdrant_prefer_grpc,
                 timeout=30
             )
             
@@ -109,17 +125,24 @@ class DatabaseManager:
             raise
     
     async def _create_qdrant_collections(self):
-        """Create Qdrant collections for different types of embeddings."""
+        """Create Qdrant collections for different types of embeddings, with int8 scalar quantization."""
+        # int8 vectors kept in RAM are 4x smaller than float32; originals stay for rescoring
+        quantization_config = ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
         collections = [
             {
                 "name": "conversation_embeddings",
                 "vector_size": 384,  # sentence-transformers/all-MiniLM-L6-v2
-                "distance": Distance.COSINE
+                # Embeddings are unit length, so dot product equals cosine without per-query normalisation
+                "distance": Distance.DOT,
+                "payload_indexes": ("user_id",)
             },
             {
                 "name": "user_context_embeddings", 
                 "vector_size": 384,
-                "distance": Distance.COSINE
+                "distance": Distance.DOT,
+                "payload_indexes": ("user_id", "context_type")
             }
         ]
         
@@ -135,16 +158,40 @@ class DatabaseManager:
                         vectors_config=VectorParams(
                             size=collection["vector_size"],
                             distance=collection["distance"]
-                        )
+                        ),
+                        quantization_config=quantization_config
                     )
                     logger.info(f"Created Qdrant collection: {collection['name']}")
                 else:
                     logger.info(f"Qdrant collection already exists: {collection['name']}")
                     
+                    # Collections created before quantization was enabled are upgraded in place
+                    collection_info = self.qdrant_client.get_collection(collection["name"])
+                    if collection_info.config.quantization_config is None:
+                        self.qdrant_client.update_collection(
+                            collection_name=collection["name"],
+                            quantization_config=quantization_config
+                        )
+                        logger.info(f"Enabled scalar quantization on: {collection['name']}")
+                
+                self._create_payload_indexes(collection["name"], collection["payload_indexes"])
+                    
             except Exception as e:
                 logger.error(f"Failed to create collection {collection['name']}: {e}")
                 raise
     
+    def _create_payload_indexes(self, collection_name: str, field_names):
+        """Keyword-index the payload fields that memory filters match on; existing indexes are kept."""
+        for field_name in field_names:
+            try:
+                self.qdrant_client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=field_name,
+                    field_schema=PayloadSchemaType.KEYWORD
+                )
+            except Exception as e:
+                logger.warning(f"Could not create payload index on {collection_name}.{field_name}: {e}")
+    
     @asynccontextmanager
     async def get_postgres_session(self) -> AsyncGenerator[AsyncSession, None]:
         """
@@ -173,6 +220,12 @@ class DatabaseManager:
             raise RuntimeError("Qdrant not initialized")
         return self.qdrant_client
     
+    def get_async_qdrant_client(self) -> AsyncQdrantClient:
+        """Get async Qdrant client."""
+        if not self.async_qdrant_client:
+            raise RuntimeError("Qdrant not initialized")
+        return self.async_qdrant_client
+    
     def get_redis_client(self):
         """Get Redis client."""
         if not self.redis_client:
@@ -215,6 +268,9 @@ class DatabaseManager:
         if self.qdrant_client:
             self.qdrant_client.close()
         
+        if self.async_qdrant_client:
+            await self.async_qdrant_client.close()
+        
         if self.redis_client:
             await self.redis_client.close()
         
@@ -5,9 +5,10 @@ Handles communication with Cerebras API for fast inference with memory context.
 
 import httpx
 import logging
-from typing import Optional, Dict, Any, List
-from openai import OpenAI
+from typing import Optional, Dict, Any, List, AsyncIterator
+from openai import AsyncOpenAI
 from app.config import settings
+from app.clients import shared_client
 
 logger = logging.getLogger(__name__)
 
@@ -15,11 +16,13 @@ logger = logging.getLogger(__name__)
 class CerebrasClient:
     """Client for Cerebras AI inference API."""
     
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
         """Initialize Cerebras client with configuration."""
-        self.client = OpenAI(
+        self.client = AsyncOpenAI(
             api_key=settings.cerebras_api_key,
-            base_url=settings.cerebras_base_url
+            base_url=settings.cerebras_base_url,
+            http_client=http_client or shared_client,
+            timeout=httpx.Timeout(settings.llm_timeout, connect=5.0)
         )
         self.model = settings.cerebras_model
         self.max_tokens = settings.max_tokens
@@ -29,7 +32,8 @@ class CerebrasClient:
         self,
         messages: List[Dict[str, str]],
         temperature: Optional[float] = None,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        response_format: Optional[Dict[str, str]] = None
     ) -> Dict[str, Any]:
         """
         Generate response from Cerebras API.
@@ -38,6 +42,7 @@ class CerebrasClient:
             messages: List of message dictionaries with 'role' and 'content'
             temperature: Sampling temperature (0.0 to 1.0)
             max_tokens: Maximum tokens to generate
+            response_format: Output constraint such as {"type": "json_object"}
             
         Returns:
             Dictionary containing response and metadata
@@ -48,12 +53,14 @@ class CerebrasClient:
         try:
             logger.info(f"Generating response with {len(messages)} messages")
             
-            response = self.client.chat.completions.create(
+            extra_options = {"response_format": response_format} if response_format else {}
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 temperature=temperature or self.temperature,
                 max_tokens=max_tokens or self.max_tokens,
-                stream=False
+                stream=False,
+                **extra_options
             )
             
             result = {
@@ -70,6 +77,57 @@ class CerebrasClient:
             logger.error(f"Error generating response: {str(e)}")
             raise Exception(f"Failed to generate response: {str(e)}")
     
+    async def generate_response_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a response from Cerebras API as it is decoded.
+        
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            temperature: Sampling temperature (0.0 to 1.0)
+            max_tokens: Maximum tokens to generate
+            
+        Yields:
+            Text chunks of the response in order
+            
+        Raises:
+            Exception: If API call fails
+        """
+        try:
+            logger.info(f"Streaming response with {len(messages)} messages")
+            
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature or self.temperature,
+                max_tokens=max_tokens or self.max_tokens,
+                stream=True
+            )
+            
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            
+        except Exception as e:
+            logger.error(f"Error streaming response: {str(e)}")
+            raise Exception(f"Failed to stream response: {str(e)}")
+    
+    async def warm_up(self) -> None:
+        """
+        Open a pooled connection to Cerebras API so the first chat skips the TLS handshake.
+        
+        Uses the model listing endpoint, which does not consume tokens.
+        """
+        try:
+            await self.client.models.list()
+            logger.info("Cerebras connection warmed up")
+        except Exception as e:
+            logger.warning(f"Cerebras warm-up failed: {str(e)}")
+    
     async def health_check(self) -> bool:
         """
         Check if Cerebras API is accessible.
@@ -175,6 +175,7 @@ class DocumentListResponse(BaseModel):
     total: int = Field(..., description="Total number of documents")
     limit: int = Field(..., description="Items per page")
     offset: int = Field(..., description="Offset for pagination")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page, passed back as 'after'")
     
     model_config = ConfigDict(
         json_schema_extra={
@@ -194,7 +195,8 @@ class DocumentListResponse(BaseModel):
                 ],
                 "total": 1,
                 "limit": 20,
-                "offset": 0
+                "offset": 0,
+                "next_cursor": "2024-08-09T09:30:00|doc_123"
             }
         }
     )
@@ -3,7 +3,7 @@ SQLAlchemy models for memory system.
 Defines database models for user profiles, conversations, and memory storage.
 """
 
-from sqlalchemy import Column, String, Integer, Text, DateTime, Boolean, ForeignKey, ARRAY
+from sqlalchemy import Column, String, Integer, Text, DateTime, Boolean, ForeignKey, ARRAY, Index
 from sqlalchemy.sql.sqltypes import Numeric
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
@@ -54,6 +54,11 @@ class ConversationSession(Base):
     message_count = Column(Integer, default=0)
     context = Column(JSONB, default={})
     
+    __table_args__ = (
+        # Serves per-user listings by recency and the recent-activity counts in user stats
+        Index("idx_conversation_sessions_user_last_activity", "user_id", last_activity.desc()),
+    )
+    
     # Relationships
     user_profile = relationship("UserProfile", back_populates="conversation_sessions")
     messages = relationship("ConversationMessage", back_populates="session", cascade="all, delete-orphan")
@@ -76,6 +81,7 @@ class ConversationMessage(Base):
     model_used = Column(String(100))
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     message_metadata = Column(JSONB, default={})
+    topics = Column(ARRAY(Text))  # Farming topics found in content, grouped by memory insights
     
     # Relationships
     session = relationship("ConversationSession", back_populates="messages")
@@ -3,18 +3,91 @@ Core agent service for chat interactions.
 Enhanced with memory context integration and document search (RAG).
 """
 
+import asyncio
 import logging
+import re
+import time
 import uuid
-from typing import Optional, Dict, Any, List
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple, Union, AsyncIterator
+
+import numpy as np
 from datetime import datetime
 
 from app.llm_client import cerebras_client, AgentPrompts
 from app.models.api_models import ChatRequest, ChatResponse
 from app.config import settings
-from app.services.memory_intelligence import memory_intelligence_service
+from app.services.memory import memory_service
+from app.services.memory_intelligence import memory_intelligence_service, to_memory_arrays
+from app.services.document_service import document_service
+from app.services.embedding import EmbeddingIndex, vector_memory_service
+from app.services.weather_service import weather_service
 
 logger = logging.getLogger(__name__)
 
+# Semantic response cache: near-duplicate questions in the same user session reuse the
+# previous answer instead of rerunning retrieval and the LLM
+_RESPONSE_CACHE_THRESHOLD = 0.92
+_RESPONSE_CACHE_TTL_SECONDS = 600
+_RESPONSE_CACHE_ENTRIES_PER_SESSION = 1000
+_RESPONSE_CACHE_SESSIONS = 256
+
+# Cheap pre-filter for small-talk messages that never need a document search
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_STOPWORDS = frozenset({
+    "a", "an", "the", "and", "or", "but", "is", "are", "was", "were", "be", "to", "of",
+    "in", "on", "at", "for", "with", "it", "this", "that", "i", "me", "my", "you", "your",
+    "we", "our", "so", "do", "does", "did", "can", "will", "just", "ok", "okay", "yes",
+    "no", "hi", "hello", "hey", "habari", "thanks", "thank", "asante", "please", "good",
+    "morning", "afternoon", "evening", "bye", "sawa", "great", "nice", "cool",
+})
+# Farming word stems (English and Swahili); a token must be a stem plus at most
+# one inflection ending, so "raining", "fungicides" and "aphids" count but
+# "sunday" and "pickup" do not
+_DOMAIN_STEMS = (
+    "coffee", "kahawa", "arabica", "robusta", "berr", "cherr", "bean", "pest", "wadudu",
+    "diseas", "ugonjwa", "cbd", "clr", "rust", "thrip", "mite", "aphid", "miner", "borer",
+    "infest", "harvest", "mavuno", "pick", "prun", "fertil", "mbolea", "manure", "compost",
+    "mulch", "soil", "udongo", "nurser", "seedling", "miche", "plant", "spray", "dawa",
+    "fungicid", "pesticid", "insecticid", "weed", "yield", "irrigat", "water", "rain",
+    "rainfall", "mvua", "weather", "drought", "dry", "dried", "wet", "season", "temperatur",
+    "humid", "flood", "timing", "climat", "wind", "sun", "sunny", "sunshine", "shade", "leaf",
+    "leaves", "appl", "price", "market", "sell", "sl28", "sl34", "ruiru", "batian", "k7",
+)
+_DOMAIN_INFLECTIONS = (
+    "s", "es", "e", "ed", "d", "ing", "er", "ers", "y", "ies", "ied", "al", "ic", "ity",
+    "ion", "ions", "ation", "ations", "ication", "ications", "ise", "ised", "iser", "isers",
+    "ize", "ized", "izer", "izers",
+)
+_DOMAIN_STEM_RE = re.compile(
+    "(?:" + "|".join(_DOMAIN_STEMS) + ")(?:" + "|".join(_DOMAIN_INFLECTIONS) + ")?"
+)
+
+# Keywords that make a message weather-related; matched at word starts so
+# inflections ("raining", "harvesting") still count
+_WEATHER_KEYWORDS = (
+    "weather", "rain", "dry", "wet", "season", "temperature", "humidity",
+    "drought", "flooding", "planting", "harvest", "spray", "irrigation",
+    "when to", "timing", "climate", "wind", "sunshine",
+)
+_WEATHER_RE = re.compile(r"\b(?:" + "|".join(map(re.escape, _WEATHER_KEYWORDS)) + ")", re.IGNORECASE)
+
+
+# Bound line templates for the context builders
+_MEMORY_LINE = "{}. {} (relevance: {:.2f})".format
+_INTELLIGENT_MEMORY_LINE = "{}. [{}] {} (relevance: {})".format
+_INSIGHT_LINE = "• {}: {}".format
+_DOCUMENT_LINE = "{}. From '{}': {}...".format
+_FORECAST_LINE = "• {}: {:.0f}-{:.0f}°C, {:.1f}mm rain ({:.0f}% chance)".format
+
+
+def _is_low_information(message: str) -> bool:
+    """Return True for short messages with no farming terms (greetings, thanks, etc.)."""
+    tokens = {token.removesuffix("'s") for token in _TOKEN_RE.findall(message.lower())} - _STOPWORDS
+    if any(_DOMAIN_STEM_RE.fullmatch(token) for token in tokens):
+        return False
+    return len(tokens) < 3
+
 
 class AgentService:
     """Core agent service handling chat interactions with memory context and document search."""
@@ -22,11 +95,10 @@ class AgentService:
     def __init__(self):
         """Initialize the agent service."""
         self.llm_client = cerebras_client
-        # Import here to avoid circular imports
-        from app.services.document_service import document_service
-        from app.services.weather_service import weather_service
         self.document_service = document_service
         self.weather_service = weather_service
+        # (user_id, session_id) -> index of recent question embeddings and answers, in LRU order
+        self._response_cache: "OrderedDict[Tuple[str, str], EmbeddingIndex]" = OrderedDict()
         
     async def process_chat_message(self, request: ChatRequest) -> ChatResponse:
         """
@@ -45,55 +117,17 @@ class AgentService:
             # Generate session ID if not provided
             session_id = request.session_id or f"session_{uuid.uuid4().hex[:8]}"
             
-            logger.info(f"Processing chat message for session: {session_id}")
-            
-            # Get intelligent memory context instead of basic memory (only if user_id provided)
-            if request.user_id:
-                intelligent_context = await memory_intelligence_service.get_intelligent_memory_context(
-                    query=request.message,
-                    user_id=request.user_id,
-                    max_memories=5,
-                    include_insights=True
-                )
-                
-                # Extract relevant memories and insights
-                relevant_memories = intelligent_context.get("relevant_memories", [])
-                memory_insights = intelligent_context.get("memory_insights", [])
-                context_summary = intelligent_context.get("context_summary", "")
-                
-                # Build enhanced context with memory intelligence
-                enhanced_memory_context = self._build_intelligent_memory_context(
-                    relevant_memories, memory_insights, context_summary
-                )
-            else:
-                # Fallback to basic memory context for non-authenticated users
-                relevant_memories = request.context.get("relevant_memories", []) if request.context else []
-                enhanced_memory_context = self._build_memory_context(relevant_memories)
+            logger.info("Processing chat message for session: %s", session_id)
             
-            # Search relevant documents for the user's question
-            document_context = await self._search_relevant_documents(request.message, request.user_id)
-            
-            # Get weather context if user has location data
-            weather_context = await self._get_weather_context(request.context, request.message)
-            
-            # Get conversation history for this session to maintain context continuity
-            conversation_history = []
-            if request.user_id:
-                from app.services.memory import memory_service
-                conversation_history = await memory_service.get_conversation_history(
-                    session_id=session_id,
-                    limit=10  # Get last 10 messages for context
-                )
+            # Reuse the answer to a near-identical recent question
+            cache_key = self._response_cache_key(request)
+            query_embedding = await self._embed_for_cache(request.message) if cache_key else None
+            cached_response = self._lookup_cached_response(cache_key, query_embedding, session_id)
+            if cached_response:
+                logger.info("Semantic cache hit for session: %s", session_id)
+                return cached_response
             
-            # Build messages for LLM with conversation history, memory, document, and weather context
-            messages = AgentPrompts.build_messages_with_history(
-                user_message=request.message,
-                conversation_history=conversation_history,
-                context=request.context,
-                memory_context=enhanced_memory_context,
-                document_context=document_context,
-                weather_context=weather_context
-            )
+            messages = await self._build_chat_messages(request, session_id)
             
             # Generate response from Cerebras
             llm_response = await self.llm_client.generate_response(messages)
@@ -106,13 +140,232 @@ class AgentService:
                 tokens_used=llm_response["tokens_used"]
             )
             
-            logger.info(f"Chat response generated for session: {session_id}")
+            self._store_cached_response(cache_key, query_embedding, response)
+            
+            logger.info("Chat response generated for session: %s", session_id)
             return response
             
         except Exception as e:
-            logger.error(f"Error processing chat message: {str(e)}")
+            logger.error("Error processing chat message: %s", e)
             raise Exception(f"Failed to process chat message: {str(e)}")
     
+    async def stream_chat_message(self, request: ChatRequest) -> AsyncIterator[str]:
+        """
+        Process a chat message and stream the response as it is generated.
+        
+        The full response is added to the semantic cache once the stream ends.
+        
+        Args:
+            request: Chat request containing message and context
+            
+        Yields:
+            Text chunks of the agent's reply
+            
+        Raises:
+            Exception: If processing fails
+        """
+        try:
+            session_id = request.session_id or f"session_{uuid.uuid4().hex[:8]}"
+            
+            logger.info("Streaming chat message for session: %s", session_id)
+            
+            cache_key = self._response_cache_key(request)
+            query_embedding = await self._embed_for_cache(request.message) if cache_key else None
+            cached_response = self._lookup_cached_response(cache_key, query_embedding, session_id)
+            if cached_response:
+                logger.info("Semantic cache hit for session: %s", session_id)
+                yield cached_response.response
+                return
+            
+            messages = await self._build_chat_messages(request, session_id)
+            
+            chunks = []
+            async for chunk in self.llm_client.generate_response_stream(messages):
+                chunks.append(chunk)
+                yield chunk
+            
+            self._store_cached_response(cache_key, query_embedding, ChatResponse(
+                response="".join(chunks),
+                session_id=session_id,
+                model_used=self.llm_client.model
+            ))
+            
+            logger.info("Chat response streamed for session: %s", session_id)
+            
+        except Exception as e:
+            logger.error("Error streaming chat message: %s", e)
+            raise Exception(f"Failed to process chat message: {str(e)}")
+    
+    async def _build_chat_messages(self, request: ChatRequest, session_id: str) -> List[Dict[str, str]]:
+        """
+        Gather document, weather, memory and history context and build the LLM messages.
+
+        Args:
+            request: Chat request containing message and context
+            session_id: Session identifier used for conversation history
+
+        Returns:
+            List of formatted messages for the LLM
+        """
+        # Fetch document, weather, memory and history context concurrently
+        fetches = [
+            self._search_relevant_documents(request.message, request.user_id),
+            self._get_weather_context(request.context, request.message),
+        ]
+        if request.user_id:
+            # Intelligent memory and conversation history need an authenticated user
+            fetches.append(memory_intelligence_service.get_intelligent_memory_context(
+                query=request.message,
+                user_id=request.user_id,
+                max_memories=5,
+                include_insights=True
+            ))
+            fetches.append(memory_service.get_conversation_history(
+                session_id=session_id,
+                limit=10  # Get last 10 messages for context
+            ))
+
+        document_context, weather_context, *user_context = await asyncio.gather(*fetches)
+
+        if user_context:
+            intelligent_context, conversation_history = user_context
+
+            # Extract relevant memories (as parallel arrays when available) and insights
+            relevant_memories = intelligent_context.get("memory_arrays") or \
+                intelligent_context.get("relevant_memories", [])
+            memory_insights = intelligent_context.get("memory_insights", [])
+            context_summary = intelligent_context.get("context_summary", "")
+
+            # Build enhanced context with memory intelligence; rebuilt per message since the
+            # memories are retrieved for this query, while insights are cached per user upstream
+            enhanced_memory_context = self._build_intelligent_memory_context(
+                relevant_memories, memory_insights, context_summary
+            )
+        else:
+            # Fallback to basic memory context for non-authenticated users
+            relevant_memories = request.context.get("relevant_memories", []) if request.context else []
+            enhanced_memory_context = self._build_memory_context(relevant_memories)
+            conversation_history = []
+
+        # Build messages for LLM with conversation history, memory, document, and weather context
+        return AgentPrompts.build_messages_with_history(
+            user_message=request.message,
+            conversation_history=conversation_history,
+            context=request.context,
+            memory_context=enhanced_memory_context,
+            document_context=document_context,
+            weather_context=weather_context
+        )
+    
+    def _response_cache_key(self, request: ChatRequest) -> Optional[Tuple[str, str]]:
+        """
+        Key of the semantic cache that may answer this request.
+        
+        Answers are shared only within one user's session. Anonymous requests,
+        requests without a session and requests carrying their own context are
+        not cached, since their answers depend on more than the question.
+        
+        Args:
+            request: Chat request
+            
+        Returns:
+            (user_id, session_id), or None if the request must not be cached
+        """
+        if not request.user_id or not request.session_id or request.context:
+            return None
+        return (request.user_id, request.session_id)
+    
+    async def _embed_for_cache(self, message: str) -> Optional[np.ndarray]:
+        """
+        Embed a message for the semantic response cache.
+        
+        Args:
+            message: User's message
+            
+        Returns:
+            Query embedding, or None if the embedding model is unavailable
+        """
+        try:
+            return await vector_memory_service.embedding_service.create_embedding(message)
+        except Exception as e:
+            logger.warning("Semantic cache disabled for this request: %s", e)
+            return None
+    
+    def _lookup_cached_response(
+        self,
+        cache_key: Optional[Tuple[str, str]],
+        query_embedding: Optional[np.ndarray],
+        session_id: str
+    ) -> Optional[ChatResponse]:
+        """
+        Find a fresh cached answer to a semantically equivalent question.
+        
+        Args:
+            cache_key: Key from ``_response_cache_key``, or None for uncached requests
+            query_embedding: Embedding of the current message
+            session_id: Session identifier for the returned response
+            
+        Returns:
+            Cached chat response, or None on a miss
+        """
+        index = self._response_cache.get(cache_key) if cache_key else None
+        if query_embedding is None or index is None:
+            return None
+        
+        matches = index.search(query_embedding, limit=1, score_threshold=_RESPONSE_CACHE_THRESHOLD)
+        if not matches:
+            return None
+        
+        cached, _ = matches[0]
+        if time.monotonic() - cached["created_at"] >= _RESPONSE_CACHE_TTL_SECONDS:
+            return None
+        
+        self._response_cache.move_to_end(cache_key)
+        return ChatResponse(
+            response=cached["response"],
+            session_id=session_id,
+            model_used=cached["model_used"],
+            tokens_used=0
+        )
+    
+    def _store_cached_response(
+        self,
+        cache_key: Optional[Tuple[str, str]],
+        query_embedding: Optional[np.ndarray],
+        response: ChatResponse
+    ):
+        """
+        Remember a generated answer for later semantically equivalent questions.
+        
+        Args:
+            cache_key: Key from ``_response_cache_key``, or None for uncached requests
+            query_embedding: Embedding of the answered message
+            response: Generated chat response
+        """
+        if cache_key is None or query_embedding is None:
+            return
+        
+        index = self._response_cache.get(cache_key)
+        if index is None:
+            index = self._response_cache[cache_key] = EmbeddingIndex(len(query_embedding))
+            if len(self._response_cache) > _RESPONSE_CACHE_SESSIONS:
+                self._response_cache.popitem(last=False)
+        self._response_cache.move_to_end(cache_key)
+        
+        now = time.monotonic()
+        if len(index) >= _RESPONSE_CACHE_ENTRIES_PER_SESSION:
+            # Drop expired answers, then the oldest ones if still full
+            ages = np.fromiter((now - p["created_at"] for p in index.payloads), dtype=np.float64, count=len(index))
+            keep = ages < _RESPONSE_CACHE_TTL_SECONDS
+            keep[:max(0, int(keep.sum()) - _RESPONSE_CACHE_ENTRIES_PER_SESSION + 1)] = False
+            index.retain(keep)
+        
+        index.add([query_embedding], [{
+            "created_at": now,
+            "response": response.response,
+            "model_used": response.model_used
+        }])
+    
     def _build_memory_context(self, relevant_memories: list) -> str:
         """
         Build memory context string from relevant memories.
@@ -123,24 +376,18 @@ class AgentService:
         Returns:
             Formatted memory context string
         """
-        if not relevant_memories:
-            return ""
-        
-        memory_parts = []
-        memory_parts.append("Previous conversation context:")
+        items = [
+            _MEMORY_LINE(i, memory['content'], memory['similarity_score'])
+            for i, memory in enumerate(relevant_memories[:3], 1)  # Limit to top 3
+            # Only include high-confidence memories
+            if memory.get("content") and memory.get("similarity_score", 0) > 0.7
+        ]
         
-        for i, memory in enumerate(relevant_memories[:3], 1):  # Limit to top 3
-            content = memory.get("content", "")
-            similarity = memory.get("similarity_score", 0)
-            
-            if content and similarity > 0.7:  # Only include high-confidence memories
-                memory_parts.append(f"{i}. {content} (relevance: {similarity:.2f})")
-        
-        return "\n".join(memory_parts) if len(memory_parts) > 1 else ""
+        return "Previous conversation context:\n" + "\n".join(items) if items else ""
     
     def _build_intelligent_memory_context(
         self, 
-        relevant_memories: list, 
+        relevant_memories: Union[list, Dict[str, Any]], 
         memory_insights: list, 
         context_summary: str
     ) -> str:
@@ -148,14 +395,19 @@ class AgentService:
         Build enhanced memory context with intelligence insights.
         
         Args:
-            relevant_memories: List of enhanced memory items
+            relevant_memories: List of enhanced memory items, or the same memories as
+                parallel arrays from to_memory_arrays
             memory_insights: List of memory insights
             context_summary: Summary of the context
             
         Returns:
             Enhanced memory context string
         """
-        if not relevant_memories and not memory_insights:
+        if not isinstance(relevant_memories, dict):
+            relevant_memories = to_memory_arrays(relevant_memories[:3])
+        contents = relevant_memories["contents"][:3]
+        
+        if not contents and not memory_insights:
             return ""
         
         context_parts = []
@@ -165,25 +417,22 @@ class AgentService:
             context_parts.append(f"Context: {context_summary}")
         
         # Add relevant memories with enhanced information
-        if relevant_memories:
+        if contents:
             context_parts.append("Recent relevant conversations:")
-            for i, memory in enumerate(relevant_memories[:3], 1):
-                content = memory.get("content", "")
-                enhanced_relevance = memory.get("enhanced_relevance", 0)
-                memory_type = memory.get("memory_type", "general")
-                
-                if content and enhanced_relevance > 0.6:
-                    relevance_desc = "High" if enhanced_relevance > 0.8 else "Medium"
-                    context_parts.append(
-                        f"{i}. [{memory_type.title()}] {content} "
-                        f"(relevance: {relevance_desc})"
-                    )
+            scores = relevant_memories["relevance"][:3]
+            labels = relevant_memories["type_labels"]
+            context_parts.extend(
+                _INTELLIGENT_MEMORY_LINE(
+                    index + 1, labels[index], contents[index], "High" if scores[index] > 0.8 else "Medium"
+                )
+                for index in np.flatnonzero(scores > 0.6)
+                if contents[index]
+            )
         
         # Add key insights
         if memory_insights:
             context_parts.append("Key farming insights from your history:")
-            for insight in memory_insights[:2]:
-                context_parts.append(f"• {insight.topic}: {insight.summary}")
+            context_parts.extend(_INSIGHT_LINE(insight.topic, insight.summary) for insight in memory_insights[:2])
         
         return "\n".join(context_parts)
     
@@ -198,6 +447,9 @@ class AgentService:
         Returns:
             Formatted document context string
         """
+        if _is_low_information(query):
+            return ""
+        
         try:
             # Search documents with fallback to global documents
             search_user_id = user_id or "global_admin"
@@ -212,21 +464,21 @@ class AgentService:
             if not relevant_docs:
                 return ""
             
-            doc_parts = []
-            doc_parts.append("Relevant information from coffee farming documents:")
-            
-            for i, doc in enumerate(relevant_docs, 1):
-                content = doc.get("content", "")
-                filename = doc.get("filename", "")
-                similarity = doc.get("similarity_score", 0)
-                
-                if content and similarity > 0.3:
-                    doc_parts.append(f"{i}. From '{filename}': {content[:500]}...")
+            scores = np.fromiter(
+                (doc.get("similarity_score", 0) for doc in relevant_docs),
+                dtype=np.float64,
+                count=len(relevant_docs)
+            )
+            items = [
+                _DOCUMENT_LINE(index + 1, doc.get('filename', ''), doc['content'][:500])
+                for index in np.flatnonzero(scores > 0.3)
+                if (doc := relevant_docs[index]).get("content")
+            ]
             
-            return "\n".join(doc_parts) if len(doc_parts) > 1 else ""
+            return "Relevant information from coffee farming documents:\n" + "\n".join(items) if items else ""
             
         except Exception as e:
-            logger.error(f"Error searching documents: {str(e)}")
+            logger.error("Error searching documents: %s", e)
             return ""
     
     async def _get_weather_context(self, context: Optional[Dict[str, Any]], message: str) -> str:
@@ -242,16 +494,7 @@ class AgentService:
         """
         try:
             # Check if the message is weather-related
-            weather_keywords = [
-                "weather", "rain", "dry", "wet", "season", "temperature", "humidity",
-                "drought", "flooding", "planting", "harvest", "spray", "irrigation",
-                "when to", "timing", "climate", "wind", "sunshine"
-            ]
-            
-            message_lower = message.lower()
-            is_weather_related = any(keyword in message_lower for keyword in weather_keywords)
-            
-            if not is_weather_related:
+            if not _WEATHER_RE.search(message):
                 return ""
             
             # Default to common Kenya coffee regions if no specific location
@@ -273,27 +516,29 @@ class AgentService:
             if not current_weather:
                 return ""
             
-            weather_parts = []
-            weather_parts.append("Current weather conditions for your farming area:")
-            weather_parts.append(f"• Temperature: {current_weather.temperature:.1f}°C")
-            weather_parts.append(f"• Humidity: {current_weather.humidity:.0f}%")
-            weather_parts.append(f"• Condition: {current_weather.condition}")
+            weather_text = (
+                "Current weather conditions for your farming area:\n"
+                f"• Temperature: {current_weather.temperature:.1f}°C\n"
+                f"• Humidity: {current_weather.humidity:.0f}%\n"
+                f"• Condition: {current_weather.condition}"
+            )
             
             if current_weather.precipitation > 0:
-                weather_parts.append(f"• Current rainfall: {current_weather.precipitation:.1f}mm")
+                weather_text += f"\n• Current rainfall: {current_weather.precipitation:.1f}mm"
             
             if forecast:
-                weather_parts.append(f"\nNext 3 days outlook:")
-                for day in forecast[:3]:
-                    weather_parts.append(
-                        f"• {day.date}: {day.temperature_min:.0f}-{day.temperature_max:.0f}°C, "
-                        f"{day.precipitation:.1f}mm rain ({day.precipitation_probability:.0f}% chance)"
+                weather_text += "\n\nNext 3 days outlook:\n" + "\n".join(
+                    _FORECAST_LINE(
+                        day.date, day.temperature_min, day.temperature_max,
+                        day.precipitation, day.precipitation_probability
                     )
+                    for day in forecast[:3]
+                )
             
-            return "\n".join(weather_parts)
+            return weather_text
             
         except Exception as e:
-            logger.error(f"Error getting weather context: {str(e)}")
+            logger.error("Error getting weather context: %s", e)
             return ""
     
     async def health_check(self) -> Dict[str, str]:
@@ -310,7 +555,7 @@ class AgentService:
             cerebras_healthy = await self.llm_client.health_check()
             dependencies["cerebras_api"] = "connected" if cerebras_healthy else "disconnected"
         except Exception as e:
-            logger.error(f"Cerebras health check error: {str(e)}")
+            logger.error("Cerebras health check error: %s", e)
             dependencies["cerebras_api"] = "error"
         
         # Check Django backend (placeholder for Phase 3)
@@ -4,16 +4,17 @@ Coffee Disease Detection Service
 This service provides AI-powered coffee disease detection using a trained PyTorch ResNext50 model.
 Detects 5 categories: Healthy, Miner, Rust, Phoma, Cercospora
 """
+import asyncio
 import torch
 import torch.nn as nn
-from torchvision import transforms
 import numpy as np
 import timm
 from PIL import Image
 import cv2
 import os
 import logging
-from typing import Optional, Tuple, List, Dict, Any
+import threading
+from typing import Optional, Tuple, List, Dict, Any, Callable
 import tempfile
 import io
 
@@ -31,6 +32,52 @@ class DiseaseDetectionConfig:
         3: 'Phoma', 
         4: 'Cercospora'
     }
+    # INT8 post-training quantization for CPU inference; opt-in, since it is
+    # calibrated on random tensors rather than leaf images and the quantized
+    # model is saved next to the weights. Check accuracy on labelled photos first.
+    QUANTIZE_ON_CPU = False
+    CALIBRATION_BATCHES = 8
+    WARMUP_ITERATIONS = 3
+
+_LOW_CONFIDENCE_RECOMMENDATION = (
+    "Low confidence prediction. Consider taking multiple photos from different angles for better accuracy."
+)
+
+# Treatment advice per predicted class
+_RECOMMENDATIONS = {
+    "Healthy": (
+        "Your coffee plants appear healthy! Continue with regular care and monitoring.",
+        "Maintain good agricultural practices including proper spacing, pruning, and fertilization.",
+        "Monitor regularly for early signs of disease to catch issues before they spread."
+    ),
+    "Miner": (
+        "Coffee Leaf Miner detected. This pest creates tunnels in coffee leaves.",
+        "Apply appropriate insecticides like chlorpyrifos or imidacloprid.",
+        "Improve farm sanitation by removing fallen leaves and pruning affected branches.",
+        "Consider biological control using parasitic wasps if available in your area."
+    ),
+    "Rust": (
+        "Coffee Leaf Rust detected. This is a serious fungal disease that can cause significant yield losses.",
+        "Apply copper-based fungicides immediately.",
+        "Improve air circulation by proper pruning and spacing of plants.",
+        "Remove and destroy infected leaves to prevent spread.",
+        "Consider resistant coffee varieties for future planting."
+    ),
+    "Phoma": (
+        "Phoma disease detected. This fungal infection affects coffee leaves and can spread quickly.",
+        "Apply systemic fungicides containing propiconazole or tebuconazole.",
+        "Ensure proper drainage to reduce moisture levels around plants.",
+        "Remove infected plant material and dispose of it away from the farm.",
+        "Monitor closely and treat early to prevent spread."
+    ),
+    "Cercospora": (
+        "Cercospora leaf spot detected. This fungal disease causes brown spots on leaves.",
+        "Apply fungicides containing mancozeb or copper compounds.",
+        "Improve air circulation through proper pruning.",
+        "Avoid overhead irrigation to reduce leaf wetness.",
+        "Remove fallen leaves and infected plant material."
+    ),
+}
 
 class CustomResNext(nn.Module):
     """Custom ResNext model for coffee disease classification"""
@@ -47,22 +94,39 @@ class CustomResNext(nn.Module):
 class DiseaseDetectionService:
     """Service for coffee disease detection using trained PyTorch model"""
     
-    def __init__(self):
+    def __init__(self, max_batch_size: int = 16, max_batch_wait: float = 0.01):
         self.model = None
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        # Half precision only pays off on GPU tensor cores
+        self.input_dtype = torch.float16 if self.device.type == 'cuda' else torch.float32
         self.transforms = self._get_inference_transforms()
+        self._class_names = tuple(
+            DiseaseDetectionConfig.CATEGORY_MAPPING[i] for i in range(DiseaseDetectionConfig.TARGET_CLASSES)
+        )
+        # Micro-batching of concurrent predict_disease_async calls
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait = max_batch_wait
+        self._batch_queue: Optional[asyncio.Queue] = None
+        self._batch_worker: Optional[asyncio.Task] = None
+        # CUDA graphs keyed by captured batch size: (graph, static input, static output)
+        self._cuda_graphs: Dict[int, Tuple[Any, torch.Tensor, torch.Tensor]] = {}
+        self._cuda_graph_lock = threading.Lock()
         self._load_model()
+        self._warm_up()
     
-    def _get_inference_transforms(self) -> transforms.Compose:
-        """Get image preprocessing transforms"""
-        return transforms.Compose([
-            transforms.Resize((DiseaseDetectionConfig.IMAGE_SIZE, DiseaseDetectionConfig.IMAGE_SIZE)),
-            transforms.ToTensor(),
-            transforms.Normalize(
-                mean=[0.485, 0.456, 0.406],
-                std=[0.229, 0.224, 0.225],
-            ),
-        ])
+    def _get_inference_transforms(self) -> Callable[[np.ndarray], torch.Tensor]:
+        """Get image preprocessing transform (area resize, then in-place scale and normalize)"""
+        size = (DiseaseDetectionConfig.IMAGE_SIZE, DiseaseDetectionConfig.IMAGE_SIZE)
+        mean = torch.tensor([0.485, 0.456, 0.406]).view(3, 1, 1)
+        std = torch.tensor([0.229, 0.224, 0.225]).view(3, 1, 1)
+        
+        def transform(image: np.ndarray) -> torch.Tensor:
+            # Downsample the uint8 RGB image first so the float math runs on 128x128 only
+            resized = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+            tensor = torch.from_numpy(resized).permute(2, 0, 1).float().div_(255.0)
+            return tensor.sub_(mean).div_(std)
+        
+        return transform
     
     def _load_model(self) -> None:
         """Load the trained PyTorch model"""
@@ -86,19 +150,155 @@ class DiseaseDetectionService:
                 logger.error("Disease detection model file not found in any expected location")
                 return
             
+            # Reuse a previously quantized TorchScript model if it is newer than the weights
+            quantize = self.device.type == 'cpu' and DiseaseDetectionConfig.QUANTIZE_ON_CPU
+            quantized_path = f"{os.path.splitext(model_path)[0]}.int8.pt"
+            if quantize and os.path.exists(quantized_path) and \
+                    os.path.getmtime(quantized_path) >= os.path.getmtime(model_path):
+                self.model = torch.jit.load(quantized_path, map_location=self.device)
+                logger.info(f"Quantized disease detection model loaded from {quantized_path}")
+                return
+            
             self.model = CustomResNext(
                 model_name=DiseaseDetectionConfig.MODEL_NAME, 
                 pretrained=False
             )
-            self.model.load_state_dict(torch.load(model_path, map_location=self.device))
+            # Map the checkpoint lazily and adopt its tensors instead of copying them
+            self.model.load_state_dict(self._load_state_dict(model_path), assign=True)
             self.model.eval()
             self.model.to(self.device)
+            quantized = quantize and self._quantize_model()
+            self._optimize_model()
+            if self.device.type == 'cuda':
+                # Input shape is fixed, so let cuDNN autotune before graphs are captured
+                torch.backends.cudnn.benchmark = True
+                self._capture_cuda_graphs()
             logger.info(f"Disease detection model loaded successfully from {model_path}")
             
+            if quantized and isinstance(self.model, torch.jit.ScriptModule):
+                try:
+                    torch.jit.save(self.model, quantized_path)
+                except Exception as e:
+                    logger.warning(f"Could not save quantized model to {quantized_path}: {e}")
+            
         except Exception as e:
             logger.error(f"Failed to load disease detection model: {e}")
             self.model = None
     
+    @staticmethod
+    def _load_state_dict(model_path: str) -> Dict[str, torch.Tensor]:
+        """Load checkpoint weights memory-mapped, falling back to a full read for legacy files"""
+        try:
+            return torch.load(model_path, map_location='cpu', mmap=True, weights_only=True)
+        except RuntimeError as e:
+            # Checkpoints saved before the zipfile format cannot be memory-mapped
+            logger.warning(f"Could not memory-map {model_path}, reading it fully: {e}")
+            return torch.load(model_path, map_location='cpu', weights_only=True)
+    
+    def _quantize_model(self) -> bool:
+        """Quantize the loaded fp32 model to INT8 with FX graph mode post-training quantization"""
+        try:
+            from torch.ao.quantization import get_default_qconfig_mapping
+            from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+            
+            size = DiseaseDetectionConfig.IMAGE_SIZE
+            prepared = prepare_fx(
+                self.model, get_default_qconfig_mapping("x86"), (torch.randn(1, 3, size, size),)
+            )
+            
+            # Calibrate activation ranges; inputs are normalized, so roughly zero-mean unit-variance
+            with torch.no_grad():
+                for _ in range(DiseaseDetectionConfig.CALIBRATION_BATCHES):
+                    prepared(torch.randn(8, 3, size, size))
+            
+            self.model = convert_fx(prepared)
+            logger.info("Disease detection model quantized to INT8 for CPU inference")
+            return True
+            
+        except Exception as e:
+            logger.warning(f"Model quantization failed, using fp32 model: {e}")
+            return False
+    
+    def _optimize_model(self) -> None:
+        """Convert the loaded model to channels_last, fp16 on GPU, and a frozen TorchScript graph"""
+        try:
+            model = self.model.to(memory_format=torch.channels_last, dtype=self.input_dtype)
+            example = torch.randn(
+                1, 3, DiseaseDetectionConfig.IMAGE_SIZE, DiseaseDetectionConfig.IMAGE_SIZE,
+                device=self.device, dtype=self.input_dtype
+            ).contiguous(memory_format=torch.channels_last)
+            
+            with torch.no_grad():
+                self.model = torch.jit.freeze(torch.jit.trace(model, example))
+            logger.info(f"Disease detection model traced with TorchScript ({self.input_dtype}, channels_last)")
+            
+        except Exception as e:
+            logger.warning(f"Model optimization failed, using eager model: {e}")
+            self.model = self.model.to(dtype=torch.float32)
+            self.input_dtype = torch.float32
+    
+    def _capture_cuda_graphs(self) -> None:
+        """Capture the fixed-shape forward pass as CUDA graphs for a few batch sizes"""
+        size = DiseaseDetectionConfig.IMAGE_SIZE
+        try:
+            for batch_size in sorted({1, 4, self.max_batch_size}):
+                static_input = torch.zeros(
+                    batch_size, 3, size, size, device=self.device, dtype=self.input_dtype
+                ).contiguous(memory_format=torch.channels_last)
+                
+                # Warm up on a side stream before capture, as CUDA graph capture requires
+                stream = torch.cuda.Stream()
+                stream.wait_stream(torch.cuda.current_stream())
+                with torch.no_grad(), torch.cuda.stream(stream):
+                    for _ in range(3):
+                        self.model(static_input)
+                torch.cuda.current_stream().wait_stream(stream)
+                
+                graph = torch.cuda.CUDAGraph()
+                with torch.no_grad(), torch.cuda.graph(graph):
+                    static_output = self.model(static_input)
+                self._cuda_graphs[batch_size] = (graph, static_input, static_output)
+            
+            logger.info(f"Captured CUDA graphs for batch sizes {sorted(self._cuda_graphs)}")
+            
+        except Exception as e:
+            logger.warning(f"CUDA graph capture failed, using regular forward passes: {e}")
+            self._cuda_graphs = {}
+    
+    def _warm_up(self) -> None:
+        """Run dummy forward passes so the first request does not pay for JIT profiling and kernel selection"""
+        if not self.is_available():
+            return
+        
+        size = DiseaseDetectionConfig.IMAGE_SIZE
+        try:
+            dummy = torch.zeros(
+                1, 3, size, size, device=self.device, dtype=self.input_dtype
+            ).contiguous(memory_format=torch.channels_last)
+            
+            # TorchScript's profiling executor specializes the graph over the first few runs
+            with torch.inference_mode():
+                for _ in range(DiseaseDetectionConfig.WARMUP_ITERATIONS):
+                    self.model(dummy)
+            logger.info("Disease detection model warmed up")
+            
+        except Exception as e:
+            logger.warning(f"Disease detection warm-up failed: {e}")
+    
+    def _forward(self, batch: torch.Tensor) -> torch.Tensor:
+        """Run the model, replaying the smallest captured CUDA graph that fits the batch"""
+        batch_size = batch.shape[0]
+        captured = [size for size in self._cuda_graphs if size >= batch_size]
+        if not captured:
+            return self.model(batch)
+        
+        graph, static_input, static_output = self._cuda_graphs[min(captured)]
+        with self._cuda_graph_lock:
+            static_input[:batch_size].copy_(batch)
+            static_input[batch_size:].zero_()
+            graph.replay()
+            return static_output[:batch_size].clone()
+    
     def is_available(self) -> bool:
         """Check if the disease detection service is available"""
         return self.model is not None
@@ -106,37 +306,35 @@ class DiseaseDetectionService:
     def preprocess_image(self, image_data: Any) -> Optional[torch.Tensor]:
         """Preprocess image data for model inference"""
         try:
-            # Handle different input types
+            # Handle different input types, decoding straight to an RGB uint8 array
             if isinstance(image_data, str):
                 # File path
-                image = cv2.imread(image_data)
-                if image is None:
+                try:
+                    image = np.asarray(Image.open(image_data).convert("RGB"))
+                except OSError:
                     logger.error(f"Could not load image from path: {image_data}")
                     return None
-                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
                 
             elif isinstance(image_data, bytes):
                 # Bytes data from file upload
-                image = Image.open(io.BytesIO(image_data))
-                image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+                image = np.asarray(Image.open(io.BytesIO(image_data)).convert("RGB"))
                 
             elif isinstance(image_data, np.ndarray):
-                # NumPy array
-                image = cv2.cvtColor(image_data, cv2.COLOR_BGR2RGB)
+                # NumPy array in OpenCV BGR channel order
+                image = np.ascontiguousarray(image_data[..., ::-1])
                 
             elif isinstance(image_data, Image.Image):
                 # PIL Image
-                image = cv2.cvtColor(np.array(image_data), cv2.COLOR_RGB2BGR)
-                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+                image = np.asarray(image_data.convert("RGB"))
                 
             else:
                 logger.error(f"Unsupported image input type: {type(image_data)}")
                 return None
             
-            # Convert to PIL and apply transforms
-            pil_image = Image.fromarray(image)
-            input_tensor = self.transforms(pil_image).unsqueeze(0).to(self.device)
+            # Apply transforms
+            input_tensor = self.transforms(image).unsqueeze(0).to(
+                self.device, dtype=self.input_dtype
+            ).contiguous(memory_format=torch.channels_last)
             
             return input_tensor
             
@@ -154,136 +352,187 @@ class DiseaseDetectionService:
         Returns:
             Dictionary with prediction results
         """
+        return self.predict_disease_batch([image_data])[0]
+    
+    def predict_disease_batch(self, images: List[Any]) -> List[Dict[str, Any]]:
+        """
+        Predict coffee disease for several images with a single forward pass
+        
+        Args:
+            images: Image data items (file path, bytes, numpy array, or PIL Image)
+            
+        Returns:
+            List of prediction results, one per image and in the same order
+        """
         if not self.is_available():
             # Fallback response when model is not available
             logger.warning("Disease detection model not available, providing fallback response")
-            return {
-                'success': True,
-                'error': None,
-                'predicted_class': 'Model_Unavailable',
-                'confidence': 0.0,
-                'probabilities': {
-                    'Healthy': 0.2,
-                    'Miner': 0.2,
-                    'Rust': 0.2,
-                    'Phoma': 0.2,
-                    'Cercospora': 0.2
-                },
-                'recommendations': [
-                    "Disease detection model is currently unavailable.",
-                    "The model file appears to be corrupted and needs to be retrained or replaced.",
-                    "Please contact support for assistance with model restoration.",
-                    "In the meantime, consult with local agricultural experts for disease identification.",
-                    "Monitor your coffee plants regularly for signs of disease."
-                ],
-                'notice': 'This is a fallback response. The AI model requires attention.'
-            }
+            return [self._fallback_result() for _ in images]
         
-        try:
-            # Preprocess image
+        results: List[Optional[Dict[str, Any]]] = [None] * len(images)
+        tensors = []
+        positions = []
+        
+        # Preprocess images, keeping track of which ones failed
+        for position, image_data in enumerate(images):
             input_tensor = self.preprocess_image(image_data)
             if input_tensor is None:
-                return {
-                    'success': False,
-                    'error': 'Failed to preprocess image',
-                    'predicted_class': None,
-                    'confidence': 0.0,
-                    'probabilities': {},
-                    'recommendations': []
-                }
-            
-            # Model inference
-            with torch.no_grad():
-                output = self.model(input_tensor)
-                probabilities = torch.softmax(output, dim=1)
-                predicted_class_index = torch.argmax(probabilities, dim=1).item()
-                confidence = probabilities[0][predicted_class_index].item()
-            
-            # Get predicted class name
-            predicted_class = DiseaseDetectionConfig.CATEGORY_MAPPING.get(
-                predicted_class_index, 'Unknown'
-            )
-            
-            # Create probability dictionary
-            prob_dict = {}
-            for idx, class_name in DiseaseDetectionConfig.CATEGORY_MAPPING.items():
-                prob_dict[class_name] = float(probabilities[0][idx].item())
-            
-            # Generate recommendations
-            recommendations = self._get_recommendations(predicted_class, confidence)
+                results[position] = self._error_result('Failed to preprocess image')
+            else:
+                tensors.append(input_tensor)
+                positions.append(position)
+        
+        if tensors:
+            for position, result in zip(positions, self._predict_tensors(tensors)):
+                results[position] = result
+        
+        return results
+    
+    def _predict_tensors(self, tensors: List[torch.Tensor]) -> List[Dict[str, Any]]:
+        """
+        Run one forward pass over already preprocessed image tensors
+        
+        Args:
+            tensors: Preprocessed tensors of shape (1, 3, H, W)
             
-            logger.info(f"Disease prediction: {predicted_class} (confidence: {confidence:.4f})")
+        Returns:
+            List of prediction results, one per tensor and in the same order
+        """
+        try:
+            # Model inference; inference mode also skips version counter bookkeeping
+            with torch.inference_mode():
+                output = self._forward(torch.cat(tensors, dim=0))
+                # One device-to-host copy for the whole batch
+                probabilities = torch.softmax(output.float(), dim=1).cpu().numpy()
             
-            return {
-                'success': True,
-                'error': None,
-                'predicted_class': predicted_class,
-                'confidence': float(confidence),
-                'probabilities': prob_dict,
-                'recommendations': recommendations
-            }
+            return [self._build_prediction(row) for row in probabilities]
             
         except Exception as e:
             logger.error(f"Disease prediction error: {str(e)}")
-            return {
-                'success': False,
-                'error': f'Prediction failed: {str(e)}',
-                'predicted_class': None,
-                'confidence': 0.0,
-                'probabilities': {},
-                'recommendations': []
-            }
+            return [self._error_result(f'Prediction failed: {str(e)}') for _ in tensors]
     
-    def _get_recommendations(self, predicted_class: str, confidence: float) -> List[str]:
-        """Generate recommendations based on prediction"""
-        recommendations = []
+    async def predict_disease_async(self, image_data: Any) -> Dict[str, Any]:
+        """
+        Predict coffee disease without blocking the event loop
         
-        if confidence < 0.6:
-            recommendations.append(
-                "Low confidence prediction. Consider taking multiple photos from different angles for better accuracy."
-            )
+        Images are decoded in a worker thread, then concurrent calls are
+        coalesced into batches of up to ``max_batch_size`` images, waiting at
+        most ``max_batch_wait`` seconds for a batch to fill.
         
-        if predicted_class == "Healthy":
-            recommendations.extend([
-                "Your coffee plants appear healthy! Continue with regular care and monitoring.",
-                "Maintain good agricultural practices including proper spacing, pruning, and fertilization.",
-                "Monitor regularly for early signs of disease to catch issues before they spread."
-            ])
+        Args:
+            image_data: Image data (file path, bytes, numpy array, or PIL Image)
+            
+        Returns:
+            Dictionary with prediction results
+        """
+        if not self.is_available():
+            logger.warning("Disease detection model not available, providing fallback response")
+            return self._fallback_result()
+        
+        # Decoding and resizing a large upload takes tens of milliseconds
+        input_tensor = await asyncio.to_thread(self.preprocess_image, image_data)
+        if input_tensor is None:
+            return self._error_result('Failed to preprocess image')
+        
+        if self._batch_worker is None or self._batch_worker.done():
+            self._batch_queue = asyncio.Queue()
+            self._batch_worker = asyncio.create_task(self._run_batch_worker(self._batch_queue))
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._batch_queue.put((input_tensor, future))
+        return await future
+    
+    async def _run_batch_worker(self, queue: asyncio.Queue) -> None:
+        """Collect queued prediction requests into batches and run them off the event loop"""
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_batch_wait
+            
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                results = await loop.run_in_executor(
+                    None, self._predict_tensors, [input_tensor for input_tensor, _ in batch]
+                )
+            except Exception as e:
+                logger.error(f"Batched disease prediction error: {str(e)}")
+                results = [self._error_result(f'Prediction failed: {str(e)}') for _ in batch]
+            
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+    
+    def _build_prediction(self, probabilities: np.ndarray) -> Dict[str, Any]:
+        """Build the prediction result for one image from its class probabilities"""
+        predicted_class_index = int(probabilities.argmax())
+        confidence = float(probabilities[predicted_class_index])
+        predicted_class = self._class_names[predicted_class_index]
+        prob_dict = dict(zip(self._class_names, probabilities.tolist()))
         
-        elif predicted_class == "Miner":
-            recommendations.extend([
-                "Coffee Leaf Miner detected. This pest creates tunnels in coffee leaves.",
-                "Apply appropriate insecticides like chlorpyrifos or imidacloprid.",
-                "Improve farm sanitation by removing fallen leaves and pruning affected branches.",
-                "Consider biological control using parasitic wasps if available in your area."
-            ])
+        # Generate recommendations
+        recommendations = self._get_recommendations(predicted_class, confidence)
         
-        elif predicted_class == "Rust":
-            recommendations.extend([
-                "Coffee Leaf Rust detected. This is a serious fungal disease that can cause significant yield losses.",
-                "Apply copper-based fungicides immediately.",
-                "Improve air circulation by proper pruning and spacing of plants.",
-                "Remove and destroy infected leaves to prevent spread.",
-                "Consider resistant coffee varieties for future planting."
-            ])
+        logger.info(f"Disease prediction: {predicted_class} (confidence: {confidence:.4f})")
         
-        elif predicted_class == "Phoma":
-            recommendations.extend([
-                "Phoma disease detected. This fungal infection affects coffee leaves and can spread quickly.",
-                "Apply systemic fungicides containing propiconazole or tebuconazole.",
-                "Ensure proper drainage to reduce moisture levels around plants.",
-                "Remove infected plant material and dispose of it away from the farm.",
-                "Monitor closely and treat early to prevent spread."
-            ])
+        return {
+            'success': True,
+            'error': None,
+            'predicted_class': predicted_class,
+            'confidence': float(confidence),
+            'probabilities': prob_dict,
+            'recommendations': recommendations
+        }
+    
+    def _error_result(self, error: str) -> Dict[str, Any]:
+        """Build a failed prediction result"""
+        return {
+            'success': False,
+            'error': error,
+            'predicted_class': None,
+            'confidence': 0.0,
+            'probabilities': {},
+            'recommendations': []
+        }
+    
+    def _fallback_result(self) -> Dict[str, Any]:
+        """Build the response returned while the model is unavailable"""
+        return {
+            'success': True,
+            'error': None,
+            'predicted_class': 'Model_Unavailable',
+            'confidence': 0.0,
+            'probabilities': {
+                'Healthy': 0.2,
+                'Miner': 0.2,
+                'Rust': 0.2,
+                'Phoma': 0.2,
+                'Cercospora': 0.2
+            },
+            'recommendations': [
+                "Disease detection model is currently unavailable.",
+                "The model file appears to be corrupted and needs to be retrained or replaced.",
+                "Please contact support for assistance with model restoration.",
+                "In the meantime, consult with local agricultural experts for disease identification.",
+                "Monitor your coffee plants regularly for signs of disease."
+            ],
+            'notice': 'This is a fallback response. The AI model requires attention.'
+        }
+    
+    def _get_recommendations(self, predicted_class: str, confidence: float) -> List[str]:
+        """Generate recommendations based on prediction"""
+        recommendations = list(_RECOMMENDATIONS.get(predicted_class, ()))
         
-        elif predicted_class == "Cercospora":
-            recommendations.extend([
-                "Cercospora leaf spot detected. This fungal disease causes brown spots on leaves.",
-                "Apply fungicides containing mancozeb or copper compounds.",
-                "Improve air circulation through proper pruning.",
-                "Avoid overhead irrigation to reduce leaf wetness.",
-                "Remove fallen leaves and infected plant material."
-            ])
+        if confidence < 0.6:
+            recommendations.insert(0, _LOW_CONFIDENCE_RECOMMENDATION)
         
         return recommendations
     
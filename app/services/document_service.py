@@ -3,26 +3,224 @@ Document processing service for handling coffee farming documents.
 Supports PDF, DOCX, TXT files and integrates with the existing vector database.
 """
 
+import atexit
+import functools
+import io
 import logging
+import mmap
+import os
+import re
 import uuid
 import hashlib
+from bisect import bisect_left
 import mimetypes
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Union
 from datetime import datetime
-import aiofiles
+import numpy as np
 
+import fitz
 import pdfplumber
 from docx import Document as DocxDocument
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from sqlalchemy import ARRAY, Column, Integer, MetaData, String, Table, Text, insert, text
 
 from app.database import db_manager
-from app.services.embedding import vector_memory_service
+from app.services.embedding import QDRANT_SEARCH_PARAMS, vector_memory_service
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# A sentence runs up to terminal punctuation followed by whitespace (so "3.5" stays
+# whole) or to the end of the text
+_SENTENCE_RE = re.compile(r".+?(?:[.!?]+(?=\s|$)\s*|$)", re.DOTALL)
+
+# Chunks per embedding batch and Qdrant upsert request when storing documents
+_CHUNK_BATCH_SIZE = 64
+
+# Tags every stored document chunk carries in its Qdrant payload
+_DEFAULT_TAGS = ("coffee", "farming")
+
+# Blocking Qdrant calls in flight at once on the thread pool, per service
+_QDRANT_CONCURRENCY = 16
+
+# Bytes per write when saving an upload, hashed as each block goes to disk
+_UPLOAD_WRITE_BLOCK_SIZE = 1024 * 1024
+
+# Worker pools shared by every DocumentProcessor: CPU-bound parsing runs in
+# processes, blocking hashing, disk and embedding calls run in threads
+_CPU_WORKERS = os.cpu_count() or 2
+_CPU_POOL = ProcessPoolExecutor(max_workers=_CPU_WORKERS)
+_IO_POOL = ThreadPoolExecutor(max_workers=8)
+atexit.register(_CPU_POOL.shutdown)
+
+
+def _extract_docx_text(source: Union[bytes, str]) -> str:
+    """Extract non-empty paragraphs from a DOCX file; module-level so it can run in a worker process."""
+    doc = DocxDocument(source if isinstance(source, str) else io.BytesIO(source))
+    paragraphs = []
+    for paragraph in doc.paragraphs:
+        if paragraph.text.strip():
+            paragraphs.append(paragraph.text.strip())
+    return "\n\n".join(paragraphs)
+
+
+def encode_document_cursor(document: Dict[str, Any]) -> str:
+    """Build a list_documents page cursor from the last document of a page."""
+    return f"{document['upload_date']}|{document['document_id']}"
+
+
+def decode_document_cursor(cursor: str) -> Tuple[datetime, str]:
+    """
+    Parse a page cursor back into the (upload_date, document_id) keyset.
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    upload_date, separator, document_id = cursor.partition("|")
+    if not separator or not document_id:
+        raise ValueError(f"Invalid document cursor: {cursor}")
+    return datetime.fromisoformat(upload_date), document_id
+
+
+def _open_pdf(source: Union[bytes, str]) -> fitz.Document:
+    """Open a PDF from a saved file path, or from raw bytes."""
+    if isinstance(source, str):
+        return fitz.open(source, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def _count_pdf_pages(source: Union[bytes, str]) -> int:
+    """Count the pages of a PDF."""
+    with _open_pdf(source) as pdf:
+        return pdf.page_count
+
+
+def _read_text_file(file_path: str) -> str:
+    """Decode a saved text file straight from a read-only memory map of it."""
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return str(mapped, "utf-8", "ignore")
+
+
+# Schema of the documents metadata table, created once at startup
+_CREATE_DOCUMENTS_TABLE = text("""
+    CREATE TABLE IF NOT EXISTS documents (
+        id SERIAL PRIMARY KEY,
+        document_id VARCHAR(36) UNIQUE NOT NULL,
+        filename VARCHAR(255) NOT NULL,
+        file_path VARCHAR(500) NOT NULL,
+        file_hash VARCHAR(64) NOT NULL,
+        file_size INTEGER NOT NULL,
+        file_type VARCHAR(100) NOT NULL,
+        user_id VARCHAR(100) NOT NULL,
+        description TEXT,
+        tags TEXT[],
+        chunk_count INTEGER DEFAULT 0,
+        upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+""")
+_CREATE_DOCUMENTS_HASH_INDEX = text(
+    "CREATE INDEX IF NOT EXISTS idx_documents_hash_user ON documents(file_hash, user_id)"
+)
+_CREATE_DOCUMENT_CHUNKS_TABLE = text("""
+    CREATE TABLE IF NOT EXISTS document_chunks (
+        chunk_id VARCHAR(64) PRIMARY KEY,
+        document_id VARCHAR(36) NOT NULL REFERENCES documents(document_id) ON DELETE CASCADE,
+        chunk_index INTEGER NOT NULL,
+        content TEXT NOT NULL
+    )
+""")
+_CREATE_DOCUMENT_CHUNKS_INDEX = text(
+    "CREATE INDEX IF NOT EXISTS idx_document_chunks_document ON document_chunks(document_id)"
+)
+_CREATE_DOCUMENTS_LISTING_INDEX = text(
+    "CREATE INDEX IF NOT EXISTS idx_documents_user_date "
+    "ON documents(user_id, upload_date DESC, document_id DESC)"
+)
+
+# Columns written on upload, so the INSERT is compiled once and cached by SQLAlchemy
+_documents_table = Table(
+    "documents", MetaData(),
+    Column("document_id", String(36)),
+    Column("filename", String(255)),
+    Column("file_path", String(500)),
+    Column("file_hash", String(64)),
+    Column("file_size", Integer),
+    Column("file_type", String(100)),
+    Column("user_id", String(100)),
+    Column("description", Text),
+    Column("tags", ARRAY(Text)),
+    Column("chunk_count", Integer),
+)
+
+# Chunk text lives in Postgres; Qdrant payloads only carry ids and filter fields
+_document_chunks_table = Table(
+    "document_chunks", MetaData(),
+    Column("chunk_id", String(64)),
+    Column("document_id", String(36)),
+    Column("chunk_index", Integer),
+    Column("content", Text),
+)
+
+
+def _write_and_hash(file_path: Path, content: bytes) -> str:
+    """
+    Save file content to disk, hashing each block as it is written.
+    
+    One pass over the bytes serves both deduplication and storage; hashlib
+    releases the GIL, so this runs well in a worker thread.
+    
+    Args:
+        file_path: Destination path
+        content: Raw file content
+        
+    Returns:
+        Hex SHA-256 digest of the content
+    """
+    hasher = hashlib.sha256()
+    view = memoryview(content)
+    with open(file_path, "wb") as f:
+        for start in range(0, len(view), _UPLOAD_WRITE_BLOCK_SIZE):
+            block = view[start:start + _UPLOAD_WRITE_BLOCK_SIZE]
+            hasher.update(block)
+            f.write(block)
+    return hasher.hexdigest()
+
+
+def _extract_page_range(source: Union[bytes, str], page_indices: Sequence[int]) -> List[Tuple[int, str]]:
+    """
+    Extract text from some pages of a PDF.
+    
+    Uses PyMuPDF's plain text extraction, which skips layout analysis, and
+    retries pages it finds empty with pdfplumber. Module-level so it can run
+    in a worker process; each worker opens its own copy of the document, so
+    passing a saved file path avoids pickling the whole PDF to every worker.
+    
+    Args:
+        source: Path of the saved PDF, or its raw content
+        page_indices: Zero-based indices of the pages to extract
+        
+    Returns:
+        List of (page index, page text) tuples
+    """
+    with _open_pdf(source) as pdf:
+        pages = [(index, pdf[index].get_text("text").strip()) for index in page_indices]
+    
+    empty = [position for position, (_, text) in enumerate(pages) if not text]
+    if empty:
+        with pdfplumber.open(source if isinstance(source, str) else io.BytesIO(source)) as pdf:
+            for position in empty:
+                index = pages[position][0]
+                pages[position] = (index, pdf.pages[index].extract_text() or "")
+    
+    return pages
+
 
 class DocumentChunk:
     """Represents a chunk of a document."""
@@ -49,23 +247,38 @@ class DocumentProcessor:
     """Handles document parsing and text extraction."""
     
     def __init__(self):
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        # Shared module-level pools: threads for hashing, disk and embedding, processes for parsing
+        self.executor = _IO_POOL
+        self.process_pool = _CPU_POOL
+        self.pdf_workers = _CPU_WORKERS
     
     async def process_file(
         self, 
-        file_content: bytes, 
+        file_content: Union[bytes, Path], 
         filename: str,
         file_type: str
     ) -> List[str]:
-        """Process a file and extract text content."""
+        """
+        Process a file and extract text content.
+        
+        Args:
+            file_content: Raw file content, or the path of the saved file so
+                parsers read it from disk instead of receiving another copy
+            filename: Original filename, for logging
+            file_type: MIME type of the file
+            
+        Returns:
+            List of text chunks
+        """
+        source = str(file_content) if isinstance(file_content, Path) else file_content
         
         try:
             if file_type.startswith('text/'):
-                return await self._process_text_file(file_content)
+                return await self._process_text_file(source)
             elif file_type == 'application/pdf':
-                return await self._process_pdf_file(file_content)
+                return await self._process_pdf_file(source)
             elif file_type in ['application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'application/msword']:
-                return await self._process_docx_file(file_content)
+                return await self._process_docx_file(source)
             else:
                 raise ValueError(f"Unsupported file type: {file_type}")
                 
@@ -73,75 +286,71 @@ class DocumentProcessor:
             logger.error(f"Error processing file {filename}: {e}")
             raise
     
-    async def _process_text_file(self, file_content: bytes) -> List[str]:
+    async def _process_text_file(self, file_content: Union[bytes, str]) -> List[str]:
         """Process plain text files."""
-        text = file_content.decode('utf-8', errors='ignore')
+        if isinstance(file_content, str):
+            text = await asyncio.get_event_loop().run_in_executor(
+                self.executor, _read_text_file, file_content
+            )
+        else:
+            text = file_content.decode('utf-8', errors='ignore')
         return self._chunk_text(text)
     
-    async def _process_pdf_file(self, file_content: bytes) -> List[str]:
-        """Process PDF files."""
+    async def _process_pdf_file(self, file_content: Union[bytes, str]) -> List[str]:
+        """Process PDF files, extracting page ranges in parallel worker processes."""
         loop = asyncio.get_event_loop()
         
-        def extract_pdf_text():
-            import io
-            with pdfplumber.open(io.BytesIO(file_content)) as pdf:
-                text_pages = []
-                for page in pdf.pages:
-                    page_text = page.extract_text() or ""
-                    text_pages.append(page_text)
-                return "\n\n".join(text_pages)
+        page_count = await loop.run_in_executor(self.executor, _count_pdf_pages, file_content)
         
-        text = await loop.run_in_executor(self.executor, extract_pdf_text)
+        # Interleave pages across workers so dense and sparse sections balance out
+        ranges = [
+            range(start, page_count, self.pdf_workers)
+            for start in range(min(self.pdf_workers, page_count))
+        ]
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self.process_pool, _extract_page_range, file_content, page_range)
+            for page_range in ranges
+        ))
+        
+        pages = sorted(page for result in results for page in result)
+        text = "\n\n".join(page_text for _, page_text in pages)
         return self._chunk_text(text)
     
-    async def _process_docx_file(self, file_content: bytes) -> List[str]:
-        """Process DOCX files."""
+    async def _process_docx_file(self, file_content: Union[bytes, str]) -> List[str]:
+        """Process DOCX files in a worker process."""
         loop = asyncio.get_event_loop()
-        
-        def extract_docx_text():
-            import io
-            doc = DocxDocument(io.BytesIO(file_content))
-            paragraphs = []
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    paragraphs.append(paragraph.text.strip())
-            return "\n\n".join(paragraphs)
-        
-        text = await loop.run_in_executor(self.executor, extract_docx_text)
+        text = await loop.run_in_executor(self.process_pool, _extract_docx_text, file_content)
         return self._chunk_text(text)
     
     def _chunk_text(self, text: str, max_chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-        """Split text into overlapping chunks."""
+        """
+        Split text into overlapping chunks of whole sentences.
+        
+        Sentence offsets are found in one regex pass and chunks are sliced from
+        the original text, so the cost is linear in the document length.
+        """
         if not text.strip():
             return []
         
-        # Split by sentences first for better chunks
-        sentences = text.split('. ')
+        spans = [(match.start(), match.end()) for match in _SENTENCE_RE.finditer(text)]
+        starts = [start for start, _ in spans]
         chunks = []
-        current_chunk = ""
+        chunk_start = chunk_end = 0
         
-        for sentence in sentences:
+        for start, end in spans:
             # If adding this sentence would exceed max size, start new chunk
-            if len(current_chunk) + len(sentence) > max_chunk_size and current_chunk:
-                chunks.append(current_chunk.strip())
-                
-                # Create overlap by keeping last part of previous chunk
-                if overlap > 0 and len(current_chunk) > overlap:
-                    current_chunk = current_chunk[-overlap:] + sentence
-                else:
-                    current_chunk = sentence
-            else:
-                current_chunk += (". " if current_chunk else "") + sentence
+            if end - chunk_start > max_chunk_size and chunk_end > chunk_start:
+                chunks.append(text[chunk_start:chunk_end])
+                # Overlap by restarting at the first sentence within the last `overlap`
+                # characters, unless that would repeat the whole previous chunk
+                overlap_start = starts[bisect_left(starts, chunk_end - overlap)] if overlap > 0 else start
+                chunk_start = overlap_start if overlap_start > chunk_start else start
+            chunk_end = end
         
         # Add the last chunk
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
+        chunks.append(text[chunk_start:chunk_end])
         
-        # If no sentences found, split by characters
-        if not chunks and text:
-            chunks = [text[i:i+max_chunk_size] for i in range(0, len(text), max_chunk_size)]
-        
-        return chunks
+        return [chunk for chunk in map(str.strip, chunks) if chunk]
 
 
 class DocumentService:
@@ -149,40 +358,111 @@ class DocumentService:
     
     def __init__(self):
         self.processor = DocumentProcessor()
+        # Shared embedder; its model is loaded and warmed by vector_memory_service.initialize()
+        self._embedder = vector_memory_service.embedding_service
         self.document_collection = "document_embeddings"
         self.upload_dir = Path("uploads")
         self.upload_dir.mkdir(exist_ok=True)
+        self._qdrant_sem = asyncio.Semaphore(_QDRANT_CONCURRENCY)
+    
+    async def _run_qdrant(self, fn, *args, **kwargs):
+        """Run a blocking Qdrant client call on the processor's thread pool, capping concurrent calls."""
+        async with self._qdrant_sem:
+            return await asyncio.get_event_loop().run_in_executor(
+                self.processor.executor, functools.partial(fn, *args, **kwargs)
+            )
     
     async def initialize(self):
         """Initialize the document service."""
         await self._create_document_collection()
+        async with db_manager.get_postgres_session() as session:
+            await self._ensure_documents_table(session)
         logger.info("Document service initialized")
     
     async def _create_document_collection(self):
-        """Create document collection in Qdrant if it doesn't exist."""
+        """Create document collection in Qdrant if it doesn't exist, with int8 scalar quantization."""
         try:
+            from qdrant_client.models import (
+                Distance, VectorParams, ScalarQuantization, ScalarQuantizationConfig,
+                ScalarType, HnswConfigDiff, OptimizersConfigDiff
+            )
+            
+            # int8 vectors kept in RAM are 4x smaller; originals stay on disk for rescoring
+            quantization_config = ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+            
             qdrant_client = db_manager.get_qdrant_client()
-            collections_info = qdrant_client.get_collections()
+            collections_info = await self._run_qdrant(qdrant_client.get_collections)
             existing_names = [col.name for col in collections_info.collections]
             
             if self.document_collection not in existing_names:
-                from qdrant_client.models import Distance, VectorParams
-                
-                qdrant_client.create_collection(
+                await self._run_qdrant(
+                    qdrant_client.create_collection,
                     collection_name=self.document_collection,
                     vectors_config=VectorParams(
                         size=384,  # sentence-transformers/all-MiniLM-L6-v2
-                        distance=Distance.COSINE
-                    )
+                        distance=Distance.DOT,  # embeddings are unit length
+                        on_disk=True
+                    ),
+                    quantization_config=quantization_config,
+                    hnsw_config=HnswConfigDiff(m=16, ef_construct=128),
+                    optimizers_config=OptimizersConfigDiff(memmap_threshold=20000)
                 )
                 logger.info(f"Created document collection: {self.document_collection}")
             else:
                 logger.info(f"Document collection already exists: {self.document_collection}")
                 
+                # Collections created before quantization was enabled are upgraded in place
+                collection_info = await self._run_qdrant(qdrant_client.get_collection, self.document_collection)
+                if collection_info.config.quantization_config is None:
+                    await self._run_qdrant(
+                        qdrant_client.update_collection,
+                        collection_name=self.document_collection,
+                        quantization_config=quantization_config
+                    )
+                    logger.info(f"Enabled scalar quantization on: {self.document_collection}")
+            
+            await self._create_payload_indexes(qdrant_client)
+                
         except Exception as e:
             logger.error(f"Failed to create document collection: {e}")
             raise
     
+    async def _create_payload_indexes(self, qdrant_client):
+        """Index the payload fields used by search and delete filters; existing indexes are kept."""
+        from qdrant_client.models import PayloadSchemaType
+        
+        for field_name, field_schema in (
+            ("user_id", PayloadSchemaType.KEYWORD),
+            ("document_id", PayloadSchemaType.KEYWORD),
+            ("tags", PayloadSchemaType.KEYWORD),
+            ("chunk_index", PayloadSchemaType.INTEGER),
+        ):
+            try:
+                await self._run_qdrant(
+                    qdrant_client.create_payload_index,
+                    collection_name=self.document_collection,
+                    field_name=field_name,
+                    field_schema=field_schema
+                )
+            except Exception as e:
+                logger.warning(f"Could not create payload index on {field_name}: {e}")
+    
+    async def _ensure_documents_table(self, session):
+        """Create the documents and document_chunks tables and their indexes in PostgreSQL if they don't exist."""
+        try:
+            await session.execute(_CREATE_DOCUMENTS_TABLE)
+            await session.execute(_CREATE_DOCUMENTS_HASH_INDEX)
+            await session.execute(_CREATE_DOCUMENTS_LISTING_INDEX)
+            await session.execute(_CREATE_DOCUMENT_CHUNKS_TABLE)
+            await session.execute(_CREATE_DOCUMENT_CHUNKS_INDEX)
+            await session.commit()
+            
+        except Exception as e:
+            logger.error(f"Failed to create documents table: {e}")
+            raise
+    
     async def upload_document(
         self,
         file_content: bytes,
@@ -202,34 +482,39 @@ class DocumentService:
             # Generate document ID
             document_id = str(uuid.uuid4())
             
-            # Create file hash for deduplication
-            file_hash = hashlib.sha256(file_content).hexdigest()
-            
-            # Save file to disk
+            # Save file to disk, hashing it for deduplication in the same pass
             file_path = self.upload_dir / f"{document_id}_{filename}"
-            async with aiofiles.open(file_path, 'wb') as f:
-                await f.write(file_content)
+            file_size = len(file_content)
+            file_hash = await self._write_upload(file_path, file_content)
+            del file_content
+            
+            # Re-uploads of the same file by the same user reuse the processed document
+            existing_document_id = await self._find_duplicate_document(file_hash, user_id)
+            if existing_document_id:
+                logger.info(f"Document {filename} already uploaded with ID: {existing_document_id}")
+                file_path.unlink(missing_ok=True)
+                return existing_document_id
             
-            # Process document and extract text
+            # Process document and extract text from the saved file
             text_chunks = await self.processor.process_file(
-                file_content, filename, file_type
+                file_path, filename, file_type
             )
             
             if not text_chunks:
                 raise ValueError("No text content could be extracted from the document")
             
-            # Store document metadata in PostgreSQL
+            # Store document metadata and chunk text in PostgreSQL
             await self._store_document_metadata(
                 document_id=document_id,
                 filename=filename,
                 file_path=str(file_path),
                 file_hash=file_hash,
-                file_size=len(file_content),
+                file_size=file_size,
                 file_type=file_type,
                 user_id=user_id,
                 description=description,
                 tags=tags,
-                chunk_count=len(text_chunks)
+                text_chunks=text_chunks
             )
             
             # Create embeddings and store in vector database
@@ -251,6 +536,27 @@ class DocumentService:
                 Path(file_path).unlink(missing_ok=True)
             raise
     
+    async def _find_duplicate_document(self, file_hash: str, user_id: str) -> Optional[str]:
+        """Return the ID of a document this user already uploaded with the same content, if any."""
+        try:
+            async with db_manager.get_postgres_session() as session:
+                result = await session.execute(text("""
+                    SELECT document_id FROM documents
+                    WHERE file_hash = :file_hash AND user_id = :user_id
+                    LIMIT 1
+                """), {"file_hash": file_hash, "user_id": user_id})
+                return result.scalar()
+                
+        except Exception as e:
+            logger.warning(f"Duplicate document check failed: {e}")
+            return None
+    
+    async def _write_upload(self, file_path: Path, file_content: bytes) -> str:
+        """Save uploaded file content to disk on the processor's thread pool and return its SHA-256."""
+        return await asyncio.get_event_loop().run_in_executor(
+            self.processor.executor, _write_and_hash, file_path, file_content
+        )
+    
     async def search_documents(
         self,
         query: str,
@@ -263,9 +569,9 @@ class DocumentService:
         
         try:
             # Create query embedding
-            embedding = vector_memory_service.embedding_service.create_embedding(query)
+            embedding = await self._embedder.create_embedding(query)
             
-            # Create filter
+            # Restrict to the requested owner and tags
             from qdrant_client.models import Filter, FieldCondition, MatchValue, MatchAny
             
             filter_conditions = []
@@ -280,30 +586,48 @@ class DocumentService:
             
             search_filter = Filter(must=filter_conditions) if filter_conditions else None
             
-            # Search in Qdrant
-            qdrant_client = db_manager.get_qdrant_client()
-            search_results = qdrant_client.search(
+            # Search Qdrant's quantized index; both filter fields are keyword-indexed
+            qdrant_client = db_manager.get_async_qdrant_client()
+            response = await qdrant_client.query_points(
                 collection_name=self.document_collection,
-                query_vector=embedding,
+                query=np.asarray(embedding, dtype=np.float32).tolist(),
                 query_filter=search_filter,
                 limit=limit,
-                score_threshold=similarity_threshold
+                score_threshold=similarity_threshold,
+                with_payload=True,
+                search_params=QDRANT_SEARCH_PARAMS
             )
+            matches = [(point.payload, point.score) for point in response.points]
+            
+            # Join chunk text and document fields; points stored before chunk text moved
+            # to PostgreSQL still carry them in their payload
+            details = await self._fetch_chunk_details([payload.get("chunk_id") for payload, _ in matches])
             
             # Format results
             results = []
-            for result in search_results:
+            for payload, score in matches:
+                metadata = {
+                    k: v for k, v in payload.items()
+                    if k not in ["chunk_id", "document_id", "content", "user_id"]
+                }
+                row = details.get(payload.get("chunk_id"))
+                if row is not None:
+                    metadata.update(
+                        filename=row.filename,
+                        file_type=row.file_type,
+                        upload_date=row.upload_date.isoformat(),
+                        full_content=row.content
+                    )
+                full_content = metadata.get("full_content") or ""
+                
                 results.append({
-                    "chunk_id": result.payload.get("chunk_id"),
-                    "document_id": result.payload.get("document_id"),
-                    "filename": result.payload.get("filename"),
-                    "content": result.payload.get("content"),
-                    "chunk_index": result.payload.get("chunk_index"),
-                    "similarity_score": result.score,
-                    "metadata": {
-                        k: v for k, v in result.payload.items()
-                        if k not in ["chunk_id", "document_id", "content", "user_id"]
-                    }
+                    "chunk_id": payload.get("chunk_id"),
+                    "document_id": payload.get("document_id"),
+                    "filename": metadata.get("filename"),
+                    "content": full_content[:500],
+                    "chunk_index": payload.get("chunk_index"),
+                    "similarity_score": score,
+                    "metadata": metadata
                 })
             
             logger.info(f"Found {len(results)} relevant document chunks for query: {query[:50]}...")
@@ -317,8 +641,6 @@ class DocumentService:
         """Get document metadata."""
         try:
             async with db_manager.get_postgres_session() as session:
-                from sqlalchemy import text
-                
                 query = text("""
                     SELECT 
                         document_id, filename, file_size, file_type, 
@@ -353,29 +675,43 @@ class DocumentService:
         self, 
         user_id: Optional[str] = None, 
         limit: int = 20, 
-        offset: int = 0
+        offset: int = 0,
+        after: Optional[Tuple[datetime, str]] = None
     ) -> List[Dict[str, Any]]:
-        """List uploaded documents."""
+        """
+        List uploaded documents, newest first.
+        
+        Pass the (upload_date, document_id) of the last document seen as `after`
+        to fetch the next page from the index instead of skipping `offset` rows.
+        """
         try:
             async with db_manager.get_postgres_session() as session:
-                from sqlalchemy import text
+                conditions = []
+                if user_id is not None:
+                    conditions.append("user_id = :user_id")
+                if after is not None:
+                    conditions.append("(upload_date, document_id) < (:after_date, :after_id)")
                 
-                query = text("""
+                query = text(f"""
                     SELECT 
                         document_id, filename, file_size, file_type, 
                         description, tags, chunk_count, upload_date,
                         user_id
                     FROM documents 
-                    WHERE (:user_id IS NULL OR user_id = :user_id)
-                    ORDER BY upload_date DESC
-                    LIMIT :limit OFFSET :offset
+                    {"WHERE " + " AND ".join(conditions) if conditions else ""}
+                    ORDER BY upload_date DESC, document_id DESC
+                    LIMIT :limit{"" if after is not None else " OFFSET :offset"}
                 """)
                 
-                result = await session.execute(query, {
-                    "user_id": user_id,
-                    "limit": limit,
-                    "offset": offset
-                })
+                params = {"limit": limit}
+                if user_id is not None:
+                    params["user_id"] = user_id
+                if after is not None:
+                    params["after_date"], params["after_id"] = after
+                else:
+                    params["offset"] = offset
+                
+                result = await session.execute(query, params)
                 
                 documents = []
                 for row in result.fetchall():
@@ -417,15 +753,14 @@ class DocumentService:
                 must=[FieldCondition(key="document_id", match=MatchValue(value=document_id))]
             )
             
-            qdrant_client.delete(
+            await self._run_qdrant(
+                qdrant_client.delete,
                 collection_name=self.document_collection,
                 points_selector=delete_filter
             )
             
             # Delete from PostgreSQL
             async with db_manager.get_postgres_session() as session:
-                from sqlalchemy import text
-                
                 query = text("DELETE FROM documents WHERE document_id = :document_id")
                 await session.execute(query, {"document_id": document_id})
                 await session.commit()
@@ -454,44 +789,12 @@ class DocumentService:
         user_id: str,
         description: Optional[str],
         tags: Optional[List[str]],
-        chunk_count: int
+        text_chunks: List[str]
     ):
-        """Store document metadata in PostgreSQL."""
+        """Store document metadata and chunk text in PostgreSQL in a single transaction."""
         async with db_manager.get_postgres_session() as session:
-            from sqlalchemy import text
-            
-            # First, ensure the documents table exists
-            create_table_query = text("""
-                CREATE TABLE IF NOT EXISTS documents (
-                    id SERIAL PRIMARY KEY,
-                    document_id VARCHAR(36) UNIQUE NOT NULL,
-                    filename VARCHAR(255) NOT NULL,
-                    file_path VARCHAR(500) NOT NULL,
-                    file_hash VARCHAR(64) NOT NULL,
-                    file_size INTEGER NOT NULL,
-                    file_type VARCHAR(100) NOT NULL,
-                    user_id VARCHAR(100) NOT NULL,
-                    description TEXT,
-                    tags TEXT[],
-                    chunk_count INTEGER DEFAULT 0,
-                    upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            await session.execute(create_table_query)
-            
             # Insert document metadata
-            insert_query = text("""
-                INSERT INTO documents (
-                    document_id, filename, file_path, file_hash, file_size, 
-                    file_type, user_id, description, tags, chunk_count
-                ) VALUES (
-                    :document_id, :filename, :file_path, :file_hash, :file_size,
-                    :file_type, :user_id, :description, :tags, :chunk_count
-                )
-            """)
-            
-            await session.execute(insert_query, {
+            await session.execute(insert(_documents_table), {
                 "document_id": document_id,
                 "filename": filename,
                 "file_path": file_path,
@@ -501,11 +804,55 @@ class DocumentService:
                 "user_id": user_id,
                 "description": description,
                 "tags": tags,
-                "chunk_count": chunk_count
+                "chunk_count": len(text_chunks)
             })
             
+            # Insert chunk text, keyed by the chunk IDs used in Qdrant
+            await self._insert_chunk_texts(session, document_id, text_chunks)
+            
             await session.commit()
     
+    async def _insert_chunk_texts(self, session, document_id: str, text_chunks: List[str]):
+        """Insert chunk rows with COPY when the driver is asyncpg, else with executemany."""
+        records = [
+            (f"{document_id}_chunk_{i}", document_id, i, chunk_text)
+            for i, chunk_text in enumerate(text_chunks)
+        ]
+        
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        driver_connection = getattr(raw_connection, "driver_connection", None)
+        if hasattr(driver_connection, "copy_records_to_table"):
+            await driver_connection.copy_records_to_table(
+                "document_chunks",
+                records=records,
+                columns=["chunk_id", "document_id", "chunk_index", "content"]
+            )
+        else:
+            await session.execute(insert(_document_chunks_table), [
+                dict(zip(("chunk_id", "document_id", "chunk_index", "content"), record))
+                for record in records
+            ])
+    
+    async def _fetch_chunk_details(self, chunk_ids: List[str]) -> Dict[str, Any]:
+        """Fetch chunk text and document fields for search hits in one query, keyed by chunk ID."""
+        if not chunk_ids:
+            return {}
+        
+        try:
+            async with db_manager.get_postgres_session() as session:
+                result = await session.execute(text("""
+                    SELECT c.chunk_id, c.content, d.filename, d.file_type, d.upload_date
+                    FROM document_chunks c
+                    JOIN documents d ON d.document_id = c.document_id
+                    WHERE c.chunk_id = ANY(:chunk_ids)
+                """), {"chunk_ids": chunk_ids})
+                return {row.chunk_id: row for row in result.fetchall()}
+                
+        except Exception as e:
+            logger.warning(f"Failed to fetch document chunk text: {e}")
+            return {}
+    
     async def _store_document_chunks(
         self,
         document_id: str,
@@ -514,44 +861,60 @@ class DocumentService:
         user_id: str,
         file_type: str
     ):
-        """Store document chunks as embeddings in vector database."""
+        """
+        Store document chunks as embeddings in vector database.
         
-        # Create embeddings for all chunks
-        embeddings = vector_memory_service.embedding_service.create_batch_embeddings(text_chunks)
-        
-        # Create points for Qdrant
+        Chunks are embedded in batches on the embedding thread pool; each
+        batch's upsert runs while the next batch is being embedded.
+        """
         from qdrant_client.models import PointStruct
+        
+        qdrant_client = db_manager.get_async_qdrant_client()
         points = []
+        pending_upsert = None
+        # One tags list shared by every payload of this document
+        tags = list(_DEFAULT_TAGS)
         
-        for i, (chunk_text, embedding) in enumerate(zip(text_chunks, embeddings)):
-            point_id = str(uuid.uuid4())
+        try:
+            for start in range(0, len(text_chunks), _CHUNK_BATCH_SIZE):
+                batch_chunks = text_chunks[start:start + _CHUNK_BATCH_SIZE]
+                batch_embeddings = await self._embedder.create_batch_embeddings_async(batch_chunks)
+                
+                # Create points for Qdrant
+                batch_points = [
+                    PointStruct(
+                        id=uuid.uuid4().hex,
+                        vector=embedding,
+                        payload={
+                            # Text and document fields live in PostgreSQL
+                            "document_id": document_id,
+                            "chunk_id": f"{document_id}_chunk_{i}",
+                            "chunk_index": i,
+                            "user_id": user_id,
+                            "tags": tags,
+                        }
+                    )
+                    for i, embedding in zip(range(start, start + len(batch_chunks)), batch_embeddings)
+                ]
+                
+                # Keep at most one upsert in flight; each returns once its chunks are searchable
+                if pending_upsert is not None:
+                    await pending_upsert
+                pending_upsert = asyncio.ensure_future(qdrant_client.upsert(
+                    collection_name=self.document_collection,
+                    points=batch_points,
+                    wait=True
+                ))
+                
+                points.extend(batch_points)
             
-            metadata = {
-                "document_id": document_id,
-                "chunk_id": f"{document_id}_chunk_{i}",
-                "chunk_index": i,
-                "filename": filename,
-                "file_type": file_type,
-                "user_id": user_id,
-                "content": chunk_text[:500],  # Store truncated content for search
-                "full_content": chunk_text,  # Store full content
-                "upload_date": datetime.utcnow().isoformat(),
-                "tags": ["coffee", "farming"],  # Default tags
-            }
-            
-            point = PointStruct(
-                id=point_id,
-                vector=embedding,
-                payload=metadata
-            )
-            points.append(point)
-        
-        # Store in Qdrant
-        qdrant_client = db_manager.get_qdrant_client()
-        qdrant_client.upsert(
-            collection_name=self.document_collection,
-            points=points
-        )
+            if pending_upsert is not None:
+                await pending_upsert
+                
+        except BaseException:
+            if pending_upsert is not None:
+                pending_upsert.cancel()
+            raise
         
         logger.info(f"Stored {len(points)} document chunks for {filename}")
     
@@ -3,17 +3,247 @@ Vector embedding service for semantic memory search.
 Handles text embeddings and vector database operations.
 """
 
+import asyncio
+import hashlib
 import logging
+import os
+import re
 import uuid
-from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, List, Dict, Any, Optional, Tuple
+import torch
 from sentence_transformers import SentenceTransformer
-from qdrant_client.models import PointStruct, Filter, FieldCondition, MatchValue
+from qdrant_client.models import (
+    PointStruct, PointIdsList, Filter, FieldCondition, MatchValue, MatchAny, PayloadSelectorExclude,
+    SearchParams, QuantizationSearchParams
+)
 import numpy as np
 
+try:
+    import simsimd
+except ImportError:  # Optional SIMD kernels; NumPy is used without them
+    simsimd = None
+
+try:
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+except ImportError:  # Optional ONNX Runtime backend; PyTorch is used without it
+    onnxruntime = None
+
 from app.database import db_manager
 
 logger = logging.getLogger(__name__)
 
+# Rows upcast to float32 per matrix product when scoring a half-precision index
+_SCORE_BLOCK_ROWS = 4096
+# Single-text embedding requests are coalesced into batches of up to this many texts,
+# waiting at most this long for more requests to arrive
+_EMBED_BATCH_SIZE = 32
+_EMBED_BATCH_WAIT_SECONDS = 0.005
+# Memory points are upserted to Qdrant in batches of up to this many points,
+# at most this long after the first one was buffered
+_WRITE_BATCH_SIZE = 128
+_WRITE_BATCH_WAIT_SECONDS = 0.05
+# A failed batch is retried this many times in all, doubling the pause each time
+_WRITE_ATTEMPTS = 3
+_WRITE_RETRY_SECONDS = 0.1
+# Threads running the model on CPU; a GPU gets one, since its kernels share a single CUDA stream
+_CPU_ENCODE_WORKERS = 4
+# ONNX exports of the embedding model are cached here, one directory per model
+_ONNX_MODEL_DIR = Path("models") / "onnx"
+# Tokens the model reads per text, matching sentence-transformers' max_seq_length for MiniLM
+_MAX_SEQ_LENGTH = 256
+# Searches answered by Qdrant walk the int8-quantized HNSW graph, then rescore
+# twice the requested candidates against the original float32 vectors
+QDRANT_SEARCH_PARAMS = SearchParams(
+    hnsw_ef=64,
+    exact=False,
+    quantization=QuantizationSearchParams(rescore=True, oversampling=2.0)
+)
+# Runs of whitespace collapsed to one space before embedding
+_WHITESPACE_RE = re.compile(r"\s+")
+# Longer texts are truncated; the model only reads its first 512 tokens anyway
+_MAX_EMBED_CHARS = 2000
+# Conversation payloads keep only a short preview; the full text lives in PostgreSQL
+_PREVIEW_CHARS = 120
+# Embeddings of recently seen texts, and ids of recently stored memory points, keyed by content hash
+_EMBEDDING_CACHE_SIZE = 4096
+# Conversation payload fields returned as top-level result keys rather than metadata
+_CONVERSATION_PAYLOAD_KEYS = frozenset(
+    {"message_id", "content", "preview", "content_hash", "message_type", "session_id", "user_id", "timestamp_epoch"}
+)
+_STORED_POINT_CACHE_SIZE = 4096
+
+
+def _content_key(*parts: str) -> bytes:
+    """Hash text fields into a compact byte-exact cache key."""
+    return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=16).digest()
+
+
+class _EmbeddingBatcher:
+    """
+    Coalesces concurrent single-text embedding requests into one model call.
+    
+    Requests are queued with a future each. A worker task, started on demand
+    and exiting once the queue is drained, collects up to ``max_batch_size``
+    texts or waits ``max_wait_seconds`` for more, encodes them together on
+    ``executor`` (the loop's default executor when unset) and resolves the
+    futures.
+    """
+    
+    def __init__(
+        self,
+        encode: Callable[[List[str]], Any],
+        max_batch_size: int = _EMBED_BATCH_SIZE,
+        max_wait_seconds: float = _EMBED_BATCH_WAIT_SECONDS
+    ):
+        self._encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.executor: Optional[Executor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+    
+    async def submit(self, text: str) -> np.ndarray:
+        """Queue a text for the next batch and wait for its embedding."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = None
+        
+        future = loop.create_future()
+        self._queue.put_nowait((text, future))
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+        return await future
+    
+    async def _run(self):
+        """Encode queued texts in batches until the queue is empty."""
+        loop = asyncio.get_running_loop()
+        while not self._queue.empty():
+            batch = [self._queue.get_nowait()]
+            deadline = loop.time() + self.max_wait_seconds
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            # Callers that gave up while waiting need no embedding
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                continue
+            
+            try:
+                embeddings = await loop.run_in_executor(self.executor, self._encode, [text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+
+
+class _QdrantWriteBuffer:
+    """
+    Buffer coalescing concurrent single-point upserts into batched requests.
+    
+    Points are written with the client returned by ``get_client`` once ``max_batch_size``
+    are buffered or ``max_wait_seconds`` after the first one arrived,
+    whichever comes first. Each point's future resolves once Qdrant has applied
+    its batch; a batch still failing after ``_WRITE_ATTEMPTS`` tries fails
+    every future in it.
+    """
+    
+    def __init__(
+        self,
+        collection_name: str,
+        get_client: Callable[[], Any],
+        max_batch_size: int = _WRITE_BATCH_SIZE,
+        max_wait_seconds: float = _WRITE_BATCH_WAIT_SECONDS
+    ):
+        self.collection_name = collection_name
+        self._get_client = get_client
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self._points: List[PointStruct] = []
+        self._futures: List[asyncio.Future] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._writes: set = set()
+    
+    def add(self, point: PointStruct) -> asyncio.Future:
+        """Buffer a point for the next batched upsert; the returned future resolves once it is written."""
+        future = asyncio.get_running_loop().create_future()
+        self._points.append(point)
+        self._futures.append(future)
+        if len(self._points) >= self.max_batch_size:
+            self._write_pending()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait_seconds, self._write_pending)
+        return future
+    
+    async def flush(self):
+        """Write any buffered points and wait for every in-flight upsert to finish."""
+        self._write_pending()
+        if self._writes:
+            await asyncio.gather(*self._writes)
+    
+    def _write_pending(self):
+        """Start an upsert of the buffered points."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._points:
+            return
+        
+        points, self._points = self._points, []
+        futures, self._futures = self._futures, []
+        write = asyncio.ensure_future(self._upsert(points, futures))
+        self._writes.add(write)
+        write.add_done_callback(self._writes.discard)
+    
+    async def _upsert(self, points: List[PointStruct], futures: List[asyncio.Future]):
+        """Upsert one batch, retrying with backoff, and settle its points' futures."""
+        for attempt in range(_WRITE_ATTEMPTS):
+            try:
+                await self._get_client().upsert(
+                    collection_name=self.collection_name,
+                    points=points,
+                    wait=True
+                )
+                error = None
+                break
+            except Exception as e:
+                error = e
+                logger.warning(
+                    f"Write of {len(points)} points to {self.collection_name} failed "
+                    f"(attempt {attempt + 1} of {_WRITE_ATTEMPTS}): {e}"
+                )
+                if attempt + 1 < _WRITE_ATTEMPTS:
+                    await asyncio.sleep(_WRITE_RETRY_SECONDS * 2 ** attempt)
+        
+        if error is not None:
+            logger.error(f"Failed to write {len(points)} points to {self.collection_name}: {error}")
+        for future in futures:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
 
 class EmbeddingService:
     """Service for creating and managing text embeddings."""
@@ -22,18 +252,38 @@ class EmbeddingService:
         self.model_name = "all-MiniLM-L6-v2"
         self.embedding_model = None
         self.vector_size = 384
+        self.device = "cpu"
+        self._onnx_session = None
+        self._tokenizer = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._batcher = _EmbeddingBatcher(self._encode_batch)
+        self._embedding_cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
         
     async def initialize(self):
         """Initialize the embedding model."""
         try:
-            self.embedding_model = SentenceTransformer(self.model_name)
-            logger.info(f"Embedding model {self.model_name} initialized")
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+            self.embedding_model = SentenceTransformer(self.model_name, device=self.device)
+            if self.device == "cuda":
+                # Half precision runs on tensor cores and halves weight memory
+                self.embedding_model.half()
+            elif onnxruntime is not None:
+                self._load_onnx_model()
+            # Every model call runs on this pool, keeping the event loop free while it computes
+            workers = 1 if self.device == "cuda" else min(_CPU_ENCODE_WORKERS, os.cpu_count() or 1)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embedding")
+                self._batcher.executor = self._executor
+            # Pay tokenizer and kernel setup costs now rather than on the first request
+            self._encode_batch(["coffee"])
+            backend = "onnxruntime" if self._onnx_session is not None else self.device
+            logger.info(f"Embedding model {self.model_name} initialized on {backend}")
         except Exception as e:
             logger.error(f"Failed to initialize embedding model: {e}")
             raise
     
-    def create_embedding(self, text: str) -> List[float]:
-        """Create embedding vector for text."""
+    async def create_embedding(self, text: str) -> np.ndarray:
+        """Create a unit-length float32 embedding for text, batched with other concurrent requests."""
         if not self.embedding_model:
             raise RuntimeError("Embedding model not initialized")
         
@@ -41,73 +291,380 @@ class EmbeddingService:
             # Clean and prepare text
             cleaned_text = self._clean_text(text)
             
-            # Generate embedding
-            embedding = self.embedding_model.encode(cleaned_text)
+            # Identical text embedded recently skips the model
+            key = _content_key(cleaned_text)
+            cached = self._embedding_cache.get(key)
+            if cached is not None:
+                self._embedding_cache.move_to_end(key)
+                return cached
             
-            # Convert to list for JSON serialization
-            return embedding.tolist()
+            # Generate embedding in the next coalesced batch
+            embedding = await self._batcher.submit(cleaned_text)
+            
+            # Shared with later callers, so it must not be modified in place
+            embedding.setflags(write=False)
+            self._embedding_cache[key] = embedding
+            if len(self._embedding_cache) > _EMBEDDING_CACHE_SIZE:
+                self._embedding_cache.popitem(last=False)
+            return embedding
             
         except Exception as e:
             logger.error(f"Failed to create embedding: {e}")
             raise
     
-    def create_batch_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Create embeddings for multiple texts."""
+    def _load_onnx_model(self):
+        """
+        Load an ONNX Runtime session for CPU inference, exporting the model on first use.
+        
+        The export is cached under ``models/onnx``; on any failure the PyTorch
+        model stays in use.
+        """
+        model_dir = _ONNX_MODEL_DIR / self.model_name
+        try:
+            if not (model_dir / "model.onnx").exists():
+                hub_name = f"sentence-transformers/{self.model_name}"
+                ORTModelForFeatureExtraction.from_pretrained(hub_name, export=True).save_pretrained(model_dir)
+                AutoTokenizer.from_pretrained(hub_name).save_pretrained(model_dir)
+                logger.info(f"Exported {self.model_name} to ONNX at {model_dir}")
+            
+            self._tokenizer = AutoTokenizer.from_pretrained(model_dir)
+            self._onnx_session = onnxruntime.InferenceSession(
+                str(model_dir / "model.onnx"), providers=["CPUExecutionProvider"]
+            )
+        except Exception as e:
+            logger.warning(f"ONNX embedding backend unavailable, using PyTorch: {e}")
+            self._onnx_session = None
+            self._tokenizer = None
+    
+    def _encode_onnx(self, texts: List[str]) -> np.ndarray:
+        """Encode texts with ONNX Runtime: mean-pool token states over the attention mask, then L2-normalise."""
+        if not texts:
+            return np.empty((0, self.vector_size), dtype=np.float32)
+        
+        tokens = self._tokenizer(
+            texts, padding=True, truncation=True, max_length=_MAX_SEQ_LENGTH, return_tensors="np"
+        )
+        feed = {
+            model_input.name: tokens[model_input.name].astype(np.int64)
+            for model_input in self._onnx_session.get_inputs()
+        }
+        hidden = self._onnx_session.run(None, feed)[0]
+        
+        mask = tokens["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return normalize_embeddings(pooled)
+    
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Encode already-cleaned texts in one model call, as float32 whatever the model precision."""
+        if self._onnx_session is not None:
+            return self._encode_onnx(texts)
+        
+        embeddings = self.embedding_model.encode(
+            texts, batch_size=_EMBED_BATCH_SIZE, convert_to_numpy=True, normalize_embeddings=True
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+    
+    def create_batch_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Create unit-length float32 embeddings for multiple texts, one row per text."""
         if not self.embedding_model:
             raise RuntimeError("Embedding model not initialized")
         
         try:
             # Clean texts
-            cleaned_texts = [self._clean_text(text) for text in texts]
+            cleaned_texts = list(map(self._clean_text, texts))
             
             # Generate embeddings
-            embeddings = self.embedding_model.encode(cleaned_texts)
-            
-            # Convert to list of lists
-            return [embedding.tolist() for embedding in embeddings]
+            return self._encode_batch(cleaned_texts)
             
         except Exception as e:
             logger.error(f"Failed to create batch embeddings: {e}")
             raise
     
+    async def create_batch_embeddings_async(self, texts: List[str]) -> np.ndarray:
+        """Run ``create_batch_embeddings`` on the embedding thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.create_batch_embeddings, texts)
+    
     def _clean_text(self, text: str) -> str:
         """Clean and prepare text for embedding."""
         if not text:
             return ""
         
-        # Basic text cleaning
-        cleaned = text.strip()
-        
-        # Remove excessive whitespace
-        cleaned = " ".join(cleaned.split())
+        # Collapse whitespace in one C-level pass
+        cleaned = _WHITESPACE_RE.sub(" ", text).strip()
         
         # Truncate if too long (model limit is usually 512 tokens)
-        if len(cleaned) > 2000:  # Conservative limit
-            cleaned = cleaned[:2000] + "..."
+        if len(cleaned) > _MAX_EMBED_CHARS:
+            cleaned = cleaned[:_MAX_EMBED_CHARS] + "..."
         
         return cleaned
     
-    def calculate_similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
-        """Calculate cosine similarity between two embeddings."""
+    def calculate_similarity(
+        self,
+        embedding1: Any,
+        embedding2: Any,
+        normalized: bool = False
+    ) -> float:
+        """
+        Calculate cosine similarity between two embeddings.
+        
+        Args:
+            embedding1: First vector
+            embedding2: Second vector
+            normalized: Whether both vectors are already L2-normalised, as
+                create_embedding's are (the similarity is then a dot product)
+            
+        Returns:
+            Cosine similarity, or 0.0 if either vector is zero
+        """
         try:
-            # Convert to numpy arrays
-            vec1 = np.array(embedding1)
-            vec2 = np.array(embedding2)
+            vec1 = np.asarray(embedding1, dtype=np.float32)
+            vec2 = np.asarray(embedding2, dtype=np.float32)
             
-            # Calculate cosine similarity
-            dot_product = np.dot(vec1, vec2)
-            norm1 = np.linalg.norm(vec1)
-            norm2 = np.linalg.norm(vec2)
+            if normalized:
+                return float(np.dot(vec1, vec2))
             
-            if norm1 == 0 or norm2 == 0:
+            if not vec1.any() or not vec2.any():
                 return 0.0
             
-            similarity = dot_product / (norm1 * norm2)
-            return float(similarity)
+            # SimSIMD returns cosine distance from a single native kernel call
+            if simsimd is not None:
+                return 1.0 - float(simsimd.cosine(vec1, vec2))
+            
+            return float(np.dot(vec1, vec2) / np.sqrt(np.vdot(vec1, vec1) * np.vdot(vec2, vec2)))
             
         except Exception as e:
             logger.error(f"Failed to calculate similarity: {e}")
             return 0.0
+    
+    def calculate_similarities(
+        self,
+        query_embedding: List[float],
+        embeddings: Any,
+        normalized: bool = False
+    ) -> np.ndarray:
+        """
+        Calculate cosine similarity between a query and many embeddings in one matrix product.
+        
+        Args:
+            query_embedding: Query vector
+            embeddings: 2-D array-like of stored vectors, one per row
+            normalized: Whether the rows are already L2-normalised (skips the row norms)
+            
+        Returns:
+            Array of similarities, one per row
+        """
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[0] == 0:
+            return np.zeros(0, dtype=np.float32)
+        
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0:
+            return np.zeros(matrix.shape[0], dtype=np.float32)
+        
+        similarities = matrix @ (query / query_norm)
+        if normalized:
+            return similarities
+        
+        row_norms = np.linalg.norm(matrix, axis=1)
+        row_norms[row_norms == 0] = 1.0
+        return similarities / row_norms
+    
+    def top_k_similar(
+        self,
+        query_embedding: List[float],
+        embeddings: Any,
+        k: int = 3,
+        normalized: bool = False
+    ) -> List[Tuple[int, float]]:
+        """Return (index, similarity) pairs for the k embeddings most similar to the query."""
+        similarities = self.calculate_similarities(query_embedding, embeddings, normalized)
+        return _top_k(similarities, k)
+
+
+def _payload_epoch(payload: Dict[str, Any]) -> float:
+    """Return a payload's timestamp as epoch seconds, or NaN when missing or malformed."""
+    epoch = payload.get("timestamp_epoch")
+    if epoch is not None:
+        return float(epoch)
+    
+    # Points stored before epochs were recorded carry only the ISO string
+    try:
+        timestamp = datetime.fromisoformat(payload["timestamp"])
+    except (KeyError, TypeError, ValueError):
+        return np.nan
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+def _top_k(similarities: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """Return (index, similarity) pairs for the k highest similarities, best first."""
+    if similarities.size == 0 or k <= 0:
+        return []
+    
+    k = min(k, similarities.size)
+    top = np.argpartition(-similarities, k - 1)[:k]
+    top = top[np.argsort(-similarities[top])]
+    return [(int(i), float(similarities[i])) for i in top]
+
+
+def normalize_embeddings(embeddings: Any) -> np.ndarray:
+    """Return embeddings as a contiguous float32 matrix with L2-normalised rows."""
+    matrix = np.array(embeddings, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms)
+
+
+def quantize_int8(rows: np.ndarray) -> np.ndarray:
+    """Linearly quantize each row to int8, scaling its largest component to +/-127."""
+    peaks = np.abs(rows).max(axis=1, keepdims=True)
+    peaks[peaks == 0] = 1.0
+    return np.round(rows * (127.0 / peaks)).astype(np.int8)
+
+
+class EmbeddingIndex:
+    """
+    In-process similarity index over a contiguous embedding matrix.
+    
+    Rows are L2-normalised once when they are added, so a query is a
+    matrix-vector product against ``matrix`` followed by a partial sort.
+    Rows are stored as float16 by default, halving memory and scan bandwidth;
+    they are upcast to float32 block by block while scoring. With an int8
+    dtype each row is quantized with its own scale, a quarter of float32;
+    scores are divided by the quantized row norms, so the scales cancel.
+    Storage grows by doubling, so appending rows one at a time stays linear.
+    """
+    
+    def __init__(self, vector_size: int = 384, dtype: Any = np.float16):
+        self.vector_size = vector_size
+        self.payloads: List[Dict[str, Any]] = []
+        # Preallocated storage; only the first len(payloads) rows are in use
+        self._rows = np.empty((0, vector_size), dtype=dtype)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._quantized = np.issubdtype(self._rows.dtype, np.integer)
+    
+    def __len__(self) -> int:
+        return len(self.payloads)
+    
+    @property
+    def matrix(self) -> np.ndarray:
+        """Stored rows, one per payload."""
+        return self._rows[:len(self.payloads)]
+    
+    @property
+    def row_norms(self) -> np.ndarray:
+        """Norms of the quantized rows (int8 indexes only)."""
+        return self._norms[:len(self.payloads)]
+    
+    def _reserve(self, count: int):
+        """Make room for ``count`` more rows, at least doubling the capacity when it grows."""
+        size = len(self.payloads)
+        needed = size + count
+        if needed <= len(self._rows):
+            return
+        
+        capacity = max(needed, 2 * len(self._rows), 16)
+        rows = np.empty((capacity, self.vector_size), dtype=self._rows.dtype)
+        rows[:size] = self._rows[:size]
+        self._rows = rows
+        if self._quantized:
+            norms = np.empty(capacity, dtype=np.float32)
+            norms[:size] = self._norms[:size]
+            self._norms = norms
+    
+    def add(self, embeddings: Any, payloads: List[Dict[str, Any]]):
+        """Normalise and append embeddings with their payloads."""
+        if not payloads:
+            return
+        
+        rows = normalize_embeddings(embeddings)
+        if rows.shape != (len(payloads), self.vector_size):
+            raise ValueError(f"Expected {len(payloads)} embeddings of size {self.vector_size}, got {rows.shape}")
+        
+        self._reserve(len(payloads))
+        start, end = len(self.payloads), len(self.payloads) + len(payloads)
+        if self._quantized:
+            rows = quantize_int8(rows)
+            norms = np.linalg.norm(rows.astype(np.float32), axis=1)
+            norms[norms == 0] = 1.0
+            self._norms[start:end] = norms
+        
+        self._rows[start:end] = rows
+        self.payloads.extend(payloads)
+    
+    def remove(self, key: str, value: Any) -> int:
+        """Remove every row whose payload has ``payload[key] == value``; returns the number removed."""
+        keep = np.fromiter(
+            (payload.get(key) != value for payload in self.payloads),
+            dtype=bool,
+            count=len(self.payloads)
+        )
+        return self.retain(keep)
+    
+    def retain(self, keep: np.ndarray) -> int:
+        """Keep only the rows selected by a boolean mask; returns the number removed."""
+        removed = int(len(keep) - keep.sum())
+        if removed:
+            self._rows = np.ascontiguousarray(self.matrix[keep])
+            if self._quantized:
+                self._norms = self.row_norms[keep]
+            self.payloads = [p for p, k in zip(self.payloads, keep) if k]
+        return removed
+    
+    def _score(self, unit_query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every row against an already-normalised float32 query."""
+        matrix = self.matrix
+        if matrix.dtype == np.float32:
+            return matrix @ unit_query
+        
+        similarities = np.empty(len(self.payloads), dtype=np.float32)
+        for start in range(0, len(self.payloads), _SCORE_BLOCK_ROWS):
+            block = matrix[start:start + _SCORE_BLOCK_ROWS]
+            np.matmul(block.astype(np.float32), unit_query, out=similarities[start:start + len(block)])
+        if self._quantized:
+            similarities /= self.row_norms
+        return similarities
+    
+    def search(
+        self,
+        query_embedding: List[float],
+        limit: int = 5,
+        score_threshold: float = 0.0,
+        mask: Optional[np.ndarray] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Find the stored payloads most similar to the query.
+        
+        Args:
+            query_embedding: Query vector
+            limit: Maximum number of results
+            score_threshold: Minimum cosine similarity
+            mask: Optional boolean array selecting which rows may match
+            
+        Returns:
+            (payload, similarity) pairs, most similar first
+        """
+        if not self.payloads:
+            return []
+        
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0:
+            return []
+        
+        similarities = self._score(query / query_norm)
+        eligible = similarities >= score_threshold
+        if mask is not None:
+            eligible &= mask
+        similarities = np.where(eligible, similarities, -np.inf)
+        
+        return [
+            (self.payloads[i], score)
+            for i, score in _top_k(similarities, min(limit, int(eligible.sum())))
+        ]
 
 
 class VectorMemoryService:
@@ -117,12 +674,72 @@ class VectorMemoryService:
         self.embedding_service = EmbeddingService()
         self.conversation_collection = "conversation_embeddings"
         self.context_collection = "user_context_embeddings"
+        self._qdrant = None
+        self._write_buffers = {
+            collection_name: _QdrantWriteBuffer(collection_name, self._qdrant_client)
+            for collection_name in (self.conversation_collection, self.context_collection)
+        }
+        self._stored_points: Dict[str, "OrderedDict[bytes, str]"] = {
+            collection_name: OrderedDict() for collection_name in self._write_buffers
+        }
     
     async def initialize(self):
         """Initialize the vector memory service."""
         await self.embedding_service.initialize()
+        self._qdrant = db_manager.get_async_qdrant_client()
         logger.info("Vector memory service initialized")
     
+    async def reload_client(self):
+        """Rebind the Qdrant client after the database manager reconnects."""
+        self._qdrant = db_manager.get_async_qdrant_client()
+    
+    def _qdrant_client(self):
+        """Return the bound async Qdrant client, binding it on first use."""
+        if self._qdrant is None:
+            self._qdrant = db_manager.get_async_qdrant_client()
+        return self._qdrant
+    
+    def _lookup_stored_point(self, collection_name: str, key: bytes) -> Optional[str]:
+        """Return the id of a recently stored point with identical content, if any."""
+        stored = self._stored_points[collection_name]
+        point_id = stored.get(key)
+        if point_id is not None:
+            stored.move_to_end(key)
+        return point_id
+    
+    def _remember_stored_point(self, collection_name: str, key: bytes, point_id: str):
+        """Record a stored point's id under its content key, evicting the oldest beyond the limit."""
+        stored = self._stored_points[collection_name]
+        stored[key] = point_id
+        if len(stored) > _STORED_POINT_CACHE_SIZE:
+            stored.popitem(last=False)
+    
+    async def flush(self):
+        """Write every buffered memory point to Qdrant and wait for in-flight writes."""
+        await asyncio.gather(*(buffer.flush() for buffer in self._write_buffers.values()))
+    
+    async def _query_qdrant(
+        self,
+        query_embedding: np.ndarray,
+        user_id: str,
+        limit: int,
+        score_threshold: float
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """Search the user's conversation points in Qdrant; returns (payload, score) pairs, best first."""
+        qdrant_client = self._qdrant_client()
+        response = await qdrant_client.query_points(
+            collection_name=self.conversation_collection,
+            query=query_embedding.tolist(),
+            query_filter=Filter(
+                must=[FieldCondition(key="user_id", match=MatchValue(value=user_id))]
+            ),
+            limit=limit,
+            score_threshold=score_threshold,
+            with_payload=True,
+            search_params=QDRANT_SEARCH_PARAMS
+        )
+        return [(point.payload, point.score) for point in response.points]
+    
     async def store_conversation_memory(
         self,
         message_id: str,
@@ -132,10 +749,19 @@ class VectorMemoryService:
         message_type: str,
         metadata: Optional[Dict[str, Any]] = None
     ) -> str:
-        """Store conversation message in vector database."""
+        """Store conversation message in vector database, reusing the point if this message was already stored."""
         try:
+            # A retried store of the same message reuses its point; equal text in
+            # another message or session still gets its own, so payloads point back
+            # at the right message
+            content_key = _content_key(user_id, session_id, message_id, message_type, content)
+            point_id = self._lookup_stored_point(self.conversation_collection, content_key)
+            if point_id:
+                logger.info(f"Reused conversation memory {point_id} for message {message_id}")
+                return point_id
+            
             # Create embedding
-            embedding = self.embedding_service.create_embedding(content)
+            embedding = await self.embedding_service.create_embedding(content)
             
             # Generate unique point ID
             point_id = str(uuid.uuid4())
@@ -146,10 +772,14 @@ class VectorMemoryService:
                 "user_id": user_id,
                 "session_id": session_id,
                 "message_type": message_type,
-                "content": content[:500],  # Store truncated content for search
+                "preview": content[:_PREVIEW_CHARS],
+                "content_hash": hashlib.blake2b(content.encode("utf-8"), digest_size=8).hexdigest(),
                 "timestamp": metadata.get("timestamp") if metadata else None,
                 **(metadata or {})
             }
+            # Parsed once here so readers compare numbers instead of parsing ISO strings
+            epoch = _payload_epoch(point_metadata)
+            point_metadata["timestamp_epoch"] = None if np.isnan(epoch) else epoch
             
             # Create point
             point = PointStruct(
@@ -158,12 +788,9 @@ class VectorMemoryService:
                 payload=point_metadata
             )
             
-            # Store in Qdrant
-            qdrant_client = db_manager.get_qdrant_client()
-            qdrant_client.upsert(
-                collection_name=self.conversation_collection,
-                points=[point]
-            )
+            # Written with concurrent stores in one batch; returns once Qdrant has it
+            await self._write_buffers[self.conversation_collection].add(point)
+            self._remember_stored_point(self.conversation_collection, content_key, point_id)
             
             logger.info(f"Stored conversation memory for message {message_id}")
             return point_id
@@ -172,6 +799,17 @@ class VectorMemoryService:
             logger.error(f"Failed to store conversation memory: {e}")
             raise
     
+    async def delete_conversation_memory(self, point_id: str):
+        """Delete a stored conversation point, e.g. after its message insert was rolled back."""
+        stored = self._stored_points[self.conversation_collection]
+        for key in [key for key, stored_id in stored.items() if stored_id == point_id]:
+            del stored[key]
+        await self._qdrant_client().delete(
+            collection_name=self.conversation_collection,
+            points_selector=PointIdsList(points=[point_id]),
+            wait=True
+        )
+    
     async def search_similar_conversations(
         self,
         query_text: str,
@@ -182,40 +820,27 @@ class VectorMemoryService:
         """Search for similar conversations in memory."""
         try:
             # Create query embedding
-            query_embedding = self.embedding_service.create_embedding(query_text)
-            
-            # Create filter for user
-            user_filter = Filter(
-                must=[
-                    FieldCondition(
-                        key="user_id",
-                        match=MatchValue(value=user_id)
-                    )
-                ]
-            )
+            query_embedding = await self.embedding_service.create_embedding(query_text)
             
-            # Search in Qdrant
-            qdrant_client = db_manager.get_qdrant_client()
-            search_results = qdrant_client.search(
-                collection_name=self.conversation_collection,
-                query_vector=query_embedding,
-                query_filter=user_filter,
-                limit=limit,
-                score_threshold=similarity_threshold
-            )
+            # Qdrant walks the user's points in its quantized HNSW index
+            matches = await self._query_qdrant(query_embedding, user_id, limit, similarity_threshold)
             
             # Format results
             results = []
-            for result in search_results:
+            for payload, score in matches:
+                # Points stored before previews were introduced carry truncated content instead
+                preview = payload.get("preview", payload.get("content"))
                 results.append({
-                    "message_id": result.payload.get("message_id"),
-                    "content": result.payload.get("content"),
-                    "message_type": result.payload.get("message_type"),
-                    "session_id": result.payload.get("session_id"),
-                    "similarity_score": result.score,
-                    "timestamp": result.payload.get("timestamp"),
-                    "metadata": {k: v for k, v in result.payload.items() 
-                               if k not in ["message_id", "content", "message_type", "session_id", "user_id"]}
+                    "message_id": payload.get("message_id"),
+                    "preview": preview,
+                    "content": preview,
+                    "message_type": payload.get("message_type"),
+                    "session_id": payload.get("session_id"),
+                    "similarity_score": score,
+                    "timestamp": payload.get("timestamp"),
+                    "timestamp_epoch": payload.get("timestamp_epoch"),
+                    "metadata": {k: v for k, v in payload.items() 
+                               if k not in _CONVERSATION_PAYLOAD_KEYS}
                 })
             
             logger.info(f"Found {len(results)} similar conversations for user {user_id}")
@@ -232,10 +857,16 @@ class VectorMemoryService:
         content: str,
         metadata: Optional[Dict[str, Any]] = None
     ) -> str:
-        """Store user context information."""
+        """Store user context information, reusing the point of identical recent context."""
         try:
+            content_key = _content_key(user_id, context_type, content)
+            point_id = self._lookup_stored_point(self.context_collection, content_key)
+            if point_id:
+                logger.info(f"Reused user context {point_id} for user {user_id}")
+                return point_id
+            
             # Create embedding
-            embedding = self.embedding_service.create_embedding(content)
+            embedding = await self.embedding_service.create_embedding(content)
             
             # Generate unique point ID
             point_id = str(uuid.uuid4())
@@ -255,12 +886,9 @@ class VectorMemoryService:
                 payload=point_metadata
             )
             
-            # Store in Qdrant
-            qdrant_client = db_manager.get_qdrant_client()
-            qdrant_client.upsert(
-                collection_name=self.context_collection,
-                points=[point]
-            )
+            # Written with concurrent stores in one batch; returns once Qdrant has it
+            await self._write_buffers[self.context_collection].add(point)
+            self._remember_stored_point(self.context_collection, content_key, point_id)
             
             logger.info(f"Stored user context for user {user_id}")
             return point_id
@@ -277,7 +905,7 @@ class VectorMemoryService:
     ) -> List[Dict[str, Any]]:
         """Retrieve user context information."""
         try:
-            # Create filter
+            # Create filter; a point matches when its type is any of the requested ones
             filter_conditions = [
                 FieldCondition(
                     key="user_id",
@@ -286,24 +914,25 @@ class VectorMemoryService:
             ]
             
             if context_types:
-                for context_type in context_types:
-                    filter_conditions.append(
-                        FieldCondition(
-                            key="context_type",
-                            match=MatchValue(value=context_type)
-                        )
+                filter_conditions.append(
+                    FieldCondition(
+                        key="context_type",
+                        match=MatchAny(any=list(context_types))
                     )
+                )
             
             user_filter = Filter(must=filter_conditions)
             
             # Search in Qdrant
-            qdrant_client = db_manager.get_qdrant_client()
+            qdrant_client = self._qdrant_client()
             
-            # Use scroll to get all matching points
-            results, _ = qdrant_client.scroll(
+            # Both fields are keyword-indexed; vectors and the known user_id are not sent back
+            results, _ = await qdrant_client.scroll(
                 collection_name=self.context_collection,
                 scroll_filter=user_filter,
-                limit=limit
+                limit=limit,
+                with_payload=PayloadSelectorExclude(exclude=["user_id"]),
+                with_vectors=False
             )
             
             # Format results
@@ -3,23 +3,53 @@ Memory management service for conversation storage and retrieval.
 Handles user profiles, conversation sessions, and memory operations.
 """
 
+import asyncio
 import logging
+import time
+import uuid
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, and_, or_, desc
+from sqlalchemy import select, update, delete, and_, or_, desc, func, literal_column, true
+from sqlalchemy.engine import Row
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload
 
 from app.database import db_manager
 from app.models.memory import UserProfile, ConversationSession, ConversationMessage, MemoryEmbedding, FarmContext
 from app.services.embedding import vector_memory_service
+from app.services.memory_intelligence import memory_intelligence_service, message_topics
 
 logger = logging.getLogger(__name__)
 
+# Session listings are re-read after this many seconds, or sooner when the user starts a new session
+_SESSIONS_CACHE_TTL_SECONDS = 60
+_SESSIONS_CACHE_SIZE = 256
+# Columns of a session listing; cached as plain rows rather than ORM objects bound to a closed session
+_SESSION_LISTING_COLUMNS = (
+    ConversationSession.session_id,
+    ConversationSession.user_id,
+    ConversationSession.started_at,
+    ConversationSession.last_activity,
+    ConversationSession.message_count,
+    ConversationSession.context,
+)
+
 
 class MemoryService:
     """Service for managing conversation memory and user profiles."""
     
+    def __init__(self):
+        # (user_id, limit, days_back) -> (fetched at, session rows), in LRU order
+        self._sessions_cache: "OrderedDict[Tuple[str, int, int], Tuple[float, List[Row]]]" = OrderedDict()
+    
+    def invalidate_user_sessions(self, user_id: str):
+        """Drop cached session listings for a user after a session of theirs is created."""
+        for key in [key for key in self._sessions_cache if key[0] == user_id]:
+            del self._sessions_cache[key]
+    
     async def get_or_create_user_profile(
         self,
         user_id: str,
@@ -49,15 +79,17 @@ class MemoryService:
                     logger.info(f"Retrieved existing user profile for {user_id}")
                     return profile
                 
-                # Create new profile
-                profile = UserProfile(
-                    user_id=user_id,
-                    name=name,
-                    **profile_data
+                # Create new profile; a concurrent creator winning the race is not an error
+                await session.execute(
+                    insert(UserProfile)
+                    .values(user_id=user_id, name=name, **profile_data)
+                    .on_conflict_do_nothing(index_elements=[UserProfile.user_id])
                 )
-                session.add(profile)
                 await session.commit()
-                await session.refresh(profile)
+                result = await session.execute(
+                    select(UserProfile).where(UserProfile.user_id == user_id)
+                )
+                profile = result.scalar_one()
                 
                 logger.info(f"Created new user profile for {user_id}")
                 return profile
@@ -73,42 +105,47 @@ class MemoryService:
         user_id: str,
         context: Optional[Dict[str, Any]] = None
     ) -> ConversationSession:
-        """Get existing conversation session or create new one."""
+        """
+        Get existing conversation session or create new one.
+        
+        A single INSERT ... ON CONFLICT DO UPDATE creates the session or touches
+        its last activity and merges in the new context, returning the row. The
+        user profile is only created when the insert fails on a missing one.
+        Cached session listings are dropped only when the session is new.
+        """
+        stmt = insert(ConversationSession).values(
+            session_id=session_id,
+            user_id=user_id,
+            context=context or {}
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ConversationSession.session_id],
+            set_={
+                "last_activity": func.now(),
+                "context": ConversationSession.context.op("||")(stmt.excluded.context)
+            }
+        ).returning(ConversationSession, literal_column("xmax = 0").label("created"))
+        
         async with db_manager.get_postgres_session() as session_db:
             try:
-                # Try to get existing session
-                result = await session_db.execute(
-                    select(ConversationSession).where(
-                        ConversationSession.session_id == session_id
+                try:
+                    result = await session_db.execute(stmt)
+                except IntegrityError:
+                    # First session of a new user: create the profile and retry
+                    await session_db.rollback()
+                    await session_db.execute(
+                        insert(UserProfile)
+                        .values(user_id=user_id)
+                        .on_conflict_do_nothing(index_elements=[UserProfile.user_id])
                     )
-                )
-                conv_session = result.scalar_one_or_none()
-                
-                if conv_session:
-                    # Update last activity
-                    conv_session.last_activity = datetime.utcnow()
-                    if context:
-                        conv_session.context = {**conv_session.context, **context}
-                    await session_db.commit()
-                    await session_db.refresh(conv_session)
-                    
-                    logger.info(f"Retrieved existing conversation session {session_id}")
-                    return conv_session
+                    result = await session_db.execute(stmt)
                 
-                # Ensure user profile exists
-                await self.get_or_create_user_profile(user_id)
-                
-                # Create new session
-                conv_session = ConversationSession(
-                    session_id=session_id,
-                    user_id=user_id,
-                    context=context or {}
-                )
-                session_db.add(conv_session)
+                conv_session, created = result.one()
                 await session_db.commit()
-                await session_db.refresh(conv_session)
+                if created:
+                    self.invalidate_user_sessions(user_id)
                 
-                logger.info(f"Created new conversation session {session_id}")
+                logger.info(f"Upserted conversation session {session_id}")
                 return conv_session
                 
             except Exception as e:
@@ -126,63 +163,87 @@ class MemoryService:
         model_used: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None
     ) -> ConversationMessage:
-        """Store a conversation message with vector embedding."""
+        """
+        Store a conversation message with vector embedding.
+        
+        The message id is assigned up front so embedding can start as soon as a
+        database session is open and overlap the session upsert and message
+        insert; the message and its embedding reference are then committed
+        together, and the point is deleted again if the insert is rolled back.
+        """
+        message_id = uuid.uuid4()
         async with db_manager.get_postgres_session() as session_db:
+            embed_task = asyncio.create_task(vector_memory_service.store_conversation_memory(
+                message_id=str(message_id),
+                user_id=user_id,
+                session_id=session_id,
+                content=content,
+                message_type=message_type,
+                metadata={
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "tokens_used": tokens_used,
+                    "model_used": model_used,
+                    **(metadata or {})
+                }
+            ))
+            
             try:
                 # Ensure session exists
                 await self.get_or_create_conversation_session(session_id, user_id)
                 
                 # Create message
                 message = ConversationMessage(
+                    id=message_id,
                     session_id=session_id,
                     user_id=user_id,
                     message_type=message_type,
                     content=content,
                     tokens_used=tokens_used,
                     model_used=model_used,
-                    metadata=metadata or {}
+                    metadata=metadata or {},
+                    topics=message_topics(content)
                 )
                 session_db.add(message)
-                await session_db.commit()
-                await session_db.refresh(message)
+                await session_db.flush()
                 
-                # Store vector embedding
+                # Store embedding reference
                 try:
-                    point_id = await vector_memory_service.store_conversation_memory(
-                        message_id=str(message.id),
-                        user_id=user_id,
-                        session_id=session_id,
-                        content=content,
-                        message_type=message_type,
-                        metadata={
-                            "timestamp": message.created_at.isoformat(),
-                            "tokens_used": tokens_used,
-                            "model_used": model_used,
-                            **(metadata or {})
-                        }
-                    )
-                    
-                    # Store embedding reference
-                    embedding_ref = MemoryEmbedding(
-                        message_id=message.id,
+                    point_id = await embed_task
+                    session_db.add(MemoryEmbedding(
+                        message_id=message_id,
                         qdrant_point_id=point_id,
                         embedding_model="all-MiniLM-L6-v2"
-                    )
-                    session_db.add(embedding_ref)
-                    await session_db.commit()
-                    
+                    ))
                 except Exception as e:
                     logger.warning(f"Failed to store vector embedding: {e}")
                     # Continue without vector embedding
                 
+                await session_db.commit()
+                
+                if message_type == "user":
+                    memory_intelligence_service.invalidate_user_insights(user_id)
+                
                 logger.info(f"Stored conversation message for session {session_id}")
                 return message
                 
             except Exception as e:
                 await session_db.rollback()
+                await self._discard_embedding(embed_task)
                 logger.error(f"Failed to store conversation message: {e}")
                 raise
     
+    async def _discard_embedding(self, embed_task: asyncio.Task):
+        """Delete the vector point of a message whose insert was rolled back, once it has been written."""
+        try:
+            point_id = await embed_task
+        except Exception:
+            return  # Nothing was written
+        
+        try:
+            await vector_memory_service.delete_conversation_memory(point_id)
+        except Exception as e:
+            logger.warning(f"Failed to delete vector embedding {point_id} of a rolled back message: {e}")
+    
     async def get_conversation_history(
         self,
         session_id: str,
@@ -217,13 +278,19 @@ class MemoryService:
         user_id: str,
         limit: int = 20,
         days_back: int = 30
-    ) -> List[ConversationSession]:
-        """Get recent conversation sessions for a user."""
+    ) -> List[Row]:
+        """Get recent conversation sessions for a user, as rows of the listing columns."""
+        cache_key = (user_id, limit, days_back)
+        cached = self._sessions_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < _SESSIONS_CACHE_TTL_SECONDS:
+            self._sessions_cache.move_to_end(cache_key)
+            return list(cached[1])
+        
         async with db_manager.get_postgres_session() as session:
             try:
                 cutoff_date = datetime.utcnow() - timedelta(days=days_back)
                 
-                query = select(ConversationSession).where(
+                query = select(*_SESSION_LISTING_COLUMNS).where(
                     and_(
                         ConversationSession.user_id == user_id,
                         ConversationSession.last_activity >= cutoff_date
@@ -234,7 +301,12 @@ class MemoryService:
                     query = query.limit(limit)
                 
                 result = await session.execute(query)
-                sessions = result.scalars().all()
+                sessions = list(result.all())
+                
+                self._sessions_cache[cache_key] = (time.monotonic(), sessions)
+                self._sessions_cache.move_to_end(cache_key)
+                if len(self._sessions_cache) > _SESSIONS_CACHE_SIZE:
+                    self._sessions_cache.popitem(last=False)
                 
                 logger.info(f"Retrieved {len(sessions)} sessions for user {user_id}")
                 return list(sessions)
@@ -271,36 +343,24 @@ class MemoryService:
             # Limit results
             similar_conversations = similar_conversations[:limit]
             
-            # Enrich with database information if needed
+            # Enrich with full message details fetched in one query
+            messages = await self._fetch_messages(
+                [memory.get("message_id") for memory in similar_conversations]
+            )
             enriched_memories = []
-            async with db_manager.get_postgres_session() as session:
-                for memory in similar_conversations:
-                    message_id = memory.get("message_id")
-                    if message_id:
-                        try:
-                            # Get full message details
-                            result = await session.execute(
-                                select(ConversationMessage).where(
-                                    ConversationMessage.id == message_id
-                                )
-                            )
-                            message = result.scalar_one_or_none()
-                            
-                            if message:
-                                enriched_memories.append({
-                                    **memory,
-                                    "full_content": message.content,
-                                    "created_at": message.created_at.isoformat(),
-                                    "tokens_used": message.tokens_used,
-                                    "model_used": message.model_used
-                                })
-                            else:
-                                enriched_memories.append(memory)
-                        except Exception as e:
-                            logger.warning(f"Failed to enrich memory {message_id}: {e}")
-                            enriched_memories.append(memory)
-                    else:
-                        enriched_memories.append(memory)
+            for memory in similar_conversations:
+                message = messages.get(memory.get("message_id"))
+                if message:
+                    enriched_memories.append({
+                        **memory,
+                        "content": message.content,
+                        "full_content": message.content,
+                        "created_at": message.created_at.isoformat(),
+                        "tokens_used": message.tokens_used,
+                        "model_used": message.model_used
+                    })
+                else:
+                    enriched_memories.append(memory)
             
             logger.info(f"Found {len(enriched_memories)} relevant memories for user {user_id}")
             return enriched_memories
@@ -309,6 +369,36 @@ class MemoryService:
             logger.error(f"Failed to search relevant memories: {e}")
             return []
     
+    async def _fetch_messages(self, message_ids: List[Optional[str]]) -> Dict[str, ConversationMessage]:
+        """
+        Load conversation messages by id in a single query.
+        
+        Args:
+            message_ids: Message ids from vector payloads; missing or malformed ids are skipped
+            
+        Returns:
+            Messages keyed by their id as a string
+        """
+        ids = []
+        for message_id in message_ids:
+            try:
+                ids.append(uuid.UUID(str(message_id)))
+            except ValueError:
+                continue
+        if not ids:
+            return {}
+        
+        try:
+            async with db_manager.get_postgres_session() as session:
+                result = await session.execute(
+                    select(ConversationMessage).where(ConversationMessage.id.in_(ids))
+                )
+                return {str(message.id): message for message in result.scalars()}
+                
+        except Exception as e:
+            logger.warning(f"Failed to enrich memories: {e}")
+            return {}
+    
     async def update_user_profile(
         self,
         user_id: str,
@@ -346,42 +436,30 @@ class MemoryService:
         """Get user statistics and activity summary."""
         async with db_manager.get_postgres_session() as session:
             try:
-                # Get user profile
-                profile_result = await session.execute(
-                    select(UserProfile).where(UserProfile.user_id == user_id)
-                )
-                profile = profile_result.scalar_one_or_none()
-                
-                if not profile:
-                    return {}
+                # Counts run in PostgreSQL and come back with the profile in one query; both
+                # session counts share one scan of the (user_id, last_activity) index
+                recent_cutoff = datetime.utcnow() - timedelta(days=7)
+                session_counts = select(
+                    func.count().label("total"),
+                    func.count().filter(ConversationSession.last_activity >= recent_cutoff).label("recent")
+                ).where(
+                    ConversationSession.user_id == user_id
+                ).subquery()
+                message_count = select(func.count()).select_from(ConversationMessage).where(
+                    ConversationMessage.user_id == user_id
+                ).scalar_subquery()
                 
-                # Get session count
-                session_count_result = await session.execute(
-                    select(ConversationSession).where(
-                        ConversationSession.user_id == user_id
-                    )
+                result = await session.execute(
+                    select(UserProfile, session_counts.c.total, message_count, session_counts.c.recent)
+                    .join(session_counts, true())
+                    .where(UserProfile.user_id == user_id)
                 )
-                session_count = len(session_count_result.scalars().all())
+                row = result.one_or_none()
                 
-                # Get message count
-                message_count_result = await session.execute(
-                    select(ConversationMessage).where(
-                        ConversationMessage.user_id == user_id
-                    )
-                )
-                message_count = len(message_count_result.scalars().all())
+                if not row:
+                    return {}
                 
-                # Get recent activity
-                recent_cutoff = datetime.utcnow() - timedelta(days=7)
-                recent_activity_result = await session.execute(
-                    select(ConversationSession).where(
-                        and_(
-                            ConversationSession.user_id == user_id,
-                            ConversationSession.last_activity >= recent_cutoff
-                        )
-                    )
-                )
-                recent_sessions = len(recent_activity_result.scalars().all())
+                profile, session_count, message_count, recent_sessions = row
                 
                 stats = {
                     "user_id": user_id,
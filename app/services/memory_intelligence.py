@@ -3,23 +3,287 @@ Memory Intelligence Service
 Advanced memory management with automatic summarization, consolidation, and smart retrieval.
 """
 
+import hashlib
 import logging
+import re
 import uuid
 import asyncio
-from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime, timedelta
-from collections import defaultdict
+import time
+from typing import List, Dict, Any, FrozenSet, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from collections import Counter, OrderedDict
 from dataclasses import dataclass
 
+import numpy as np
+import orjson
+
 from app.database import db_manager
-from app.services.embedding import vector_memory_service, embedding_service
+from app.services.embedding import EmbeddingIndex, vector_memory_service
 from app.llm_client import cerebras_client
-from app.models.memory import ConversationSession, ConversationMessage
-from sqlalchemy import text, and_
-from sqlalchemy.orm import selectinload
+from app.models.memory import ConversationMessage
+from sqlalchemy import text, select
+from sqlalchemy.exc import ProgrammingError
 
 logger = logging.getLogger(__name__)
 
+# Memory insights are rebuilt after this many seconds, or sooner when the user sends a new message
+_INSIGHTS_CACHE_TTL_SECONDS = 600
+_INSIGHTS_CACHE_SIZE = 1024
+# LLM topic summaries are reused for conversations this similar (cosine of topic plus recent
+# messages), for up to a day; each topic keeps at most this many summaries
+_SUMMARY_CACHE_THRESHOLD = 0.92
+_SUMMARY_CACHE_TTL_SECONDS = 24 * 60 * 60
+_SUMMARY_CACHE_ENTRIES_PER_TOPIC = 1000
+_SUMMARY_KEY_CONVERSATIONS = 3
+# Topic summaries requested from the LLM at once, across all users
+_SUMMARY_CONCURRENCY = 4
+# Sessions shorter than this (messages or total characters) are summarised without the LLM
+_LLM_SUMMARY_MIN_MESSAGES = 4
+_LLM_SUMMARY_MIN_CHARS = 400
+# Farming topics of recently analysed message texts, keyed by content digest
+_CONTENT_TOPICS_CACHE_SIZE = 4096
+
+# Keyword tables for the rule-based memory analysis; a keyword matches anywhere in the lowercased text
+_FARMING_TOPIC_KEYWORDS = {
+    "coffee": ("coffee", "arabica", "robusta", "sl28", "sl34", "ruiru", "batian"),
+    "pests": ("cbd", "clr", "thrips", "mites", "aphids", "pests", "disease"),
+    "weather": ("rain", "drought", "weather", "season", "climate"),
+    "harvest": ("harvest", "picking", "processing", "drying", "milling"),
+    "planting": ("planting", "seedlings", "nursery", "spacing"),
+    "soil": ("soil", "fertilizer", "nutrition", "ph", "organic"),
+    "market": ("price", "market", "selling", "buyer", "cooperative"),
+}
+# Checked in order; the first type with a matching keyword wins
+_MEMORY_TYPE_KEYWORDS = (
+    ("question", ("question", "?", "how", "what", "when", "where", "why")),
+    ("problem_solving", ("problem", "issue", "trouble", "help")),
+    ("positive_feedback", ("thanks", "thank", "helpful", "great")),
+    ("market_inquiry", ("price", "sell", "buy", "market")),
+    ("farming_activity", ("plant", "grow", "harvest", "fertilize")),
+)
+_ENTITY_KEYWORDS = (
+    ("variety", ("sl28", "sl34", "ruiru 11", "batian", "k7")),
+    ("location", ("nyeri", "kiambu", "muranga", "kirinyaga", "embu", "meru")),
+    ("time", ("today", "yesterday", "week", "month", "season", "harvest time")),
+)
+_TOPIC_NAMES = tuple(_FARMING_TOPIC_KEYWORDS)
+_TOPIC_IDS = {topic: topic_id for topic_id, topic in enumerate(_TOPIC_NAMES)}
+_CROP_KEYWORDS = ("coffee", "maize", "beans", "tomatoes")
+_ACTIVITY_KEYWORDS = ("planting", "harvesting", "pruning", "fertilizing", "spraying")
+_PROBLEM_KEYWORDS = frozenset(("disease", "pest", "drought", "rain", "problem"))
+
+# Lookups derived from the tables above, so analysis only walks the keywords a text contains
+_KEYWORD_TOPICS = {
+    keyword: frozenset(topic for topic, keywords in _FARMING_TOPIC_KEYWORDS.items() if keyword in keywords)
+    for keywords in _FARMING_TOPIC_KEYWORDS.values()
+    for keyword in keywords
+}
+_KEYWORD_MEMORY_TYPE_RANKS = {
+    keyword: min(rank for rank, (_, keywords) in enumerate(_MEMORY_TYPE_KEYWORDS) if keyword in keywords)
+    for _, keywords in _MEMORY_TYPE_KEYWORDS
+    for keyword in keywords
+}
+_ENTITY_TAGS = tuple(
+    (keyword, f"{kind}:{keyword}") for kind, keywords in _ENTITY_KEYWORDS for keyword in keywords
+)
+
+
+def _build_keyword_scanner(keywords):
+    """
+    Build a single-pass scanner finding which keywords occur as substrings of a text.
+    
+    The regex tries the longest keyword at every position (a zero-width
+    lookahead, so matches may overlap); every keyword contained in a hit,
+    such as "pest" in "pests", is then present too.
+    """
+    keywords = sorted(set(keywords), key=len, reverse=True)
+    pattern = re.compile("(?=(" + "|".join(map(re.escape, keywords)) + "))")
+    contained = {
+        keyword: frozenset(other for other in keywords if other in keyword)
+        for keyword in keywords
+    }
+    return pattern, contained
+
+
+_KEYWORD_RE, _CONTAINED_KEYWORDS = _build_keyword_scanner(
+    [keyword for keywords in _FARMING_TOPIC_KEYWORDS.values() for keyword in keywords]
+    + [keyword for _, keywords in _MEMORY_TYPE_KEYWORDS + _ENTITY_KEYWORDS for keyword in keywords]
+    + list(_CROP_KEYWORDS + _ACTIVITY_KEYWORDS) + list(_PROBLEM_KEYWORDS)
+)
+
+
+# Per-topic mention counts, first/last mentions and sessions (newest first) of a user's recent messages
+_TOPIC_MENTIONS_QUERY = text("""
+    SELECT topic, COUNT(*), MIN(created_at), MAX(created_at),
+           array_agg(session_id ORDER BY created_at DESC)
+    FROM conversation_messages, unnest(topics) AS topic
+    WHERE user_id = :user_id
+    AND created_at > :cutoff_date
+    AND message_type = 'user'
+    GROUP BY topic
+    HAVING COUNT(*) >= :min_frequency
+""")
+# The newest few messages for each of the given topics, for the LLM summaries
+_RECENT_TOPIC_MESSAGES_QUERY = text("""
+    SELECT topic, content, created_at, session_id
+    FROM (
+        SELECT topic, content, created_at, session_id,
+               row_number() OVER (PARTITION BY topic ORDER BY created_at DESC) AS recency
+        FROM conversation_messages, unnest(topics) AS topic
+        WHERE user_id = :user_id
+        AND created_at > :cutoff_date
+        AND message_type = 'user'
+        AND topic = ANY(:topics)
+    ) AS ranked
+    WHERE recency <= :per_topic
+    ORDER BY topic, created_at DESC
+""")
+_SUMMARY_CONVERSATIONS = 5
+
+
+def _insight_importances(
+    frequencies: np.ndarray,
+    first_ts: np.ndarray,
+    last_ts: np.ndarray,
+    now_ts: float
+) -> np.ndarray:
+    """
+    Score every topic's importance from its mention count and first/last mention epochs.
+    
+    Frequency (10 mentions for full marks) weighs 0.4, recency (decaying to
+    zero over 30 whole days since the last mention) 0.35, and consistency
+    (14 whole days between first and last mention) 0.25, capped at 1.0.
+    """
+    frequency_scores = np.minimum(1.0, frequencies / 10)
+    recency_scores = np.maximum(0.0, 1.0 - np.floor((now_ts - last_ts) / 86400) / 30)
+    consistency_scores = np.minimum(1.0, np.floor((last_ts - first_ts) / 86400) / 14)
+    return np.minimum(1.0, frequency_scores * 0.4 + recency_scores * 0.35 + consistency_scores * 0.25)
+
+
+def _topics_from_hits(hits: FrozenSet[str]) -> List[str]:
+    """Farming topics, in table order, with a keyword among the scan hits."""
+    topics = set()
+    for keyword in hits:
+        topics |= _KEYWORD_TOPICS.get(keyword, frozenset())
+    return [topic for topic in _TOPIC_NAMES if topic in topics]
+
+
+def _memory_type_from_hits(hits: FrozenSet[str]) -> str:
+    """The first memory type, in table order, with a keyword among the scan hits."""
+    ranks = [_KEYWORD_MEMORY_TYPE_RANKS[keyword] for keyword in hits if keyword in _KEYWORD_MEMORY_TYPE_RANKS]
+    if not ranks:
+        return "general_conversation"
+    return _MEMORY_TYPE_KEYWORDS[min(ranks)][0]
+
+
+def _entities_from_hits(hits: FrozenSet[str]) -> List[str]:
+    """``kind:keyword`` tags, in table order, for the entity keywords among the scan hits."""
+    if not hits:
+        return []
+    return [tag for keyword, tag in _ENTITY_TAGS if keyword in hits]
+
+
+def _farming_context_from_hits(hits: FrozenSet[str]) -> Dict[str, Any]:
+    """Crops, activity and problem flag for the scan hits."""
+    return {
+        "crop_mentioned": [crop for crop in _CROP_KEYWORDS if crop in hits],
+        "activity_type": next((activity for activity in _ACTIVITY_KEYWORDS if activity in hits), None),
+        "season_reference": None,
+        "problem_mentioned": not hits.isdisjoint(_PROBLEM_KEYWORDS)
+    }
+
+
+_content_topics_cache: "OrderedDict[bytes, Tuple[str, ...]]" = OrderedDict()
+
+
+def _content_topics(content: str) -> Tuple[str, ...]:
+    """Farming topics of a message text, memoised by content digest so repeated texts skip the scan."""
+    key = hashlib.blake2b(content.encode("utf-8"), digest_size=8).digest()
+    topics = _content_topics_cache.get(key)
+    if topics is not None:
+        _content_topics_cache.move_to_end(key)
+        return topics
+    
+    topics = tuple(_topics_from_hits(_scan_keywords(content.lower())))
+    _content_topics_cache[key] = topics
+    if len(_content_topics_cache) > _CONTENT_TOPICS_CACHE_SIZE:
+        _content_topics_cache.popitem(last=False)
+    return topics
+
+
+def message_topics(content: str) -> List[str]:
+    """Farming topics of a message, stored in ``conversation_messages.topics`` when the message is written."""
+    return list(_content_topics(content))
+
+
+def _analyze_content(content_lower: str) -> Tuple[str, List[str], Dict[str, Any], List[str]]:
+    """
+    Run every rule-based analysis of a memory from a single keyword scan.
+    
+    Args:
+        content_lower: Lowercased memory content
+        
+    Returns:
+        Memory type, key entities, farming context and farming topics
+    """
+    hits = _scan_keywords(content_lower)
+    return (
+        _memory_type_from_hits(hits),
+        _entities_from_hits(hits),
+        _farming_context_from_hits(hits),
+        _topics_from_hits(hits),
+    )
+
+
+def _analyze_batch(
+    contents: List[Optional[str]]
+) -> List[Optional[Tuple[str, List[str], Dict[str, Any], List[str]]]]:
+    """Run ``_analyze_content`` over a batch of memory texts; None for a memory without text."""
+    return [_analyze_content(content.lower()) if isinstance(content, str) else None for content in contents]
+
+
+def _topic_overlap(memory_topics: List[str], query_topics: List[str]) -> float:
+    """Share of the query's topics the memory also mentions; 0.3 when either has none."""
+    if not memory_topics or not query_topics:
+        return 0.3  # Default alignment
+    
+    common_topics = set(memory_topics) & set(query_topics)
+    return min(1.0, len(common_topics) / max(len(query_topics), 1))
+
+
+# Outermost {...} span of an LLM reply, for JSON wrapped in prose or code fences
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.S)
+
+
+def _parse_llm_json(content: str) -> Optional[Dict[str, Any]]:
+    """Parse the JSON object in an LLM reply, tolerating surrounding text; None when there is none."""
+    try:
+        parsed = orjson.loads(content)
+    except orjson.JSONDecodeError:
+        match = _JSON_OBJECT_RE.search(content)
+        if match is None:
+            return None
+        try:
+            parsed = orjson.loads(match.group(0))
+        except orjson.JSONDecodeError:
+            return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def _utc_epoch(moment: datetime) -> float:
+    """Epoch seconds of a datetime, reading naive values as UTC."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def _scan_keywords(text_lower: str) -> FrozenSet[str]:
+    """Return every analysis keyword occurring in already-lowercased text, in one regex pass."""
+    hits = set()
+    for match in _KEYWORD_RE.finditer(text_lower):
+        hits |= _CONTAINED_KEYWORDS[match.group(1)]
+    return frozenset(hits)
+
 
 @dataclass
 class MemoryInsight:
@@ -46,13 +310,69 @@ class ConversationSummary:
     duration_minutes: int
 
 
+@dataclass
+class _TopicMentions:
+    """A topic's mentions in a user's recent messages, grouped in SQL or in Python."""
+    topic: str
+    frequency: int
+    session_ids: List[str]
+    first_mentioned: datetime
+    last_mentioned: datetime
+    # Newest first; only these are shown to the LLM summary
+    recent_conversations: List[Dict[str, Any]]
+
+
+def to_memory_arrays(memories: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Convert enhanced memories to a structure-of-arrays layout for vectorised filtering.
+    
+    Args:
+        memories: Enhanced memory dicts, best first
+        
+    Returns:
+        Dict with parallel "contents", "types", "type_labels" (title-cased types for
+        display) lists and a float64 "relevance" array
+    """
+    types = [memory.get("memory_type", "general") for memory in memories]
+    return {
+        "contents": [memory.get("content", "") for memory in memories],
+        "types": types,
+        "type_labels": [memory_type.title() for memory_type in types],
+        "relevance": np.fromiter(
+            (memory.get("enhanced_relevance", 0) for memory in memories),
+            dtype=np.float64,
+            count=len(memories)
+        )
+    }
+
+
 class MemoryIntelligenceService:
     """Advanced memory intelligence with summarization and smart retrieval."""
     
     def __init__(self):
         self.llm_client = cerebras_client
         self.vector_service = vector_memory_service
-        self.embedding_service = embedding_service
+        # The memory service's embedder is the one whose model is loaded at startup
+        self.embedding_service = vector_memory_service.embedding_service
+        # (user_id, min_frequency) -> (built at, every qualifying insight ranked), in LRU order
+        self._insights_cache: "OrderedDict[Tuple[str, int], Tuple[float, List[MemoryInsight]]]" = OrderedDict()
+        # Semantic cache of LLM topic summaries, one index per topic
+        self._summary_cache: Dict[str, EmbeddingIndex] = {}
+        self._summary_sem = asyncio.Semaphore(_SUMMARY_CONCURRENCY)
+        # False once a grouped query finds no topics column (database/migrations not applied)
+        self._topics_column_ready = True
+    
+    def invalidate_user_insights(self, user_id: str):
+        """Drop cached insights for a user after new conversation history is stored."""
+        for key in [key for key in self._insights_cache if key[0] == user_id]:
+            del self._insights_cache[key]
+    
+    def _cache_insights(self, key: Tuple[str, int], insights: List[MemoryInsight]):
+        """Store ranked insights for a (user_id, min_frequency) key, evicting the oldest entry."""
+        self._insights_cache[key] = (time.monotonic(), insights)
+        self._insights_cache.move_to_end(key)
+        if len(self._insights_cache) > _INSIGHTS_CACHE_SIZE:
+            self._insights_cache.popitem(last=False)
     
     async def get_intelligent_memory_context(
         self, 
@@ -81,6 +401,7 @@ class MemoryIntelligenceService:
                 limit=max_memories * 2,  # Get more to filter intelligently
                 similarity_threshold=0.6
             )
+            await self._attach_full_content(relevant_memories)
             
             # 2. Enhance memories with intelligent analysis
             enhanced_memories = await self._enhance_memory_relevance(
@@ -97,6 +418,7 @@ class MemoryIntelligenceService:
             # 4. Build intelligent context
             context = {
                 "relevant_memories": enhanced_memories[:max_memories],
+                "memory_arrays": to_memory_arrays(enhanced_memories[:max_memories]),
                 "memory_insights": insights,
                 "context_summary": await self._build_context_summary(enhanced_memories, insights),
                 "total_memories_found": len(relevant_memories),
@@ -110,55 +432,115 @@ class MemoryIntelligenceService:
             logger.error(f"Error building intelligent memory context: {e}")
             return {
                 "relevant_memories": [],
+                "memory_arrays": to_memory_arrays([]),
                 "memory_insights": [],
                 "context_summary": "",
                 "total_memories_found": 0,
                 "confidence_score": 0.0
             }
     
+    async def _attach_full_content(self, memories: List[Dict[str, Any]]):
+        """Replace each memory's payload preview with its full message text, loaded in one query."""
+        ids = []
+        for memory in memories:
+            try:
+                ids.append(uuid.UUID(str(memory.get("message_id"))))
+            except ValueError:
+                continue
+        if not ids:
+            return
+        
+        try:
+            async with db_manager.get_postgres_session() as session:
+                result = await session.execute(
+                    select(ConversationMessage.id, ConversationMessage.content).where(
+                        ConversationMessage.id.in_(ids)
+                    )
+                )
+                contents = {str(message_id): content for message_id, content in result}
+        except Exception as e:
+            logger.warning(f"Failed to load full memory content, using previews: {e}")
+            return
+        
+        for memory in memories:
+            content = contents.get(memory.get("message_id"))
+            if content is not None:
+                memory["content"] = content
+    
     async def _enhance_memory_relevance(
         self,
         memories: List[Dict[str, Any]],
         current_query: str,
         user_id: str
     ) -> List[Dict[str, Any]]:
-        """Enhance memory relevance with additional intelligence."""
-        enhanced_memories = []
+        """
+        Enhance memory relevance with additional intelligence; memories are scored concurrently.
         
-        for memory in memories:
+        Each memory dict is annotated in place rather than copied, and the
+        same dicts are returned ordered by enhanced relevance. The keyword
+        analysis of the batch runs in a worker thread, overlapping the
+        embedding and session-count awaits instead of blocking the event loop.
+        """
+        alignments, session_counts, analyses = await asyncio.gather(
+            self._batch_topic_alignments([memory.get("content") or "" for memory in memories], current_query),
+            self._bulk_session_msg_counts([memory.get("session_id") for memory in memories], user_id),
+            asyncio.to_thread(_analyze_batch, [memory.get("content") for memory in memories])
+        )
+        
+        now_epoch = time.time()
+        # Keyword alignment, used only when embedding failed, needs the query's topics once
+        query_topics = self._extract_farming_topics(current_query) if alignments is None else None
+        
+        async def enhance(i: int, memory: Dict[str, Any]):
+            if analyses[i] is None:
+                logger.warning("Failed to enhance memory relevance: memory has no content")
+                return
+            
             try:
+                # One keyword scan of the content yielded every rule-based annotation
+                memory_type, key_entities, farming_context, topics = analyses[i]
+                
                 # Calculate enhanced relevance score
                 relevance_factors = await self._calculate_enhanced_relevance(
-                    memory, current_query, user_id
+                    memory, current_query, user_id,
+                    topic_alignment=(
+                        float(alignments[i]) if alignments is not None else _topic_overlap(topics, query_topics)
+                    ),
+                    session_counts=session_counts,
+                    now_epoch=now_epoch
                 )
                 
-                # Add enhanced metadata
-                enhanced_memory = {
-                    **memory,
-                    "enhanced_relevance": relevance_factors["total_score"],
-                    "relevance_factors": relevance_factors,
-                    "memory_type": self._classify_memory_type(memory),
-                    "key_entities": await self._extract_key_entities(memory["content"]),
-                    "farming_context": self._extract_farming_context(memory["content"])
-                }
-                
-                enhanced_memories.append(enhanced_memory)
+                memory["enhanced_relevance"] = relevance_factors["total_score"]
+                memory["relevance_factors"] = relevance_factors
+                memory["memory_type"] = memory_type
+                memory["key_entities"] = key_entities
+                memory["farming_context"] = farming_context
                 
             except Exception as e:
                 logger.warning(f"Failed to enhance memory relevance: {e}")
-                enhanced_memories.append(memory)
+        
+        await asyncio.gather(*(enhance(i, memory) for i, memory in enumerate(memories)))
         
         # Sort by enhanced relevance
-        enhanced_memories.sort(key=lambda x: x.get("enhanced_relevance", 0), reverse=True)
-        return enhanced_memories
+        return sorted(memories, key=lambda x: x.get("enhanced_relevance", 0), reverse=True)
     
     async def _calculate_enhanced_relevance(
         self,
         memory: Dict[str, Any],
         current_query: str,
-        user_id: str
+        user_id: str,
+        topic_alignment: Optional[float] = None,
+        session_counts: Optional[Dict[str, int]] = None,
+        now_epoch: Optional[float] = None
     ) -> Dict[str, float]:
-        """Calculate enhanced relevance score with multiple factors."""
+        """
+        Calculate enhanced relevance score with multiple factors.
+        
+        A precomputed topic alignment skips the keyword scan, and precomputed
+        per-session message counts skip the continuity query. Memories are aged
+        against ``now_epoch``, taken once per batch by the caller; only those
+        without a stored ``timestamp_epoch`` have their ISO timestamp parsed.
+        """
         factors = {
             "semantic_similarity": memory.get("similarity_score", 0.0),
             "recency_score": 0.0,
@@ -169,20 +551,24 @@ class MemoryIntelligenceService:
         
         try:
             # Calculate recency score (more recent = higher score)
-            if "timestamp" in memory:
-                timestamp = datetime.fromisoformat(memory["timestamp"].replace("Z", "+00:00"))
-                days_ago = (datetime.utcnow().replace(tzinfo=timestamp.tzinfo) - timestamp).days
+            memory_epoch = memory.get("timestamp_epoch")
+            if memory_epoch is None and isinstance(memory.get("timestamp"), str):
+                memory_epoch = _utc_epoch(datetime.fromisoformat(memory["timestamp"].replace("Z", "+00:00")))
+            if memory_epoch is not None:
+                if now_epoch is None:
+                    now_epoch = time.time()
+                days_ago = (now_epoch - memory_epoch) // 86400
                 factors["recency_score"] = max(0, 1.0 - (days_ago / 30))  # Decay over 30 days
             
             # Calculate topic alignment
-            factors["topic_alignment"] = await self._calculate_topic_alignment(
-                memory["content"], current_query
-            )
+            if topic_alignment is None:
+                topic_alignment = await self._calculate_topic_alignment(memory["content"], current_query)
+            factors["topic_alignment"] = topic_alignment
             
             # Calculate context continuity (how well it fits the conversation flow)
-            factors["context_continuity"] = await self._calculate_context_continuity(
-                memory, current_query, user_id
-            )
+            if session_counts is None:
+                session_counts = await self._bulk_session_msg_counts([memory.get("session_id")], user_id)
+            factors["context_continuity"] = self._calculate_context_continuity(memory, session_counts)
             
             # Calculate total weighted score
             weights = {
@@ -202,21 +588,37 @@ class MemoryIntelligenceService:
         
         return factors
     
+    async def _batch_topic_alignments(self, contents: List[str], current_query: str) -> Optional[np.ndarray]:
+        """
+        Score every memory's topic alignment with the query from one batched embedding call.
+        
+        Args:
+            contents: Memory texts
+            current_query: Current user query
+            
+        Returns:
+            Cosine similarities clipped to [0, 1], one per memory, or None when
+            embedding fails and the keyword scan should be used instead
+        """
+        if not contents:
+            return np.empty(0, dtype=np.float32)
+        
+        try:
+            # Rows come back L2-normalised, so one mat-vec gives every cosine similarity
+            vectors = await self.embedding_service.create_batch_embeddings_async(contents + [current_query])
+        except Exception as e:
+            logger.warning(f"Falling back to keyword topic alignment: {e}")
+            return None
+        
+        return np.clip(vectors[:-1] @ vectors[-1], 0.0, 1.0)
+    
     async def _calculate_topic_alignment(self, memory_content: str, current_query: str) -> float:
         """Calculate how well memory topic aligns with current query."""
         try:
-            # Extract topics from both texts
-            memory_topics = self._extract_farming_topics(memory_content)
-            query_topics = self._extract_farming_topics(current_query)
-            
-            if not memory_topics or not query_topics:
-                return 0.3  # Default alignment
-            
-            # Calculate topic overlap
-            common_topics = set(memory_topics) & set(query_topics)
-            alignment_score = len(common_topics) / max(len(query_topics), 1)
-            
-            return min(1.0, alignment_score)
+            # Extract topics from both texts and score their overlap
+            return _topic_overlap(
+                self._extract_farming_topics(memory_content), self._extract_farming_topics(current_query)
+            )
             
         except Exception as e:
             logger.warning(f"Error calculating topic alignment: {e}")
@@ -224,135 +626,75 @@ class MemoryIntelligenceService:
     
     def _extract_farming_topics(self, text: str) -> List[str]:
         """Extract farming-related topics from text."""
-        farming_keywords = {
-            "coffee": ["coffee", "arabica", "robusta", "sl28", "sl34", "ruiru", "batian"],
-            "pests": ["cbd", "clr", "thrips", "mites", "aphids", "pests", "disease"],
-            "weather": ["rain", "drought", "weather", "season", "climate"],
-            "harvest": ["harvest", "picking", "processing", "drying", "milling"],
-            "planting": ["planting", "seedlings", "nursery", "spacing"],
-            "soil": ["soil", "fertilizer", "nutrition", "ph", "organic"],
-            "market": ["price", "market", "selling", "buyer", "cooperative"]
-        }
-        
-        text_lower = text.lower()
-        found_topics = []
+        return _topics_from_hits(_scan_keywords(text.lower()))
+    
+    async def _bulk_session_msg_counts(self, session_ids: List[Optional[str]], user_id: str) -> Dict[str, int]:
+        """
+        Count the user's messages in each session with one grouped query.
         
-        for topic, keywords in farming_keywords.items():
-            if any(keyword in text_lower for keyword in keywords):
-                found_topics.append(topic)
+        Args:
+            session_ids: Session ids of candidate memories; missing ids and duplicates are ignored
+            user_id: User ID
+            
+        Returns:
+            Message count per session id; sessions without messages are absent
+        """
+        unique_ids = list({session_id for session_id in session_ids if session_id})
+        if not unique_ids:
+            return {}
         
-        return found_topics
-    
-    async def _calculate_context_continuity(
-        self,
-        memory: Dict[str, Any],
-        current_query: str,
-        user_id: str
-    ) -> float:
-        """Calculate how well memory continues the conversation context."""
         try:
-            # Check if memory is from a related conversation thread
-            session_id = memory.get("session_id")
-            if not session_id:
-                return 0.3
-            
-            # Get recent messages from the same session
             async with db_manager.get_postgres_session() as session:
-                recent_messages = await session.execute(
+                result = await session.execute(
                     text("""
-                        SELECT content, created_at 
-                        FROM conversation_messages 
-                        WHERE session_id = :session_id 
-                        AND user_id = :user_id 
-                        ORDER BY created_at DESC 
-                        LIMIT 5
+                        SELECT session_id, COUNT(*)
+                        FROM conversation_messages
+                        WHERE session_id = ANY(:session_ids)
+                        AND user_id = :user_id
+                        GROUP BY session_id
                     """),
-                    {"session_id": session_id, "user_id": user_id}
+                    {"session_ids": unique_ids, "user_id": user_id}
                 )
+                return {session_id: count for session_id, count in result.fetchall()}
                 
-                messages = recent_messages.fetchall()
-                
-                if len(messages) > 1:
-                    # Higher continuity score for conversations with multiple messages
-                    return 0.8
-                elif len(messages) == 1:
-                    return 0.6
-                else:
-                    return 0.3
-                    
         except Exception as e:
-            logger.warning(f"Error calculating context continuity: {e}")
-            return 0.3
+            logger.warning(f"Error counting session messages: {e}")
+            return {}
     
-    def _classify_memory_type(self, memory: Dict[str, Any]) -> str:
-        """Classify the type of memory based on content."""
-        content = memory.get("content", "").lower()
-        
-        if any(word in content for word in ["question", "?", "how", "what", "when", "where", "why"]):
-            return "question"
-        elif any(word in content for word in ["problem", "issue", "trouble", "help"]):
-            return "problem_solving"
-        elif any(word in content for word in ["thanks", "thank", "helpful", "great"]):
-            return "positive_feedback"
-        elif any(word in content for word in ["price", "sell", "buy", "market"]):
-            return "market_inquiry"
-        elif any(word in content for word in ["plant", "grow", "harvest", "fertilize"]):
-            return "farming_activity"
+    def _calculate_context_continuity(self, memory: Dict[str, Any], session_counts: Dict[str, int]) -> float:
+        """Calculate how well memory continues the conversation context from its session's message count."""
+        # Check if memory is from a related conversation thread
+        session_id = memory.get("session_id")
+        if not session_id:
+            return 0.3
+        
+        message_count = session_counts.get(session_id, 0)
+        if message_count > 1:
+            # Higher continuity score for conversations with multiple messages
+            return 0.8
+        elif message_count == 1:
+            return 0.6
         else:
-            return "general_conversation"
+            return 0.3
+    
+    def _classify_memory_type(self, memory: Dict[str, Any], hits: Optional[FrozenSet[str]] = None) -> str:
+        """Classify the type of memory based on content; ``hits`` is its ``_scan_keywords`` result if already known."""
+        if hits is None:
+            hits = _scan_keywords(memory.get("content", "").lower())
+        return _memory_type_from_hits(hits)
     
-    async def _extract_key_entities(self, content: str) -> List[str]:
-        """Extract key entities from memory content."""
+    async def _extract_key_entities(self, content: str, hits: Optional[FrozenSet[str]] = None) -> List[str]:
+        """Extract key entities (coffee varieties, Kenyan counties, time references) from memory content."""
         # Simple entity extraction - can be enhanced with NLP models
-        entities = []
-        
-        # Coffee varieties
-        varieties = ["sl28", "sl34", "ruiru 11", "batian", "k7"]
-        for variety in varieties:
-            if variety in content.lower():
-                entities.append(f"variety:{variety}")
-        
-        # Locations (Kenyan counties)
-        counties = ["nyeri", "kiambu", "muranga", "kirinyaga", "embu", "meru"]
-        for county in counties:
-            if county in content.lower():
-                entities.append(f"location:{county}")
-        
-        # Time references
-        time_words = ["today", "yesterday", "week", "month", "season", "harvest time"]
-        for time_word in time_words:
-            if time_word in content.lower():
-                entities.append(f"time:{time_word}")
-        
-        return entities
+        if hits is None:
+            hits = _scan_keywords(content.lower())
+        return _entities_from_hits(hits)
     
-    def _extract_farming_context(self, content: str) -> Dict[str, Any]:
+    def _extract_farming_context(self, content: str, hits: Optional[FrozenSet[str]] = None) -> Dict[str, Any]:
         """Extract farming-specific context from memory."""
-        context = {
-            "crop_mentioned": [],
-            "activity_type": None,
-            "season_reference": None,
-            "problem_mentioned": False
-        }
-        
-        content_lower = content.lower()
-        
-        # Crops
-        crops = ["coffee", "maize", "beans", "tomatoes"]
-        context["crop_mentioned"] = [crop for crop in crops if crop in content_lower]
-        
-        # Activities
-        activities = ["planting", "harvesting", "pruning", "fertilizing", "spraying"]
-        for activity in activities:
-            if activity in content_lower:
-                context["activity_type"] = activity
-                break
-        
-        # Problems
-        problems = ["disease", "pest", "drought", "rain", "problem"]
-        context["problem_mentioned"] = any(problem in content_lower for problem in problems)
-        
-        return context
+        if hits is None:
+            hits = _scan_keywords(content.lower())
+        return _farming_context_from_hits(hits)
     
     async def _build_context_summary(
         self,
@@ -391,15 +733,16 @@ class MemoryIntelligenceService:
             return 0.0
         
         # Calculate average enhanced relevance
-        relevance_scores = [
-            memory.get("enhanced_relevance", memory.get("similarity_score", 0))
-            for memory in memories
-        ]
+        relevance_scores = np.fromiter(
+            (memory.get("enhanced_relevance", memory.get("similarity_score", 0)) for memory in memories),
+            dtype=np.float64,
+            count=len(memories)
+        )
         
-        avg_relevance = sum(relevance_scores) / len(relevance_scores)
+        avg_relevance = float(relevance_scores.mean())
         
         # Boost confidence if we have multiple high-quality memories
-        quality_boost = min(0.2, len([s for s in relevance_scores if s > 0.7]) * 0.1)
+        quality_boost = min(0.2, int(np.count_nonzero(relevance_scores > 0.7)) * 0.1)
         
         return min(1.0, avg_relevance + quality_boost)
     
@@ -409,97 +752,212 @@ class MemoryIntelligenceService:
         limit: int = 5,
         min_frequency: int = 2
     ) -> List[MemoryInsight]:
-        """Extract important insights from user's conversation history."""
+        """Extract important insights from user's conversation history; requests with any limit share one cached ranking."""
+        cache_key = (user_id, min_frequency)
+        cached = self._insights_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < _INSIGHTS_CACHE_TTL_SECONDS:
+            self._insights_cache.move_to_end(cache_key)
+            return cached[1][:limit]
+        
         try:
-            # Get all user conversations from the last 30 days
-            async with db_manager.get_postgres_session() as session:
-                messages = await session.execute(
-                    text("""
-                        SELECT content, created_at, session_id
-                        FROM conversation_messages 
-                        WHERE user_id = :user_id 
-                        AND created_at > :cutoff_date
-                        AND message_type = 'user'
-                        ORDER BY created_at DESC
-                    """),
-                    {
-                        "user_id": user_id,
-                        "cutoff_date": datetime.utcnow() - timedelta(days=30)
-                    }
-                )
-                
-                conversation_data = messages.fetchall()
-                
-                if not conversation_data:
-                    return []
-                
-                # Analyze conversations for patterns and insights
-                insights = await self._analyze_conversation_patterns(conversation_data)
-                
-                # Filter and rank insights
-                filtered_insights = [
-                    insight for insight in insights 
-                    if insight.frequency >= min_frequency and insight.importance_score > 0.5
-                ]
-                
-                # Sort by importance and limit results
-                filtered_insights.sort(key=lambda x: x.importance_score, reverse=True)
-                return filtered_insights[:limit]
+            cutoff_date = datetime.utcnow() - timedelta(days=30)
+            insights = None
+            if self._topics_column_ready:
+                try:
+                    insights = await self._aggregate_topic_insights(user_id, cutoff_date, min_frequency)
+                except ProgrammingError as e:
+                    logger.warning(f"Topics column unavailable, grouping insights in Python: {e}")
+                    self._topics_column_ready = False
+            if insights is None:
+                insights = await self._scan_topic_insights(user_id, cutoff_date, min_frequency)
+            
+            # Filter and rank insights
+            filtered_insights = [
+                insight for insight in insights 
+                if insight.frequency >= min_frequency and insight.importance_score > 0.5
+            ]
+            
+            # Sort by importance and limit results
+            filtered_insights.sort(key=lambda x: x.importance_score, reverse=True)
+            self._cache_insights(cache_key, filtered_insights)
+            return filtered_insights[:limit]
                 
         except Exception as e:
             logger.error(f"Error extracting memory insights: {e}")
             return []
     
+    async def _aggregate_topic_insights(
+        self,
+        user_id: str,
+        cutoff_date: datetime,
+        min_frequency: int
+    ) -> List[MemoryInsight]:
+        """Build insights from topic mentions grouped in PostgreSQL; only the newest messages per topic are fetched."""
+        params = {"user_id": user_id, "cutoff_date": cutoff_date}
+        async with db_manager.get_postgres_session() as session:
+            result = await session.execute(
+                _TOPIC_MENTIONS_QUERY, {**params, "min_frequency": max(2, min_frequency)}
+            )
+            aggregates = result.fetchall()
+            if not aggregates:
+                return []
+            
+            result = await session.execute(_RECENT_TOPIC_MESSAGES_QUERY, {
+                **params,
+                "topics": [topic for topic, *_ in aggregates],
+                "per_topic": _SUMMARY_CONVERSATIONS
+            })
+            recent = {}
+            for topic, content, created_at, session_id in result.fetchall():
+                recent.setdefault(topic, []).append(
+                    {"content": content, "created_at": created_at, "session_id": session_id}
+                )
+        
+        return await self._build_topic_insights([
+            _TopicMentions(
+                topic=topic,
+                frequency=frequency,
+                session_ids=list(session_ids),
+                first_mentioned=first_mentioned,
+                last_mentioned=last_mentioned,
+                recent_conversations=recent.get(topic, [])
+            )
+            for topic, frequency, first_mentioned, last_mentioned, session_ids in aggregates
+        ])
+    
+    async def _scan_topic_insights(
+        self,
+        user_id: str,
+        cutoff_date: datetime,
+        min_frequency: int
+    ) -> List[MemoryInsight]:
+        """
+        Build insights by streaming the user's recent messages and grouping their topics in Python.
+        
+        Rows are pulled through a server-side cursor and scanned as they
+        arrive; only messages mentioning a farming topic are kept.
+        """
+        conversation_data, row_topics = [], []
+        async with db_manager.get_postgres_session() as session:
+            messages = await session.stream(
+                text("""
+                    SELECT content, created_at, session_id
+                    FROM conversation_messages 
+                    WHERE user_id = :user_id 
+                    AND created_at > :cutoff_date
+                    AND message_type = 'user'
+                    ORDER BY created_at DESC
+                """),
+                {"user_id": user_id, "cutoff_date": cutoff_date}
+            )
+            async for content, created_at, session_id in messages:
+                topics = _content_topics(content)
+                if topics:
+                    conversation_data.append((content, created_at, session_id))
+                    row_topics.append(topics)
+        
+        if not conversation_data:
+            return []
+        
+        # Analyze conversations for patterns and insights
+        return await self._analyze_conversation_patterns(conversation_data, min_frequency, row_topics=row_topics)
+    
     async def _analyze_conversation_patterns(
         self,
-        conversation_data: List[Tuple]
+        conversation_data: List[Tuple],
+        min_frequency: int = 2,
+        row_topics: Optional[List[Tuple[str, ...]]] = None
     ) -> List[MemoryInsight]:
-        """Analyze conversation patterns to extract insights."""
-        # Group conversations by topic
-        topic_conversations = defaultdict(list)
+        """
+        Analyze conversation patterns to extract insights.
+        
+        Topic mentions are kept as parallel arrays of (topic id, row) pairs and
+        grouped with one sort, so per-topic counts and first/last mentions need
+        no per-message dicts. Topics mentioned fewer than ``min_frequency``
+        times (and never only once) get no insight or LLM summary.
+        ``row_topics`` holds each row's topics when they were already extracted.
+        """
+        if row_topics is None:
+            row_topics = [_content_topics(content) for content, _, _ in conversation_data]
         
-        for content, created_at, session_id in conversation_data:
-            topics = self._extract_farming_topics(content)
+        topic_ids, row_ids = [], []
+        for row, topics in enumerate(row_topics):
             for topic in topics:
-                topic_conversations[topic].append({
-                    "content": content,
-                    "created_at": created_at,
-                    "session_id": session_id
-                })
+                topic_ids.append(_TOPIC_IDS[topic])
+                row_ids.append(row)
+        if not topic_ids:
+            return []
         
-        insights = []
+        topic_ids = np.array(topic_ids, dtype=np.int16)
+        row_ids = np.array(row_ids, dtype=np.int64)
+        timestamps = np.fromiter(
+            (created_at.timestamp() for _, created_at, _ in conversation_data),
+            dtype=np.float64,
+            count=len(conversation_data)
+        )
         
-        for topic, conversations in topic_conversations.items():
-            if len(conversations) < 2:  # Skip topics mentioned only once
+        # Group by topic, newest mention first within each topic
+        order = np.lexsort((-timestamps[row_ids], topic_ids))
+        grouped_topics, starts, counts = np.unique(topic_ids[order], return_index=True, return_counts=True)
+        grouped_rows = row_ids[order]
+        
+        eligible = []
+        for topic_id, start, frequency in zip(grouped_topics, starts, counts):
+            if frequency < max(2, min_frequency):  # Skip topics mentioned only once
                 continue
             
-            # Calculate insight metrics
-            frequency = len(conversations)
-            first_mentioned = min(conv["created_at"] for conv in conversations)
-            last_mentioned = max(conv["created_at"] for conv in conversations)
-            
-            # Generate summary using LLM
-            summary = await self._generate_topic_summary(topic, conversations)
-            
-            # Calculate importance score
-            importance_score = self._calculate_insight_importance(
-                frequency, first_mentioned, last_mentioned, conversations
-            )
-            
+            rows = [conversation_data[row] for row in grouped_rows[start:start + frequency]]
+            eligible.append(_TopicMentions(
+                topic=_TOPIC_NAMES[topic_id],
+                frequency=int(frequency),
+                session_ids=[session_id for _, _, session_id in rows],
+                first_mentioned=rows[-1][1],
+                last_mentioned=rows[0][1],
+                recent_conversations=[
+                    {"content": content, "created_at": created_at, "session_id": session_id}
+                    for content, created_at, session_id in rows[:_SUMMARY_CONVERSATIONS]
+                ]
+            ))
+        
+        return await self._build_topic_insights(eligible)
+    
+    async def _build_topic_insights(self, eligible: List[_TopicMentions]) -> List[MemoryInsight]:
+        """Summarise and score each grouped topic as an insight."""
+        # Generate summaries using the LLM, several topics at a time
+        summaries = await asyncio.gather(*(
+            self._bounded_topic_summary(mentions.topic, mentions.recent_conversations) for mentions in eligible
+        ))
+        
+        # Score every topic at once
+        importance_scores = _insight_importances(
+            np.array([mentions.frequency for mentions in eligible], dtype=np.float64),
+            np.array([_utc_epoch(mentions.first_mentioned) for mentions in eligible], dtype=np.float64),
+            np.array([_utc_epoch(mentions.last_mentioned) for mentions in eligible], dtype=np.float64),
+            time.time()
+        )
+        
+        insights = []
+        
+        for mentions, summary, importance_score in zip(eligible, summaries, importance_scores):
             insight = MemoryInsight(
-                topic=topic,
+                topic=mentions.topic,
                 summary=summary,
-                importance_score=importance_score,
-                related_conversations=[conv["session_id"] for conv in conversations],
-                first_mentioned=first_mentioned,
-                last_mentioned=last_mentioned,
-                frequency=frequency
+                importance_score=float(importance_score),
+                related_conversations=mentions.session_ids,
+                first_mentioned=mentions.first_mentioned,
+                last_mentioned=mentions.last_mentioned,
+                frequency=mentions.frequency
             )
             
             insights.append(insight)
         
         return insights
     
+    async def _bounded_topic_summary(self, topic: str, conversations: List[Dict[str, Any]]) -> str:
+        """Generate a topic summary once one of the shared LLM slots is free."""
+        async with self._summary_sem:
+            return await self._generate_topic_summary(topic, conversations)
+    
     async def _generate_topic_summary(
         self,
         topic: str,
@@ -518,6 +976,12 @@ class MemoryIntelligenceService:
                 f"- {conv['content']}" for conv in recent_conversations
             ])
             
+            # Near-identical conversations about the topic were summarised before
+            key_embedding = await self._embed_summary_key(topic, recent_conversations)
+            cached_summary = self._lookup_cached_summary(topic, key_embedding)
+            if cached_summary is not None:
+                return cached_summary
+            
             # Use LLM to generate summary
             prompt = f"""
             Analyze these farmer conversations about {topic} and provide a concise insight summary:
@@ -535,39 +999,58 @@ class MemoryIntelligenceService:
             ]
             
             response = await self.llm_client.generate_response(messages)
-            return response.get("content", f"Recurring topic: {topic}")
+            summary = response.get("content", f"Recurring topic: {topic}")
+            self._store_cached_summary(topic, key_embedding, summary)
+            return summary
             
         except Exception as e:
             logger.warning(f"Error generating topic summary for {topic}: {e}")
             return f"Frequently discussed: {topic} ({len(conversations)} times)"
     
-    def _calculate_insight_importance(
-        self,
-        frequency: int,
-        first_mentioned: datetime,
-        last_mentioned: datetime,
-        conversations: List[Dict[str, Any]]
-    ) -> float:
-        """Calculate the importance score of an insight."""
-        # Base score from frequency
-        frequency_score = min(1.0, frequency / 10)  # Normalize to max 1.0
-        
-        # Recency score (more recent = more important)
-        days_since_last = (datetime.utcnow().replace(tzinfo=last_mentioned.tzinfo) - last_mentioned).days
-        recency_score = max(0, 1.0 - (days_since_last / 30))
-        
-        # Consistency score (spread over time = more important)
-        time_span_days = (last_mentioned - first_mentioned).days
-        consistency_score = min(1.0, time_span_days / 14)  # 2 weeks for full score
-        
-        # Combine scores with weights
-        importance = (
-            frequency_score * 0.4 +
-            recency_score * 0.35 +
-            consistency_score * 0.25
+    async def _embed_summary_key(self, topic: str, recent_conversations: List[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Embed a topic with its most recent conversations as a summary cache key, or None if embedding fails."""
+        key_text = topic + "|" + "\n".join(
+            conv["content"] for conv in recent_conversations[:_SUMMARY_KEY_CONVERSATIONS]
         )
+        try:
+            return await self.embedding_service.create_embedding(key_text)
+        except Exception as e:
+            logger.warning(f"Summary cache disabled for this topic: {e}")
+            return None
+    
+    def _lookup_cached_summary(self, topic: str, key_embedding: Optional[np.ndarray]) -> Optional[str]:
+        """Return a fresh cached summary of semantically equivalent conversations, if any."""
+        index = self._summary_cache.get(topic)
+        if key_embedding is None or index is None:
+            return None
+        
+        matches = index.search(key_embedding, limit=1, score_threshold=_SUMMARY_CACHE_THRESHOLD)
+        if not matches:
+            return None
+        
+        cached, _ = matches[0]
+        if time.monotonic() - cached["created_at"] >= _SUMMARY_CACHE_TTL_SECONDS:
+            return None
+        return cached["summary"]
+    
+    def _store_cached_summary(self, topic: str, key_embedding: Optional[np.ndarray], summary: str):
+        """Remember an LLM summary under its key embedding, dropping expired and then oldest entries when full."""
+        if key_embedding is None:
+            return
         
-        return min(1.0, importance)
+        index = self._summary_cache.get(topic)
+        if index is None:
+            index = self._summary_cache[topic] = EmbeddingIndex(len(key_embedding))
+        
+        # Expired summaries go first so they cannot shadow the new one in lookups
+        now = time.monotonic()
+        ages = np.fromiter((now - p["created_at"] for p in index.payloads), dtype=np.float64, count=len(index))
+        keep = ages < _SUMMARY_CACHE_TTL_SECONDS
+        # Rows are in insertion order, so the oldest are first
+        keep[:max(0, len(keep) - _SUMMARY_CACHE_ENTRIES_PER_TOPIC + 1)] = False
+        index.retain(keep)
+        
+        index.add([key_embedding], [{"created_at": now, "summary": summary}])
     
     async def consolidate_session_memory(
         self,
@@ -624,7 +1107,13 @@ class MemoryIntelligenceService:
         self,
         message_data: List[Tuple]
     ) -> Dict[str, Any]:
-        """Generate a comprehensive conversation summary using LLM."""
+        """Generate a comprehensive conversation summary using LLM; trivially short sessions skip the LLM."""
+        if (
+            len(message_data) < _LLM_SUMMARY_MIN_MESSAGES
+            or sum(len(content) for content, _, _, _ in message_data) < _LLM_SUMMARY_MIN_CHARS
+        ):
+            return self._fallback_conversation_analysis(message_data)
+        
         try:
             # Build conversation text
             conversation_text = []
@@ -655,30 +1144,34 @@ class MemoryIntelligenceService:
                 {"role": "user", "content": prompt}
             ]
             
-            response = await self.llm_client.generate_response(messages)
+            response = await self.llm_client.generate_response(
+                messages, response_format={"type": "json_object"}
+            )
             
-            # Try to parse JSON response
-            import json
-            try:
-                return json.loads(response.get("content", "{}"))
-            except json.JSONDecodeError:
+            # Try to parse JSON response, even when the model wraps it in prose
+            analysis = _parse_llm_json(response.get("content") or "{}")
+            if analysis is None:
                 # Fallback to simple analysis
                 return self._fallback_conversation_analysis(message_data)
+            return analysis
                 
         except Exception as e:
             logger.warning(f"Error generating conversation summary: {e}")
             return self._fallback_conversation_analysis(message_data)
     
     def _fallback_conversation_analysis(self, message_data: List[Tuple]) -> Dict[str, Any]:
-        """Fallback conversation analysis when LLM fails."""
-        user_messages = [content for content, msg_type, _, _ in message_data if msg_type == "user"]
-        all_content = " ".join([content for content, _, _, _ in message_data])
+        """Fallback conversation analysis when LLM fails; topics are ranked by how many messages mention them."""
+        user_message_count = 0
+        topic_counts = Counter()
+        for content, msg_type, _, _ in message_data:
+            if msg_type == "user":
+                user_message_count += 1
+            topic_counts.update(self._extract_farming_topics(content))
         
-        # Extract topics
-        topics = self._extract_farming_topics(all_content)
+        topics = [topic for topic, _ in topic_counts.most_common(5)]
         
         return {
-            "summary": f"Conversation about {', '.join(topics[:3]) if topics else 'general farming'} with {len(user_messages)} farmer questions.",
+            "summary": f"Conversation about {', '.join(topics[:3]) if topics else 'general farming'} with {user_message_count} farmer questions.",
             "key_topics": topics[:5],
             "action_items": [],
             "farming_insights": [],
@@ -12,6 +12,8 @@ from enum import Enum
 import json
 import math
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
 
@@ -64,6 +66,125 @@ class SeasonalPrediction:
     risk_factors: List[str]
 
 
+# Kenya coffee farming calendar
+_COFFEE_CALENDAR = {
+    "long_rains": {"start": "03-15", "end": "05-31", "activities": ("fertilizing", "disease_prevention", "pruning")},
+    "dry_season_1": {"start": "06-01", "end": "09-30", "activities": ("pest_control", "irrigation", "harvesting")},
+    "short_rains": {"start": "10-01", "end": "12-31", "activities": ("planting", "fertilizing", "soil_preparation")},
+    "dry_season_2": {"start": "01-01", "end": "03-14", "activities": ("harvesting", "processing", "maintenance")}
+}
+
+
+def _month_day(month_day: str) -> int:
+    """Encode an "MM-DD" calendar date as the integer MMDD, so dates compare as numbers."""
+    month, day = map(int, month_day.split("-"))
+    return month * 100 + day
+
+
+# (season, start MMDD, end MMDD) in calendar order
+_SEASONS = tuple(
+    (season, _month_day(details["start"]), _month_day(details["end"]))
+    for season, details in _COFFEE_CALENDAR.items()
+)
+_SEASON_INDEX = {season: index for index, (season, _, _) in enumerate(_SEASONS)}
+
+# Disease and pest risk factors
+_RISK_FACTORS = {
+    "coffee_berry_disease": {
+        "temperature_range": (15, 25),
+        "humidity_threshold": 80,
+        "rainfall_threshold": 100,
+        "season_risk": ("long_rains", "short_rains")
+    },
+    "coffee_leaf_rust": {
+        "temperature_range": (18, 28),
+        "humidity_threshold": 85,
+        "rainfall_threshold": 150,
+        "season_risk": ("long_rains",)
+    },
+    "coffee_berry_borer": {
+        "temperature_range": (20, 30),
+        "humidity_threshold": 70,
+        "rainfall_threshold": 50,
+        "season_risk": ("dry_season_1", "dry_season_2")
+    }
+}
+
+# Risk factors packed per disease, in table order, for the scoring kernel
+_RISK_DISEASES = tuple(_RISK_FACTORS)
+_RISK_TEMP_LOW = np.array([factors["temperature_range"][0] for factors in _RISK_FACTORS.values()], dtype=np.float64)
+_RISK_TEMP_HIGH = np.array([factors["temperature_range"][1] for factors in _RISK_FACTORS.values()], dtype=np.float64)
+_RISK_RAINFALL_THRESHOLDS = np.array(
+    [factors["rainfall_threshold"] for factors in _RISK_FACTORS.values()], dtype=np.float64
+)
+
+_PREVENTION_ADVICE = {
+    "coffee_berry_disease": {
+        RiskLevel.LOW: "Continue regular monitoring",
+        RiskLevel.MEDIUM: "Apply preventive copper-based fungicide",
+        RiskLevel.HIGH: "Increase spray frequency, improve drainage",
+        RiskLevel.CRITICAL: "Emergency fungicide application, remove affected berries"
+    },
+    "coffee_leaf_rust": {
+        RiskLevel.LOW: "Monitor lower leaves weekly",
+        RiskLevel.MEDIUM: "Apply preventive fungicide, improve air circulation",
+        RiskLevel.HIGH: "Systemic fungicide treatment, increase nutrition",
+        RiskLevel.CRITICAL: "Emergency treatment protocol, consider resistant varieties"
+    },
+    "coffee_berry_borer": {
+        RiskLevel.LOW: "Regular berry inspection",
+        RiskLevel.MEDIUM: "Set up monitoring traps, harvest ripe berries promptly",
+        RiskLevel.HIGH: "Apply biocontrol agents, intensive monitoring",
+        RiskLevel.CRITICAL: "Emergency insecticide treatment, mass trapping"
+    }
+}
+
+_SEASON_DESCRIPTIONS = {
+    "long_rains": "Main growing season with heavy rainfall and active plant growth",
+    "dry_season_1": "First dry period, focus on pest control and early harvest",
+    "short_rains": "Second growing season with moderate rainfall, good for planting",
+    "dry_season_2": "Main harvest and processing season"
+}
+
+
+def _forecast_arrays(weather_forecast: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """Read a forecast's daily average temperatures and rainfall amounts into arrays in one pass."""
+    temps = np.empty(len(weather_forecast), dtype=np.float64)
+    rain = np.empty(len(weather_forecast), dtype=np.float64)
+    for i, day in enumerate(weather_forecast):
+        low, high = day["temperature_range"]
+        temps[i] = (low + high) / 2
+        rain[i] = day["rainfall_amount"]
+    return temps, rain
+
+
+def _score_risks(
+    temps: np.ndarray,
+    rain: np.ndarray,
+    temp_low: np.ndarray,
+    temp_high: np.ndarray,
+    rainfall_thresholds: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score every disease against every forecast day.
+    
+    A day scores 0.3 when its average temperature is in the disease's range,
+    0.4 when rainfall exceeds a tenth of its threshold (a humidity proxy) and
+    0.3 when rainfall exceeds a thirtieth; days scoring above 0.5 are risky.
+    
+    Returns:
+        Summed score of the risky days and the number of risky days, per disease
+    """
+    thresholds = rainfall_thresholds[:, None]
+    day_risk = (
+        0.3 * ((temps >= temp_low[:, None]) & (temps <= temp_high[:, None]))
+        + 0.4 * (rain > thresholds / 10)
+        + 0.3 * (rain > thresholds / 30)
+    )
+    risky = day_risk > 0.5
+    return np.where(risky, day_risk, 0.0).sum(axis=1), np.count_nonzero(risky, axis=1)
+
+
 class PredictiveAnalyticsService:
     """Service for predictive analytics and farming recommendations."""
     
@@ -72,35 +193,9 @@ class PredictiveAnalyticsService:
         self.weather_service = None
         self.memory_service = None
         
-        # Kenya coffee farming calendar
-        self.coffee_calendar = {
-            "long_rains": {"start": "03-15", "end": "05-31", "activities": ["fertilizing", "disease_prevention", "pruning"]},
-            "dry_season_1": {"start": "06-01", "end": "09-30", "activities": ["pest_control", "irrigation", "harvesting"]},
-            "short_rains": {"start": "10-01", "end": "12-31", "activities": ["planting", "fertilizing", "soil_preparation"]},
-            "dry_season_2": {"start": "01-01", "end": "03-14", "activities": ["harvesting", "processing", "maintenance"]}
-        }
-        
-        # Disease and pest risk factors
-        self.risk_factors = {
-            "coffee_berry_disease": {
-                "temperature_range": (15, 25),
-                "humidity_threshold": 80,
-                "rainfall_threshold": 100,
-                "season_risk": ["long_rains", "short_rains"]
-            },
-            "coffee_leaf_rust": {
-                "temperature_range": (18, 28),
-                "humidity_threshold": 85,
-                "rainfall_threshold": 150,
-                "season_risk": ["long_rains"]
-            },
-            "coffee_berry_borer": {
-                "temperature_range": (20, 30),
-                "humidity_threshold": 70,
-                "rainfall_threshold": 50,
-                "season_risk": ["dry_season_1", "dry_season_2"]
-            }
-        }
+        # Module-level tables, shared by every instance
+        self.coffee_calendar = _COFFEE_CALENDAR
+        self.risk_factors = _RISK_FACTORS
         
     async def initialize(self):
         """Initialize dependencies."""
@@ -133,22 +228,26 @@ class PredictiveAnalyticsService:
             Comprehensive prediction results
         """
         try:
-            # Get weather forecast
-            weather_forecast = await self._get_weather_predictions(latitude, longitude, days_ahead)
-            
-            # Get seasonal predictions
-            seasonal_predictions = await self._get_seasonal_predictions()
-            
-            # Get disease/pest risk predictions
-            risk_predictions = await self._predict_disease_pest_risks(weather_forecast)
-            
-            # Get activity recommendations
-            activity_recommendations = await self._get_activity_recommendations(
-                weather_forecast, seasonal_predictions, user_id
+            # Weather forecast and seasonal predictions are independent of each other
+            weather_forecast, seasonal_predictions = await asyncio.gather(
+                self._get_weather_predictions(latitude, longitude, days_ahead),
+                self._get_seasonal_predictions()
             )
             
-            # Get yield predictions
-            yield_predictions = await self._predict_yield_impacts(weather_forecast, user_id)
+            # Daily temperatures and rainfall, shared by the risk and yield models; a
+            # malformed day leaves each model to read (and fail on) the forecast itself
+            try:
+                forecast_arrays = _forecast_arrays(weather_forecast)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Could not read forecast arrays: {str(e)}")
+                forecast_arrays = None
+            
+            # Risk, activity and yield predictions all build on the forecast; run them together
+            risk_predictions, activity_recommendations, yield_predictions = await asyncio.gather(
+                self._predict_disease_pest_risks(weather_forecast, forecast_arrays),
+                self._get_activity_recommendations(weather_forecast, seasonal_predictions, user_id),
+                self._predict_yield_impacts(weather_forecast, user_id, forecast_arrays)
+            )
             
             return {
                 "timestamp": datetime.now().isoformat(),
@@ -254,12 +353,9 @@ class PredictiveAnalyticsService:
     
     def _get_current_season(self, date: datetime) -> str:
         """Determine current farming season."""
-        month_day = date.strftime("%m-%d")
+        month_day = date.month * 100 + date.day
         
-        for season, details in self.coffee_calendar.items():
-            start = details["start"]
-            end = details["end"]
-            
+        for season, start, end in _SEASONS:
             # Handle year boundary
             if start <= end:  # Same year
                 if start <= month_day <= end:
@@ -272,44 +368,34 @@ class PredictiveAnalyticsService:
     
     def _get_next_season(self, date: datetime) -> str:
         """Get the next farming season."""
-        current = self._get_current_season(date)
-        seasons = list(self.coffee_calendar.keys())
-        
-        try:
-            current_index = seasons.index(current)
-            next_index = (current_index + 1) % len(seasons)
-            return seasons[next_index]
-        except ValueError:
-            return seasons[0]
+        current_index = _SEASON_INDEX.get(self._get_current_season(date))
+        if current_index is None:
+            return _SEASONS[0][0]
+        return _SEASONS[(current_index + 1) % len(_SEASONS)][0]
     
-    async def _predict_disease_pest_risks(self, weather_forecast: List[Dict]) -> Dict[str, Any]:
-        """Predict disease and pest risks based on weather."""
+    async def _predict_disease_pest_risks(
+        self,
+        weather_forecast: List[Dict],
+        forecast_arrays: Optional[Tuple[np.ndarray, np.ndarray]] = None
+    ) -> Dict[str, Any]:
+        """
+        Predict disease and pest risks based on weather.
+        
+        The forecast is read into per-day temperature and rainfall arrays once
+        (or ``forecast_arrays`` from ``_forecast_arrays`` is reused), and one
+        ``_score_risks`` call scores every disease against every day.
+        """
         try:
             risk_predictions = {}
             
-            for disease, factors in self.risk_factors.items():
-                risk_score = 0
-                risk_days = 0
-                
-                for day in weather_forecast:
-                    day_risk = 0
-                    
-                    # Temperature risk
-                    temp_avg = (day["temperature_range"][0] + day["temperature_range"][1]) / 2
-                    if factors["temperature_range"][0] <= temp_avg <= factors["temperature_range"][1]:
-                        day_risk += 0.3
-                    
-                    # Humidity risk (using rainfall as proxy)
-                    if day["rainfall_amount"] > factors["rainfall_threshold"] / 10:  # Scale down
-                        day_risk += 0.4
-                    
-                    # Rainfall risk
-                    if day["rainfall_amount"] > factors["rainfall_threshold"] / 30:  # Scale down
-                        day_risk += 0.3
-                    
-                    if day_risk > 0.5:
-                        risk_days += 1
-                        risk_score += day_risk
+            temps, rain = forecast_arrays if forecast_arrays is not None else _forecast_arrays(weather_forecast)
+            risk_scores, risk_day_counts = _score_risks(
+                temps, rain, _RISK_TEMP_LOW, _RISK_TEMP_HIGH, _RISK_RAINFALL_THRESHOLDS
+            )
+            
+            for disease, risk_score, risk_days in zip(_RISK_DISEASES, risk_scores, risk_day_counts):
+                risk_score = float(risk_score)
+                risk_days = int(risk_days)
                 
                 # Calculate risk level
                 avg_risk = risk_score / len(weather_forecast) if weather_forecast else 0
@@ -342,28 +428,7 @@ class PredictiveAnalyticsService:
     
     def _get_prevention_advice(self, disease: str, risk_level: RiskLevel) -> str:
         """Get prevention advice for diseases/pests."""
-        advice_map = {
-            "coffee_berry_disease": {
-                RiskLevel.LOW: "Continue regular monitoring",
-                RiskLevel.MEDIUM: "Apply preventive copper-based fungicide",
-                RiskLevel.HIGH: "Increase spray frequency, improve drainage",
-                RiskLevel.CRITICAL: "Emergency fungicide application, remove affected berries"
-            },
-            "coffee_leaf_rust": {
-                RiskLevel.LOW: "Monitor lower leaves weekly",
-                RiskLevel.MEDIUM: "Apply preventive fungicide, improve air circulation",
-                RiskLevel.HIGH: "Systemic fungicide treatment, increase nutrition",
-                RiskLevel.CRITICAL: "Emergency treatment protocol, consider resistant varieties"
-            },
-            "coffee_berry_borer": {
-                RiskLevel.LOW: "Regular berry inspection",
-                RiskLevel.MEDIUM: "Set up monitoring traps, harvest ripe berries promptly",
-                RiskLevel.HIGH: "Apply biocontrol agents, intensive monitoring",
-                RiskLevel.CRITICAL: "Emergency insecticide treatment, mass trapping"
-            }
-        }
-        
-        return advice_map.get(disease, {}).get(risk_level, "Monitor and maintain good farm hygiene")
+        return _PREVENTION_ADVICE.get(disease, {}).get(risk_level, "Monitor and maintain good farm hygiene")
     
     async def _get_activity_recommendations(
         self, 
@@ -507,16 +572,22 @@ class PredictiveAnalyticsService:
         
         return recommendations
     
-    async def _predict_yield_impacts(self, weather_forecast: List[Dict], user_id: Optional[str]) -> Dict[str, Any]:
-        """Predict yield impacts based on weather and farming practices."""
+    async def _predict_yield_impacts(
+        self,
+        weather_forecast: List[Dict],
+        user_id: Optional[str],
+        forecast_arrays: Optional[Tuple[np.ndarray, np.ndarray]] = None
+    ) -> Dict[str, Any]:
+        """Predict yield impacts based on weather and farming practices; ``forecast_arrays`` skips re-reading the forecast."""
         try:
             # Simple yield impact model
             impact_score = 0
             factors = []
             
-            # Analyze weather patterns
-            total_rainfall = sum(day["rainfall_amount"] for day in weather_forecast)
-            avg_temp = sum((day["temperature_range"][0] + day["temperature_range"][1]) / 2 for day in weather_forecast) / len(weather_forecast)
+            # Analyze weather patterns from one pass over the forecast
+            temps, rain = forecast_arrays if forecast_arrays is not None else _forecast_arrays(weather_forecast)
+            total_rainfall = float(rain.sum())
+            avg_temp = float(temps.sum()) / len(weather_forecast)
             
             # Rainfall impact
             if 200 <= total_rainfall <= 400:  # Optimal range for 2 weeks
@@ -664,19 +735,12 @@ class PredictiveAnalyticsService:
     
     def _get_season_description(self, season: str) -> str:
         """Get description for farming season."""
-        descriptions = {
-            "long_rains": "Main growing season with heavy rainfall and active plant growth",
-            "dry_season_1": "First dry period, focus on pest control and early harvest",
-            "short_rains": "Second growing season with moderate rainfall, good for planting",
-            "dry_season_2": "Main harvest and processing season"
-        }
-        return descriptions.get(season, "Farming season")
+        return _SEASON_DESCRIPTIONS.get(season, "Farming season")
     
     def _days_until_season_end(self, current_date: datetime, season: str) -> int:
         """Calculate days until current season ends."""
         try:
-            end_date_str = self.coffee_calendar[season]["end"]
-            end_month, end_day = map(int, end_date_str.split("-"))
+            end_month, end_day = divmod(_SEASONS[_SEASON_INDEX[season]][2], 100)
             
             # Handle year boundary
             end_date = current_date.replace(month=end_month, day=end_day)
@@ -690,8 +754,7 @@ class PredictiveAnalyticsService:
     def _days_until_season_start(self, current_date: datetime, season: str) -> int:
         """Calculate days until next season starts."""
         try:
-            start_date_str = self.coffee_calendar[season]["start"]
-            start_month, start_day = map(int, start_date_str.split("-"))
+            start_month, start_day = divmod(_SEASONS[_SEASON_INDEX[season]][1], 100)
             
             start_date = current_date.replace(month=start_month, day=start_day)
             if start_date < current_date:
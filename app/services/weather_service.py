@@ -3,14 +3,23 @@ OpenMeteo Weather Service for AI Agent.
 Provides intelligent weather insights for coffee farming.
 """
 
+import asyncio
 import httpx
 import logging
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 
+from app.clients import shared_client
+
 logger = logging.getLogger(__name__)
 
+# Weather responses are reused for nearby coordinates (~1 km grid) within this window
+_CACHE_TTL_SECONDS = 1800
+_CACHE_SIZE = 1024
+
 
 @dataclass
 class WeatherData:
@@ -40,11 +49,54 @@ class OpenMeteoWeatherService:
     
     BASE_URL = "https://api.open-meteo.com/v1"
     
-    def __init__(self):
-        self.client = httpx.AsyncClient(timeout=30.0)
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        self.client = client or shared_client
+        # (kind, lat, lon, days) -> (fetched at, value), in LRU order
+        self._cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._cache_locks: Dict[tuple, asyncio.Lock] = {}
+    
+    async def _get_cached(self, key: tuple, fetch):
+        """Return a fresh cached value for key, or fetch it once even under concurrent callers."""
+        cached = self._cache.get(key)
+        if cached and time.monotonic() - cached[0] < _CACHE_TTL_SECONDS:
+            self._cache.move_to_end(key)
+            return cached[1]
+        
+        lock = self._cache_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            cached = self._cache.get(key)
+            if cached and time.monotonic() - cached[0] < _CACHE_TTL_SECONDS:
+                return cached[1]
+            
+            value = await fetch()
+            # Failed lookups return None / [] and are retried on the next call
+            if value:
+                self._cache[key] = (time.monotonic(), value)
+                self._cache.move_to_end(key)
+                if len(self._cache) > _CACHE_SIZE:
+                    self._cache.popitem(last=False)
+        
+        self._cache_locks.pop(key, None)
+        return value
     
     async def get_current_weather(self, latitude: float, longitude: float) -> Optional[WeatherData]:
         """Get current weather conditions for a location."""
+        latitude, longitude = round(latitude, 2), round(longitude, 2)
+        return await self._get_cached(
+            ("current", latitude, longitude, None),
+            lambda: self._fetch_current_weather(latitude, longitude)
+        )
+    
+    async def get_forecast(self, latitude: float, longitude: float, days: int = 7) -> List[WeatherForecast]:
+        """Get weather forecast for specified days."""
+        latitude, longitude = round(latitude, 2), round(longitude, 2)
+        return await self._get_cached(
+            ("forecast", latitude, longitude, days),
+            lambda: self._fetch_forecast(latitude, longitude, days)
+        )
+    
+    async def _fetch_current_weather(self, latitude: float, longitude: float) -> Optional[WeatherData]:
+        """Fetch current weather conditions for a location from OpenMeteo."""
         try:
             url = f"{self.BASE_URL}/forecast"
             params = {
@@ -73,8 +125,8 @@ class OpenMeteoWeatherService:
             logger.error(f"Failed to fetch current weather: {e}")
             return None
     
-    async def get_forecast(self, latitude: float, longitude: float, days: int = 7) -> List[WeatherForecast]:
-        """Get weather forecast for specified days."""
+    async def _fetch_forecast(self, latitude: float, longitude: float, days: int) -> List[WeatherForecast]:
+        """Fetch weather forecast for specified days from OpenMeteo."""
         try:
             url = f"{self.BASE_URL}/forecast"
             params = {
@@ -310,8 +362,9 @@ class OpenMeteoWeatherService:
         return activities
     
     async def close(self):
-        """Close the HTTP client."""
-        await self.client.aclose()
+        """Close the HTTP client (only if it is not the shared application client)."""
+        if self.client is not shared_client:
+            await self.client.aclose()
 
 
 # Global weather service instance
@@ -42,6 +42,7 @@ CREATE TABLE conversation_messages (
     model_used VARCHAR(100),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     message_metadata JSONB DEFAULT '{}',
+    topics TEXT[],
     FOREIGN KEY (session_id) REFERENCES conversation_sessions(session_id) ON DELETE CASCADE,
     FOREIGN KEY (user_id) REFERENCES user_profiles(user_id) ON DELETE CASCADE
 );
@@ -71,6 +72,7 @@ CREATE TABLE farm_context (
 CREATE INDEX idx_user_profiles_user_id ON user_profiles(user_id);
 CREATE INDEX idx_conversation_sessions_user_id ON conversation_sessions(user_id);
 CREATE INDEX idx_conversation_sessions_session_id ON conversation_sessions(session_id);
+CREATE INDEX idx_conversation_sessions_user_last_activity ON conversation_sessions(user_id, last_activity DESC);
 CREATE INDEX idx_conversation_messages_session_id ON conversation_messages(session_id);
 CREATE INDEX idx_conversation_messages_user_id ON conversation_messages(user_id);
 CREATE INDEX idx_conversation_messages_created_at ON conversation_messages(created_at);
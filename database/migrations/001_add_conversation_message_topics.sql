@@ -0,0 +1,6 @@
+-- Farming topics of each conversation message, written by the application
+-- (app.services.memory_intelligence.message_topics) when the message is stored.
+-- The column is nullable without a default, so adding it does not rewrite the table.
+-- Messages stored before this migration keep NULL topics and are left out of
+-- memory insights until they age out of the 30-day insight window.
+ALTER TABLE conversation_messages ADD COLUMN IF NOT EXISTS topics TEXT[];
@@ -0,0 +1,308 @@
+"""
+Tests for the agent service context builders.
+"""
+
+import asyncio
+import importlib
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.models.api_models import ChatRequest, ChatResponse
+from app.services.agent_service import AgentService, _WEATHER_RE, _is_low_information
+from app.services.memory_intelligence import to_memory_arrays
+from app.services.document_service import document_service
+from app.services.weather_service import WeatherData, WeatherForecast, weather_service
+
+
+def test_services_is_a_package():
+    """app.services resolves to the package, not the removed app/services.py module."""
+    services = importlib.import_module("app.services")
+    assert hasattr(services, "__path__")
+
+
+def test_agent_service_uses_shared_singletons():
+    """Collaborators are imported once at module level and shared by instances."""
+    agent_module = importlib.import_module("app.services.agent_service")
+    agent = AgentService()
+    assert agent.document_service is document_service
+    assert agent.weather_service is weather_service
+    assert agent_module.memory_service is importlib.import_module("app.services.memory").memory_service
+
+
+def test_build_memory_context_format():
+    """Memory context output is byte-identical to the original list-append builder."""
+    memories = [
+        {"content": "Mulch after the long rains", "similarity_score": 0.91},
+        {"content": "Low relevance", "similarity_score": 0.5},
+        {"content": "Prune after harvest", "similarity_score": 0.75},
+        {"content": "Beyond top three", "similarity_score": 0.99},
+    ]
+
+    assert AgentService()._build_memory_context(memories) == (
+        "Previous conversation context:\n"
+        "1. Mulch after the long rains (relevance: 0.91)\n"
+        "3. Prune after harvest (relevance: 0.75)"
+    )
+    assert AgentService()._build_memory_context([{"content": "x", "similarity_score": 0.2}]) == ""
+    assert AgentService()._build_memory_context([]) == ""
+
+
+@pytest.mark.asyncio
+async def test_search_relevant_documents_format():
+    """Document context output is byte-identical to the original list-append builder."""
+    agent = AgentService()
+    agent.document_service = SimpleNamespace(search_documents=AsyncMock(return_value=[
+        {"filename": "cbd.pdf", "content": "Spray copper fungicide", "similarity_score": 0.8},
+        {"filename": "old.pdf", "content": "Unrelated", "similarity_score": 0.1},
+        {"filename": "soil.txt", "content": "a" * 600, "similarity_score": 0.4},
+    ]))
+
+    context = await agent._search_relevant_documents("How do I control coffee berry disease?", "user-1")
+
+    assert context == (
+        "Relevant information from coffee farming documents:\n"
+        "1. From 'cbd.pdf': Spray copper fungicide...\n"
+        f"3. From 'soil.txt': {'a' * 500}..."
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_weather_context_format():
+    """Weather context output is byte-identical to the original list-append builder."""
+    agent = AgentService()
+    current = WeatherData(
+        temperature=21.44, humidity=72.4, precipitation=1.25, wind_speed=3.0,
+        condition="Slight rain", timestamp=datetime(2024, 4, 1)
+    )
+    forecast = [
+        WeatherForecast(
+            date=f"2024-04-0{day}", temperature_max=25.4, temperature_min=14.6,
+            precipitation=3.04, precipitation_probability=64.6, wind_speed=8.0, condition="Overcast"
+        )
+        for day in (2, 3, 4, 5)
+    ]
+    agent.weather_service = SimpleNamespace(
+        get_current_weather=AsyncMock(return_value=current),
+        get_forecast=AsyncMock(return_value=forecast)
+    )
+
+    context = await agent._get_weather_context(None, "Is the weather right for harvest?")
+
+    assert context == (
+        "Current weather conditions for your farming area:\n"
+        "• Temperature: 21.4°C\n"
+        "• Humidity: 72%\n"
+        "• Condition: Slight rain\n"
+        "• Current rainfall: 1.2mm\n"
+        "\n"
+        "Next 3 days outlook:\n"
+        "• 2024-04-02: 15-25°C, 3.0mm rain (65% chance)\n"
+        "• 2024-04-03: 15-25°C, 3.0mm rain (65% chance)\n"
+        "• 2024-04-04: 15-25°C, 3.0mm rain (65% chance)"
+    )
+
+
+@pytest.mark.parametrize("message", [
+    "Is it raining?",
+    "When to apply?",
+    "Watering schedule",
+    "Fungicides?",
+    "Aphids infestation",
+    "Leaf miners",
+    "coffee's price?",
+    "Mbolea gani?",
+    "Pruning now?",
+    "Fertiliser rates",
+    "Temperature tomorrow?",
+])
+def test_short_farming_questions_are_not_low_information(message):
+    """Short questions with farming terms still get a document search."""
+    assert not _is_low_information(message)
+
+
+@pytest.mark.parametrize("message", [
+    "Hi",
+    "Thanks!",
+    "Asante sana",
+    "ok cool",
+    "Good morning",
+    "See you sunday",
+    "Pickup at noon",
+])
+def test_small_talk_is_low_information(message):
+    """Greetings and acknowledgements skip the document search."""
+    assert _is_low_information(message)
+
+
+@pytest.mark.asyncio
+async def test_weather_context_is_not_gated_by_small_talk_filter():
+    """Short weather questions still reach the weather service."""
+    agent = AgentService()
+    agent.weather_service = SimpleNamespace(
+        get_current_weather=AsyncMock(return_value=None),
+        get_forecast=AsyncMock(return_value=[])
+    )
+
+    await agent._get_weather_context(None, "Rain?")
+
+    agent.weather_service.get_current_weather.assert_awaited_once()
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("Is it RAINING in Nyeri?", True),
+    ("When to harvest SL28?", True),
+    ("Best irrigation schedule", True),
+    ("What is the price of coffee?", False),
+    ("How do I prune?", False),
+])
+def test_weather_keyword_screen(message, expected):
+    """The compiled keyword pattern matches weather questions case-insensitively."""
+    assert bool(_WEATHER_RE.search(message)) is expected
+
+
+@pytest.mark.asyncio
+async def test_context_fetches_run_concurrently(monkeypatch):
+    """Document, weather, memory and history lookups overlap instead of running back to back."""
+    agent_module = importlib.import_module("app.services.agent_service")
+
+    async def slow(result):
+        await asyncio.sleep(0.1)
+        return result
+
+    agent = AgentService()
+    monkeypatch.setattr(agent, "_search_relevant_documents", lambda *args: slow("docs"))
+    monkeypatch.setattr(agent, "_get_weather_context", lambda *args: slow("weather"))
+    monkeypatch.setattr(
+        agent_module.memory_intelligence_service, "get_intelligent_memory_context",
+        lambda **kwargs: slow({"relevant_memories": [], "memory_insights": [], "context_summary": ""})
+    )
+    monkeypatch.setattr(agent_module.memory_service, "get_conversation_history", lambda **kwargs: slow([]))
+    agent.llm_client = SimpleNamespace(generate_response=AsyncMock(return_value={
+        "content": "Mulch now.", "model": "test-model", "tokens_used": 3
+    }))
+
+    started = asyncio.get_running_loop().time()
+    response = await agent.process_chat_message(
+        ChatRequest(message="When should I mulch?", user_id="u1", session_id="s1")
+    )
+    elapsed = asyncio.get_running_loop().time() - started
+
+    assert response.response == "Mulch now."
+    assert elapsed < 0.3
+    messages = agent.llm_client.generate_response.await_args.args[0]
+    assert "docs" in str(messages) and "weather" in str(messages)
+
+
+def test_semantic_response_cache():
+    """Near-duplicate questions hit the per-session cache; others, other sessions and expired entries miss."""
+    agent_module = importlib.import_module("app.services.agent_service")
+    agent = AgentService()
+    spray = [1.0, 0.0, 0.0, 0.0]
+    spray_again = [0.99, 0.05, 0.0, 0.0]
+    prune = [0.0, 1.0, 0.0, 0.0]
+    answer = ChatResponse(response="Spray after rain.", session_id="s1", model_used="m", tokens_used=42)
+
+    agent._store_cached_response(("u1", "s1"), spray, answer)
+
+    hit = agent._lookup_cached_response(("u1", "s1"), spray_again, "s1")
+    assert hit.response == "Spray after rain."
+    assert hit.session_id == "s1"
+    assert hit.tokens_used == 0
+    assert agent._lookup_cached_response(("u1", "s1"), prune, "s1") is None
+    assert agent._lookup_cached_response(("u1", "s2"), spray, "s2") is None
+    assert agent._lookup_cached_response(("u2", "s1"), spray, "s1") is None
+    assert agent._lookup_cached_response(("u1", "s1"), None, "s1") is None
+    assert agent._lookup_cached_response(None, spray, "s1") is None
+
+    agent._response_cache[("u1", "s1")].payloads[0]["created_at"] -= agent_module._RESPONSE_CACHE_TTL_SECONDS
+    assert agent._lookup_cached_response(("u1", "s1"), spray, "s1") is None
+
+
+@pytest.mark.parametrize("request_fields, key", [
+    ({"user_id": "u1", "session_id": "s1"}, ("u1", "s1")),
+    ({"session_id": "s1"}, None),
+    ({"user_id": "u1"}, None),
+    ({"user_id": "u1", "session_id": "s1", "context": {"farm_id": 1}}, None),
+])
+def test_only_session_requests_without_context_are_cached(request_fields, key):
+    """Anonymous, session-less and context-bearing requests bypass the semantic cache."""
+    request = ChatRequest(message="When should I spray?", **request_fields)
+
+    assert AgentService()._response_cache_key(request) == key
+
+
+def test_semantic_response_cache_is_bounded(monkeypatch):
+    """Each session's cache keeps at most the configured number of answers, oldest dropped first."""
+    agent_module = importlib.import_module("app.services.agent_service")
+    monkeypatch.setattr(agent_module, "_RESPONSE_CACHE_ENTRIES_PER_SESSION", 3)
+    agent = AgentService()
+
+    for i in range(5):
+        embedding = [0.0] * 5
+        embedding[i] = 1.0
+        agent._store_cached_response(
+            ("u1", "s"), embedding, ChatResponse(response=str(i), session_id="s", model_used="m")
+        )
+
+    assert [p["response"] for p in agent._response_cache[("u1", "s")].payloads] == ["2", "3", "4"]
+
+
+def test_build_intelligent_memory_context_format():
+    """Intelligent memory context keeps its original numbering and relevance labels."""
+    memories = [
+        {"content": "Rust on SL28 leaves", "enhanced_relevance": 0.85, "memory_type": "problem_solving"},
+        {"content": "Weak match", "enhanced_relevance": 0.6},
+        {"content": "Top dress with CAN", "enhanced_relevance": 0.7, "memory_type": "advice"},
+        {"content": "Outside top three", "enhanced_relevance": 0.99},
+    ]
+    insights = [SimpleNamespace(topic="pests", summary="Asks about rust often")]
+
+    assert AgentService()._build_intelligent_memory_context(memories, insights, "Farmer in Nyeri") == (
+        "Context: Farmer in Nyeri\n"
+        "Recent relevant conversations:\n"
+        "1. [Problem_Solving] Rust on SL28 leaves (relevance: High)\n"
+        "3. [Advice] Top dress with CAN (relevance: Medium)\n"
+        "Key farming insights from your history:\n"
+        "• pests: Asks about rust often"
+    )
+
+
+def test_build_intelligent_memory_context_accepts_arrays():
+    """The structure-of-arrays layout renders exactly like the list of dicts."""
+    memories = [
+        {"content": "Rust on SL28 leaves", "enhanced_relevance": 0.85, "memory_type": "problem_solving"},
+        {"content": "", "enhanced_relevance": 0.9},
+        {"content": "Top dress with CAN", "enhanced_relevance": 0.7, "memory_type": "advice"},
+    ]
+    agent = AgentService()
+
+    from_list = agent._build_intelligent_memory_context(memories, [], "")
+    from_arrays = agent._build_intelligent_memory_context(to_memory_arrays(memories), [], "")
+
+    assert from_arrays == from_list
+    assert agent._build_intelligent_memory_context(to_memory_arrays([]), [], "Summary") == ""
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_message_yields_chunks_and_caches(monkeypatch):
+    """Streamed chunks arrive in order and the joined reply is cached for repeats."""
+    agent = AgentService()
+
+    async def generate_response_stream(messages):
+        for chunk in ("Spray ", "copper."):
+            yield chunk
+
+    monkeypatch.setattr(agent, "_embed_for_cache", AsyncMock(return_value=[1.0, 0.0, 0.0]))
+    monkeypatch.setattr(agent, "_build_chat_messages", AsyncMock(return_value=[]))
+    agent.llm_client = SimpleNamespace(model="test-model", generate_response_stream=generate_response_stream)
+    request = ChatRequest(message="How do I treat CBD?", user_id="u1", session_id="s1")
+
+    chunks = [chunk async for chunk in agent.stream_chat_message(request)]
+    repeat = [chunk async for chunk in agent.stream_chat_message(request)]
+
+    assert chunks == ["Spray ", "copper."]
+    assert repeat == ["Spray copper."]
+    agent._build_chat_messages.assert_awaited_once()
@@ -2,6 +2,9 @@
 Tests for the API endpoints.
 """
 
+import importlib
+import logging
+
 import pytest
 from fastapi.testclient import TestClient
 from app.api import app
@@ -64,4 +67,66 @@ async def test_chat_endpoint_success():
     })
     
     # Should either succeed or fail gracefully
-    assert response.status_code in [200, 500]
\ No newline at end of file
+    assert response.status_code in [200, 500]
+
+
+def test_agent_log_level_is_scoped():
+    """AGENT_LOG_LEVEL only changes the agent service logger, not the root level."""
+    from app.config import settings
+
+    agent_logger = logging.getLogger("app.services.agent_service")
+    assert agent_logger.level == getattr(logging, settings.agent_log_level.upper())
+    assert logging.getLogger("app.api").level == logging.NOTSET
+
+
+def test_chat_stream_endpoint_streams_and_stores(monkeypatch):
+    """The streaming endpoint sends chunks in order and stores the joined reply afterwards."""
+    api_module = importlib.import_module("app.api")
+    stored = []
+
+    async def enhance(request, session_id=None):
+        return request.model_copy(update={"session_id": session_id})
+
+    async def stream(request):
+        for chunk in ("Mulch ", "after ", "rain."):
+            yield chunk
+
+    async def store(user_id, user_message, response):
+        stored.append((user_id, user_message, response.response, response.session_id))
+
+    monkeypatch.setattr(api_module, "_enhance_chat_request", enhance)
+    monkeypatch.setattr(api_module.agent_service, "stream_chat_message", stream)
+    monkeypatch.setattr(api_module, "_store_chat_exchange", store)
+
+    response = client.post("/chat/stream", json={"message": "When to mulch?", "user_id": "u1"})
+
+    assert response.status_code == 200
+    assert response.text == "Mulch after rain."
+    session_id = response.headers["X-Session-ID"]
+    assert stored == [("u1", "When to mulch?", "Mulch after rain.", session_id)]
+
+
+def test_chat_stream_endpoint_marks_interrupted_streams(monkeypatch):
+    """A mid-stream failure ends the body with the error sentinel and stores nothing."""
+    api_module = importlib.import_module("app.api")
+    stored = []
+
+    async def enhance(request, session_id=None):
+        return request.model_copy(update={"session_id": session_id})
+
+    async def stream(request):
+        yield "Mulch "
+        raise RuntimeError("upstream closed")
+
+    async def store(user_id, user_message, response):
+        stored.append(response)
+
+    monkeypatch.setattr(api_module, "_enhance_chat_request", enhance)
+    monkeypatch.setattr(api_module.agent_service, "stream_chat_message", stream)
+    monkeypatch.setattr(api_module, "_store_chat_exchange", store)
+
+    response = client.post("/chat/stream", json={"message": "When to mulch?", "user_id": "u1"})
+
+    assert response.status_code == 200
+    assert response.text == "Mulch " + api_module.STREAM_ERROR_SENTINEL
+    assert stored == []
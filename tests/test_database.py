@@ -0,0 +1,70 @@
+"""
+Tests for the shared database connection manager.
+"""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from qdrant_client.models import Distance, ScalarType
+
+from app import database as database_module
+from app.database import DatabaseManager
+
+
+@pytest.mark.asyncio
+async def test_qdrant_clients_prefer_grpc(monkeypatch):
+    """Both Qdrant clients are built once with the gRPC transport and port."""
+    created = []
+
+    def fake_client(kind):
+        def build(**kwargs):
+            created.append((kind, kwargs))
+            return object()
+        return build
+
+    monkeypatch.setattr(database_module, "QdrantClient", fake_client("sync"))
+    monkeypatch.setattr(database_module, "AsyncQdrantClient", fake_client("async"))
+    manager = DatabaseManager()
+    monkeypatch.setattr(manager, "_create_qdrant_collections", AsyncMock())
+
+    await manager._init_qdrant()
+
+    assert [kind for kind, _ in created] == ["sync", "async"]
+    for _, kwargs in created:
+        assert kwargs["prefer_grpc"] is True
+        assert kwargs["grpc_port"] == database_module.settings.qdrant_grpc_port == 6334
+        assert kwargs["timeout"] == 30
+
+
+@pytest.mark.asyncio
+async def test_memory_collections_use_int8_quantization():
+    """New memory collections are quantized; existing unquantized ones are upgraded."""
+    existing = []
+    created, updated, indexed = [], [], []
+    manager = DatabaseManager()
+    manager.qdrant_client = SimpleNamespace(
+        get_collections=lambda: SimpleNamespace(collections=[SimpleNamespace(name=n) for n in existing]),
+        get_collection=lambda name: SimpleNamespace(config=SimpleNamespace(quantization_config=None)),
+        create_collection=lambda **kwargs: created.append(kwargs),
+        update_collection=lambda **kwargs: updated.append(kwargs),
+        create_payload_index=lambda **kwargs: indexed.append((kwargs["collection_name"], kwargs["field_name"])),
+    )
+
+    await manager._create_qdrant_collections()
+    existing.extend(kwargs["collection_name"] for kwargs in created)
+    await manager._create_qdrant_collections()
+
+    assert [kwargs["collection_name"] for kwargs in created] == [
+        "conversation_embeddings", "user_context_embeddings"
+    ]
+    assert all(kwargs["quantization_config"].scalar.type == ScalarType.INT8 for kwargs in created)
+    assert all(kwargs["vectors_config"].distance == Distance.DOT for kwargs in created)
+    assert [kwargs["collection_name"] for kwargs in updated] == [
+        "conversation_embeddings", "user_context_embeddings"
+    ]
+    assert set(indexed) == {
+        ("conversation_embeddings", "user_id"),
+        ("user_context_embeddings", "user_id"),
+        ("user_context_embeddings", "context_type"),
+    }
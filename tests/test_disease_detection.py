@@ -0,0 +1,256 @@
+"""
+Tests for batched disease detection inference.
+"""
+
+import asyncio
+import io
+
+import numpy as np
+import pytest
+import torch
+import torch.nn as nn
+from PIL import Image
+
+from app.services.disease_detection import DiseaseDetectionService
+
+
+class CountingModel(nn.Module):
+    """Tiny stand-in classifier that records the batch size of each forward pass."""
+
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+        self.head = nn.Sequential(nn.AdaptiveAvgPool2d(1), nn.Flatten(), nn.Linear(3, 5))
+        self.batch_sizes = []
+
+    def forward(self, x):
+        self.batch_sizes.append(x.shape[0])
+        return self.head(x)
+
+
+def _image_bytes(seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    image = Image.fromarray(rng.integers(0, 255, size=(64, 64, 3), dtype=np.uint8))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def service():
+    service = DiseaseDetectionService()
+    service.model = CountingModel().eval()
+    return service
+
+
+def test_batch_matches_single_predictions(service):
+    """One batched forward pass gives the same results as per-image calls."""
+    images = [_image_bytes(seed) for seed in range(4)]
+
+    singles = [service.predict_disease(image) for image in images]
+    service.model.batch_sizes.clear()
+    batched = service.predict_disease_batch(images)
+
+    assert service.model.batch_sizes == [4]
+    for single, batch in zip(singles, batched):
+        assert single["predicted_class"] == batch["predicted_class"]
+        assert single["probabilities"] == pytest.approx(batch["probabilities"], abs=1e-5)
+
+
+def test_batch_reports_preprocessing_failures_in_place(service):
+    """Unreadable images fail individually without dropping the rest of the batch."""
+    results = service.predict_disease_batch([_image_bytes(1), b"not an image", _image_bytes(2)])
+
+    assert [result["success"] for result in results] == [True, False, True]
+    assert results[1]["error"] == "Failed to preprocess image"
+    assert service.model.batch_sizes == [2]
+
+
+def test_batch_fallback_when_model_unavailable():
+    """Every image gets the fallback response when no model is loaded."""
+    service = DiseaseDetectionService()
+    service.model = None
+
+    results = service.predict_disease_batch([_image_bytes(1), _image_bytes(2)])
+
+    assert [result["predicted_class"] for result in results] == ["Model_Unavailable"] * 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_async_predictions_are_coalesced(service):
+    """Concurrent async calls share forward passes and keep their own results."""
+    service.max_batch_wait = 0.05
+    images = [_image_bytes(seed) for seed in range(6)]
+    expected = service.predict_disease_batch(images)
+    service.model.batch_sizes.clear()
+
+    results = await asyncio.gather(*(service.predict_disease_async(image) for image in images))
+
+    assert sum(service.model.batch_sizes) == 6
+    assert len(service.model.batch_sizes) < 6
+    assert [r["predicted_class"] for r in results] == [e["predicted_class"] for e in expected]
+    service._batch_worker.cancel()
+
+
+@pytest.mark.asyncio
+async def test_async_prediction_decodes_off_the_event_loop(service, monkeypatch):
+    """Image decoding runs in a worker thread and bad uploads never reach the batch."""
+    import threading
+
+    decode_threads = []
+    preprocess = service.preprocess_image
+
+    def recording_preprocess(image_data):
+        decode_threads.append(threading.get_ident())
+        return preprocess(image_data)
+
+    monkeypatch.setattr(service, "preprocess_image", recording_preprocess)
+
+    good, bad = await asyncio.gather(
+        service.predict_disease_async(_image_bytes(1)),
+        service.predict_disease_async(b"not an image"),
+    )
+
+    assert good["success"] and not bad["success"]
+    assert bad["error"] == "Failed to preprocess image"
+    assert threading.get_ident() not in decode_threads
+    assert service.model.batch_sizes == [1]
+    service._batch_worker.cancel()
+
+
+def test_prediction_runs_in_inference_mode(service):
+    """Forward passes run without autograd tracking, including from worker threads."""
+    modes = []
+    forward = service.model.forward
+    service.model.forward = lambda x: modes.append(torch.is_inference_mode_enabled()) or forward(x)
+
+    service.predict_disease(_image_bytes(1))
+
+    assert modes == [True]
+    assert not torch.is_inference_mode_enabled()
+
+
+def test_warm_up_runs_dummy_forward_passes(service):
+    """Warm-up runs the configured number of single-image passes and skips missing models."""
+    from app.services.disease_detection import DiseaseDetectionConfig
+
+    service._warm_up()
+    assert service.model.batch_sizes == [1] * DiseaseDetectionConfig.WARMUP_ITERATIONS
+
+    service.model = None
+    service._warm_up()
+
+
+def test_load_state_dict_memory_maps_checkpoint(tmp_path):
+    """Zipfile checkpoints are memory-mapped and legacy ones still load."""
+    model = nn.Linear(4, 5)
+    path = tmp_path / "weights.pth"
+    legacy_path = tmp_path / "legacy.pth"
+    torch.save(model.state_dict(), path)
+    torch.save(model.state_dict(), legacy_path, _use_new_zipfile_serialization=False)
+
+    for checkpoint in (path, legacy_path):
+        state = DiseaseDetectionService._load_state_dict(str(checkpoint))
+        restored = nn.Linear(4, 5)
+        restored.load_state_dict(state, assign=True)
+        assert torch.equal(restored.weight, model.weight)
+
+
+def test_optimized_model_matches_eager(service):
+    """The traced channels_last model gives the same predictions as the eager one."""
+    images = [_image_bytes(seed) for seed in range(3)]
+    service.model = nn.Sequential(
+        nn.Conv2d(3, 4, 3), nn.ReLU(), nn.AdaptiveAvgPool2d(1), nn.Flatten(), nn.Linear(4, 5)
+    ).eval()
+    eager = service.predict_disease_batch(images)
+    service._optimize_model()
+
+    assert isinstance(service.model, torch.jit.ScriptModule)
+    optimized = service.predict_disease_batch(images)
+    for before, after in zip(eager, optimized):
+        assert before["probabilities"] == pytest.approx(after["probabilities"], abs=1e-4)
+
+
+def test_preprocess_input_types_agree(service, tmp_path):
+    """Bytes, file path, PIL and BGR ndarray inputs produce the same tensor."""
+    data = _image_bytes(3)
+    path = tmp_path / "leaf.png"
+    path.write_bytes(data)
+    rgb = np.asarray(Image.open(io.BytesIO(data)).convert("RGB"))
+
+    expected = service.preprocess_image(data)
+    for image_data in (str(path), Image.fromarray(rgb), rgb[..., ::-1].copy()):
+        assert torch.equal(service.preprocess_image(image_data), expected)
+
+    assert service.preprocess_image(str(tmp_path / "missing.png")) is None
+
+
+def test_transform_resizes_and_normalizes(service):
+    """A flat colour image becomes a 128x128 tensor normalised per channel."""
+    image = np.full((300, 200, 3), (255, 128, 0), dtype=np.uint8)
+
+    tensor = service.transforms(image)
+
+    assert tensor.shape == (3, 128, 128)
+    expected = (torch.tensor([255, 128, 0]) / 255.0 - torch.tensor([0.485, 0.456, 0.406])) / torch.tensor([0.229, 0.224, 0.225])
+    assert torch.allclose(tensor[:, 64, 64], expected, atol=1e-5)
+
+
+def test_quantized_model_predicts(service):
+    """INT8 quantization and tracing keep predictions close to the fp32 model."""
+    images = [_image_bytes(seed) for seed in range(3)]
+    service.model = nn.Sequential(
+        nn.Conv2d(3, 8, 3), nn.ReLU(), nn.AdaptiveAvgPool2d(1), nn.Flatten(), nn.Linear(8, 5)
+    ).eval()
+    fp32 = service.predict_disease_batch(images)
+
+    assert service._quantize_model()
+    service._optimize_model()
+    int8 = service.predict_disease_batch(images)
+
+    assert all(result["success"] for result in int8)
+    for before, after in zip(fp32, int8):
+        assert before["probabilities"] == pytest.approx(after["probabilities"], abs=0.05)
+
+
+def test_build_prediction_from_probabilities(service):
+    """Class names, confidence and probability map come from one NumPy row."""
+    result = service._build_prediction(np.array([0.05, 0.1, 0.7, 0.1, 0.05], dtype=np.float32))
+
+    assert result["predicted_class"] == "Rust"
+    assert result["confidence"] == pytest.approx(0.7)
+    assert list(result["probabilities"]) == ["Healthy", "Miner", "Rust", "Phoma", "Cercospora"]
+    assert all(isinstance(value, float) for value in result["probabilities"].values())
+
+
+def test_recommendations_lookup(service):
+    """Recommendations come from the table, with the low-confidence hint first, and are fresh lists."""
+    confident = service._get_recommendations("Rust", 0.9)
+    unsure = service._get_recommendations("Rust", 0.4)
+
+    assert confident[0].startswith("Coffee Leaf Rust detected")
+    assert unsure[0].startswith("Low confidence prediction")
+    assert unsure[1:] == confident
+    assert service._get_recommendations("Unknown", 0.9) == []
+
+    confident.append("mutated")
+    assert "mutated" not in service._get_recommendations("Rust", 0.9)
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="CUDA graphs need a GPU")
+def test_cuda_graph_replay_matches_eager():
+    """Replaying a captured graph, including a padded partial batch, matches eager inference."""
+    service = DiseaseDetectionService(max_batch_size=4)
+    service.model = nn.Sequential(
+        nn.Conv2d(3, 8, 3), nn.ReLU(), nn.AdaptiveAvgPool2d(1), nn.Flatten(), nn.Linear(8, 5)
+    ).to(service.device).eval()
+    images = [_image_bytes(seed) for seed in range(3)]
+    service.model = service.model.to(dtype=service.input_dtype, memory_format=torch.channels_last)
+    eager = service.predict_disease_batch(images)
+
+    service._capture_cuda_graphs()
+    replayed = service.predict_disease_batch(images)
+
+    assert sorted(service._cuda_graphs) == [1, 4]
+    for before, after in zip(eager, replayed):
+        assert before["probabilities"] == pytest.approx(after["probabilities"], abs=1e-3)
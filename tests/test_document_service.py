@@ -0,0 +1,481 @@
+"""
+Tests for document text extraction.
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from docx import Document as DocxDocument
+from qdrant_client.models import Distance, ScalarType
+
+from app.services import document_service as document_service_module
+from app.services.document_service import (
+    DocumentProcessor, DocumentService, _extract_page_range, decode_document_cursor, encode_document_cursor
+)
+
+
+def _pdf_bytes(pages):
+    """Build a minimal PDF with one line of Helvetica text per page."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(output)
+
+
+def test_extract_page_range_returns_indexed_text():
+    """Workers report each requested page with its index."""
+    pdf = _pdf_bytes(["Alpha", "Bravo", "Charlie"])
+
+    assert _extract_page_range(pdf, [2, 0]) == [(2, "Charlie"), (0, "Alpha")]
+
+
+@pytest.mark.asyncio
+async def test_process_pdf_file_keeps_page_order():
+    """Pages extracted in parallel worker processes are joined in document order."""
+    processor = DocumentProcessor()
+    processor.pdf_workers = 3
+    pages = [f"Page {i}" for i in range(7)]
+
+    chunks = await processor._process_pdf_file(_pdf_bytes(pages))
+
+    assert chunks == ["\n\n".join(pages)]
+
+
+@pytest.mark.asyncio
+async def test_process_file_reads_saved_pdf_and_text_from_disk(tmp_path):
+    """Saved files are parsed from their path, so workers never receive the bytes."""
+    pdf_path = tmp_path / "guide.pdf"
+    pdf_path.write_bytes(_pdf_bytes(["Alpha", "Bravo"]))
+    text_path = tmp_path / "notes.txt"
+    text_path.write_bytes("Weed before the rains.".encode("utf-8"))
+    empty_path = tmp_path / "empty.txt"
+    empty_path.write_bytes(b"")
+    processor = DocumentProcessor()
+
+    assert await processor.process_file(pdf_path, "guide.pdf", "application/pdf") == ["Alpha\n\nBravo"]
+    assert await processor.process_file(text_path, "notes.txt", "text/plain") == ["Weed before the rains."]
+    assert await processor.process_file(empty_path, "empty.txt", "text/plain") == []
+
+
+def test_empty_pages_fall_back_to_pdfplumber(monkeypatch):
+    """Pages without a PyMuPDF text layer are retried with pdfplumber."""
+    opened = []
+
+    class FakePlumberPdf:
+        pages = [SimpleNamespace(extract_text=lambda: "Recovered")] * 2
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            return False
+
+    def fake_open(stream):
+        opened.append(stream)
+        return FakePlumberPdf()
+
+    monkeypatch.setattr(document_service_module.pdfplumber, "open", fake_open)
+
+    assert _extract_page_range(_pdf_bytes(["Alpha", " "]), [0, 1]) == [(0, "Alpha"), (1, "Recovered")]
+    assert len(opened) == 1
+    assert _extract_page_range(_pdf_bytes(["Alpha"]), [0]) == [(0, "Alpha")]
+    assert len(opened) == 1
+
+
+@pytest.mark.asyncio
+async def test_upload_hashes_and_saves_file(tmp_path, monkeypatch):
+    """Uploads are hashed block by block in a worker thread as the file is written to disk."""
+    service = DocumentService()
+    service.upload_dir = tmp_path
+    content = b"Mulch coffee after the long rains. " * 100
+    stored = {}
+
+    async def store_metadata(**kwargs):
+        stored.update(kwargs)
+
+    monkeypatch.setattr(service, "_store_document_metadata", store_metadata)
+    monkeypatch.setattr(service, "_store_document_chunks", AsyncMock())
+    monkeypatch.setattr(service, "_find_duplicate_document", AsyncMock(return_value=None))
+    monkeypatch.setattr(document_service_module, "_UPLOAD_WRITE_BLOCK_SIZE", 1000)
+    process_file = service.processor.process_file
+    sources = []
+
+    async def record_process_file(source, filename, file_type):
+        sources.append(source)
+        return await process_file(source, filename, file_type)
+
+    monkeypatch.setattr(service.processor, "process_file", record_process_file)
+
+    document_id = await service.upload_document(content, "mulch.txt", "u1")
+
+    saved = tmp_path / f"{document_id}_mulch.txt"
+    assert stored["file_hash"] == hashlib.sha256(content).hexdigest()
+    assert stored["file_size"] == len(content)
+    assert stored["text_chunks"][0].startswith("Mulch coffee after the long rains.")
+    assert saved.read_bytes() == content
+    assert sources == [saved]
+
+
+@pytest.mark.asyncio
+async def test_duplicate_upload_returns_existing_document(tmp_path, monkeypatch):
+    """Re-uploading identical content skips parsing and embedding and discards the saved copy."""
+    service = DocumentService()
+    service.upload_dir = tmp_path
+    content = b"Prune after harvest."
+    find_duplicate = AsyncMock(return_value="existing-id")
+    monkeypatch.setattr(service, "_find_duplicate_document", find_duplicate)
+    monkeypatch.setattr(service.processor, "process_file", AsyncMock())
+
+    assert await service.upload_document(content, "prune.txt", "u1") == "existing-id"
+
+    find_duplicate.assert_awaited_once_with(hashlib.sha256(content).hexdigest(), "u1")
+    service.processor.process_file.assert_not_awaited()
+    assert list(tmp_path.iterdir()) == []
+
+
+def _fake_session(executed, driver_connection):
+    """Session stand-in that records statements and exposes a raw driver connection."""
+    raw_connection = SimpleNamespace(driver_connection=driver_connection)
+    connection = SimpleNamespace(get_raw_connection=AsyncMock(return_value=raw_connection))
+
+    class FakeSession:
+        commits = 0
+
+        async def execute(self, statement, params=None):
+            executed.append((str(statement), params))
+
+        async def connection(self):
+            return connection
+
+        async def commit(self):
+            FakeSession.commits += 1
+
+    return FakeSession()
+
+
+@pytest.mark.asyncio
+async def test_metadata_and_chunks_share_one_transaction(monkeypatch):
+    """Metadata and chunk text are written in one transaction, chunks via COPY on asyncpg."""
+    executed = []
+    driver_connection = SimpleNamespace(copy_records_to_table=AsyncMock())
+    fake_session = _fake_session(executed, driver_connection)
+
+    @asynccontextmanager
+    async def session():
+        yield fake_session
+
+    monkeypatch.setattr(document_service_module.db_manager, "get_postgres_session", session)
+    service = DocumentService()
+
+    await service._store_document_metadata(
+        document_id="d1", filename="a.txt", file_path="/tmp/a.txt", file_hash="h", file_size=1,
+        file_type="text/plain", user_id="u1", description=None, tags=None, text_chunks=["one", "two"]
+    )
+
+    assert executed[0][0].startswith("INSERT INTO documents") and executed[0][1]["chunk_count"] == 2
+    assert len(executed) == 1 and fake_session.commits == 1
+    driver_connection.copy_records_to_table.assert_awaited_once_with(
+        "document_chunks",
+        records=[("d1_chunk_0", "d1", 0, "one"), ("d1_chunk_1", "d1", 1, "two")],
+        columns=["chunk_id", "document_id", "chunk_index", "content"]
+    )
+
+    executed.clear()
+    await service._insert_chunk_texts(_fake_session(executed, object()), "d1", ["one"])
+    assert executed == [("INSERT INTO document_chunks (chunk_id, document_id, chunk_index, content) "
+                         "VALUES (:chunk_id, :document_id, :chunk_index, :content)",
+                         [{"chunk_id": "d1_chunk_0", "document_id": "d1", "chunk_index": 0, "content": "one"}])]
+
+
+@pytest.mark.asyncio
+async def test_documents_table_ddl_runs_at_startup():
+    """The tables and indexes are created once from initialize, not per upload."""
+    executed = []
+    service = DocumentService()
+
+    await service._ensure_documents_table(_fake_session(executed, None))
+
+    assert "CREATE TABLE IF NOT EXISTS documents" in executed[0][0]
+    assert "idx_documents_hash_user" in executed[1][0]
+    assert any("CREATE TABLE IF NOT EXISTS document_chunks" in sql for sql, _ in executed)
+
+
+@pytest.mark.asyncio
+async def test_chunk_upserts_overlap_embedding(monkeypatch):
+    """Each batch is upserted, and applied, while the next batch is embedded."""
+    monkeypatch.setattr(document_service_module, "_CHUNK_BATCH_SIZE", 4)
+    events = []
+
+    point_ids = []
+
+    async def upsert(**kwargs):
+        point_ids.extend(point.id for point in kwargs["points"])
+        events.append(("upsert start", len(kwargs["points"]), kwargs["wait"]))
+        await asyncio.sleep(0.05)
+        events.append(("upsert end",))
+
+    def embed(texts):
+        events.append(("embed", len(texts)))
+        return [[1.0, 0.0, 0.0]] * len(texts)
+
+    monkeypatch.setattr(
+        document_service_module.db_manager, "get_async_qdrant_client", lambda: SimpleNamespace(upsert=upsert)
+    )
+    monkeypatch.setattr(
+        document_service_module.vector_memory_service.embedding_service, "create_batch_embeddings", embed
+    )
+    service = DocumentService()
+
+    await service._store_document_chunks("d1", [f"chunk {i}" for i in range(10)], "a.txt", "u1", "text/plain")
+
+    second_embed = [i for i, e in enumerate(events) if e[0] == "embed"][1]
+    assert second_embed < events.index(("upsert end",))
+    assert [e for e in events if e[0] == "upsert start"] == [
+        ("upsert start", 4, True), ("upsert start", 4, True), ("upsert start", 2, True)
+    ]
+    assert len(set(point_ids)) == 10 and all(len(point_id) == 32 for point_id in point_ids)
+
+
+@pytest.mark.asyncio
+async def test_search_joins_chunk_text_from_postgres(monkeypatch):
+    """Qdrant payloads hold only ids and filters; search fills in text and document fields."""
+    stored = []
+    query_points = AsyncMock(side_effect=lambda **kwargs: SimpleNamespace(
+        points=[SimpleNamespace(payload=point.payload, score=0.9) for point in stored]
+    ))
+    monkeypatch.setattr(document_service_module.db_manager, "get_async_qdrant_client", lambda: SimpleNamespace(
+        upsert=AsyncMock(side_effect=lambda **kwargs: stored.extend(kwargs["points"])),
+        query_points=query_points
+    ))
+    service = DocumentService()
+    service._embedder = SimpleNamespace(
+        create_batch_embeddings_async=AsyncMock(side_effect=lambda texts: [[1.0, 0.0, 0.0]] * len(texts)),
+        create_embedding=AsyncMock(return_value=[1.0, 0.0, 0.0])
+    )
+    fetch = AsyncMock(return_value={"d1_chunk_0": SimpleNamespace(
+        content="x" * 800, filename="a.txt", file_type="text/plain", upload_date=datetime(2024, 8, 9)
+    )})
+    monkeypatch.setattr(service, "_fetch_chunk_details", fetch)
+
+    await service._store_document_chunks("d1", ["x" * 800], "a.txt", "u1", "text/plain")
+    results = await service.search_documents("mulch", user_id="u1", tags=["coffee"])
+
+    assert set(stored[0].payload) == {"document_id", "chunk_id", "chunk_index", "user_id", "tags"}
+    kwargs = query_points.await_args.kwargs
+    assert [(c.key, getattr(c.match, "value", None) or c.match.any) for c in kwargs["query_filter"].must] == [
+        ("user_id", "u1"), ("tags", ["coffee"])
+    ]
+    assert kwargs["score_threshold"] == 0.3 and kwargs["search_params"] is document_service_module.QDRANT_SEARCH_PARAMS
+    fetch.assert_awaited_once_with(["d1_chunk_0"])
+    assert results[0]["content"] == "x" * 500
+    assert results[0]["filename"] == "a.txt"
+    assert results[0]["metadata"]["full_content"] == "x" * 800
+    assert results[0]["metadata"]["upload_date"] == "2024-08-09T00:00:00"
+
+
+@pytest.mark.asyncio
+async def test_document_collection_uses_scalar_quantization(monkeypatch):
+    """Collections are quantized and get payload indexes, including pre-existing ones."""
+    calls = {}
+    existing = []
+    qdrant = SimpleNamespace(
+        get_collections=lambda: SimpleNamespace(collections=[SimpleNamespace(name=n) for n in existing]),
+        get_collection=lambda name: SimpleNamespace(config=SimpleNamespace(quantization_config=None)),
+        create_collection=lambda **kwargs: calls.setdefault("create", kwargs),
+        update_collection=lambda **kwargs: calls.setdefault("update", kwargs),
+        create_payload_index=lambda **kwargs: calls.setdefault("indexes", []).append(kwargs["field_name"]),
+    )
+    monkeypatch.setattr(document_service_module.db_manager, "get_qdrant_client", lambda: qdrant)
+    service = DocumentService()
+
+    await service._create_document_collection()
+    assert calls["create"]["quantization_config"].scalar.type == ScalarType.INT8
+    assert calls["create"]["vectors_config"].size == 384
+    assert calls["create"]["vectors_config"].distance == Distance.DOT
+
+    assert calls["indexes"] == ["user_id", "document_id", "tags", "chunk_index"]
+
+    existing.append(service.document_collection)
+    await service._create_document_collection()
+    assert calls["update"]["quantization_config"].scalar.type == ScalarType.INT8
+    assert len(calls["indexes"]) == 8
+
+
+@pytest.mark.asyncio
+async def test_blocking_qdrant_calls_run_off_the_event_loop(monkeypatch):
+    """Sync Qdrant calls run on the thread pool, at most the configured number at a time."""
+    monkeypatch.setattr(document_service_module, "_QDRANT_CONCURRENCY", 2)
+    service = DocumentService()
+    loop_thread = threading.get_ident()
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0, "threads": set()}
+
+    def blocking_call(**kwargs):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            state["threads"].add(threading.get_ident())
+        time.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+        return kwargs["n"]
+
+    results = await asyncio.gather(*(service._run_qdrant(blocking_call, n=n) for n in range(6)))
+
+    assert results == list(range(6))
+    assert state["peak"] == 2
+    assert loop_thread not in state["threads"]
+
+
+def test_chunk_text_packs_whole_sentences_with_overlap():
+    """Chunks hold whole sentences, stay within the size limit and overlap their neighbours."""
+    processor = DocumentProcessor()
+    sentences = [f"Sentence {i} mentions {i * 2.5} kg of CAN per tree." for i in range(60)]
+    text = " ".join(sentences)
+
+    chunks = processor._chunk_text(text, max_chunk_size=300, overlap=100)
+
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    assert all(chunk.startswith("Sentence") and chunk.endswith("tree.") for chunk in chunks)
+    assert chunks[0].startswith(sentences[0]) and chunks[-1].endswith(sentences[-1])
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.split(" per tree. ")[0] + " per tree." in previous
+    assert {sentence for chunk in chunks for sentence in sentences if sentence in chunk} == set(sentences)
+
+
+def test_chunk_text_edge_cases():
+    """Blank text, unterminated text and oversized sentences are handled."""
+    processor = DocumentProcessor()
+
+    assert processor._chunk_text("   ") == []
+    assert processor._chunk_text("no terminator here") == ["no terminator here"]
+    long_sentence = "x" * 50 + "."
+    assert processor._chunk_text(f"Short. {long_sentence} Tail.", max_chunk_size=20, overlap=10) == [
+        "Short.", long_sentence, "Tail."
+    ]
+
+
+def test_chunk_text_scales_linearly():
+    """Chunking a multi-megabyte document stays fast (guards against quadratic concatenation)."""
+    processor = DocumentProcessor()
+    text = "Coffee berry disease spreads in wet weather. " * 100_000
+
+    started = time.perf_counter()
+    chunks = processor._chunk_text(text)
+    elapsed = time.perf_counter() - started
+
+    assert len(chunks) > 4000
+    assert elapsed < 2.0
+
+
+@pytest.mark.asyncio
+async def test_search_uses_cached_embedder(monkeypatch):
+    """Queries go through the embedder handle cached on the service."""
+    service = DocumentService()
+    assert service._embedder is document_service_module.vector_memory_service.embedding_service
+
+    service._embedder = SimpleNamespace(create_embedding=AsyncMock(return_value=[0.0, 1.0, 0.0]))
+    service._fetch_chunk_details = AsyncMock(return_value={})
+    # Points stored before chunk text moved to PostgreSQL carry it in the payload
+    monkeypatch.setattr(document_service_module.db_manager, "get_async_qdrant_client", lambda: SimpleNamespace(
+        query_points=AsyncMock(return_value=SimpleNamespace(
+            points=[SimpleNamespace(payload={"full_content": "Prune", "user_id": "u1"}, score=0.9)]
+        ))
+    ))
+
+    results = await service.search_documents("prune", user_id="u1")
+
+    assert [r["content"] for r in results] == ["Prune"]
+
+
+def test_document_cursor_round_trip():
+    """Page cursors encode the keyset of the last document and reject garbage."""
+    cursor = encode_document_cursor({"upload_date": "2024-08-09T09:30:00.123456", "document_id": "doc-1"})
+
+    assert decode_document_cursor(cursor) == (datetime(2024, 8, 9, 9, 30, 0, 123456), "doc-1")
+    with pytest.raises(ValueError):
+        decode_document_cursor("not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_list_documents_uses_keyset_after_cursor(monkeypatch):
+    """A cursor replaces OFFSET with a row comparison on (upload_date, document_id)."""
+    executed = []
+
+    class FakeSession:
+        async def execute(self, statement, params=None):
+            executed.append((str(statement), params))
+            return SimpleNamespace(fetchall=lambda: [])
+
+    @asynccontextmanager
+    async def session():
+        yield FakeSession()
+
+    monkeypatch.setattr(document_service_module.db_manager, "get_postgres_session", session)
+    service = DocumentService()
+    after = (datetime(2024, 8, 9), "doc-1")
+
+    await service.list_documents(user_id="u1", limit=5, after=after)
+    await service.list_documents(limit=5, offset=10)
+
+    keyset_sql, keyset_params = executed[0]
+    assert "(upload_date, document_id) < (:after_date, :after_id)" in keyset_sql
+    assert "OFFSET" not in keyset_sql
+    assert keyset_params == {"limit": 5, "user_id": "u1", "after_date": after[0], "after_id": "doc-1"}
+    offset_sql, offset_params = executed[1]
+    assert "WHERE" not in offset_sql and "OFFSET :offset" in offset_sql
+    assert offset_params == {"limit": 5, "offset": 10}
+
+
+def test_processors_share_module_pools():
+    """Processors reuse the module-level pools instead of creating their own."""
+    first, second = DocumentProcessor(), DocumentProcessor()
+
+    assert first.process_pool is second.process_pool is document_service_module._CPU_POOL
+    assert first.executor is second.executor is document_service_module._IO_POOL
+
+
+@pytest.mark.asyncio
+async def test_process_docx_file_in_worker_process(tmp_path):
+    """DOCX paragraphs are extracted in the process pool, skipping blank ones."""
+    doc = DocxDocument()
+    for text in ("Prune after harvest.", "", "Mulch in March."):
+        doc.add_paragraph(text)
+    path = tmp_path / "guide.docx"
+    doc.save(path)
+
+    chunks = await DocumentProcessor()._process_docx_file(path.read_bytes())
+    from_path = await DocumentProcessor().process_file(
+        path, "guide.docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    )
+
+    assert chunks == from_path == ["Prune after harvest.\n\nMulch in March."]
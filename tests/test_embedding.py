@@ -0,0 +1,617 @@
+"""
+Tests for the batched embedding similarity helpers.
+"""
+
+import asyncio
+import os
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import numpy as np
+import pytest
+
+from app.services import embedding as embedding_module
+from app.services.embedding import EmbeddingIndex, EmbeddingService, normalize_embeddings
+
+
+@pytest.fixture
+def embeddings():
+    rng = np.random.default_rng(42)
+    return rng.normal(size=(50, 384)).astype(np.float32)
+
+
+@pytest.fixture
+def query():
+    rng = np.random.default_rng(7)
+    return rng.normal(size=384).astype(np.float32)
+
+
+def test_calculate_similarities_matches_pairwise(embeddings, query):
+    """Batched similarities equal the per-pair calculate_similarity results."""
+    service = EmbeddingService()
+
+    batched = service.calculate_similarities(query.tolist(), embeddings)
+    pairwise = [service.calculate_similarity(query.tolist(), row.tolist()) for row in embeddings]
+
+    np.testing.assert_allclose(batched, pairwise, rtol=1e-5, atol=1e-6)
+
+
+def test_calculate_similarity_uses_simsimd_when_installed(monkeypatch, query):
+    """The SimSIMD kernel's cosine distance is turned into a similarity; zero vectors score 0."""
+    calls = []
+
+    def cosine(a, b):
+        calls.append((a.dtype, b.dtype))
+        return 0.25
+
+    monkeypatch.setattr(embedding_module, "simsimd", SimpleNamespace(cosine=cosine))
+    service = EmbeddingService()
+
+    assert service.calculate_similarity(query.tolist(), [1.0] * 384) == 0.75
+    assert calls == [(np.float32, np.float32)]
+    assert service.calculate_similarity(query, np.zeros(384)) == 0.0
+    assert len(calls) == 1
+
+
+def test_calculate_similarity_normalized_is_a_dot_product(query):
+    """Unit vectors skip the norm computation and give the same similarity."""
+    service = EmbeddingService()
+    other = np.roll(query, 1)
+    unit_query, unit_other = normalize_embeddings([query, other])
+
+    assert service.calculate_similarity(unit_query, unit_other, normalized=True) == pytest.approx(
+        service.calculate_similarity(query, other), abs=1e-6
+    )
+
+
+def test_calculate_similarities_on_normalized_matrix(embeddings, query):
+    """Pre-normalised rows give the same scores without recomputing norms."""
+    service = EmbeddingService()
+
+    raw = service.calculate_similarities(query, embeddings)
+    normalized = service.calculate_similarities(query, normalize_embeddings(embeddings), normalized=True)
+
+    np.testing.assert_allclose(raw, normalized, rtol=1e-5, atol=1e-6)
+
+
+def test_top_k_similar_ordering(embeddings, query):
+    """Top-k returns the highest scores in descending order."""
+    service = EmbeddingService()
+    pairwise = np.array([service.calculate_similarity(query, row) for row in embeddings])
+
+    top = service.top_k_similar(query, embeddings, k=5)
+
+    assert [i for i, _ in top] == list(np.argsort(-pairwise)[:5])
+    scores = [score for _, score in top]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_top_k_similar_handles_small_inputs(query):
+    """k larger than the matrix and empty matrices are handled."""
+    service = EmbeddingService()
+
+    assert len(service.top_k_similar(query, np.ones((2, 384)), k=5)) == 2
+    assert service.top_k_similar(query, np.empty((0, 384)), k=3) == []
+
+
+def test_embedding_index_search(embeddings, query):
+    """The index applies limit, threshold and mask on the normalised matrix."""
+    service = EmbeddingService()
+    index = EmbeddingIndex()
+    index.add(embeddings, [{"row": i, "user_id": "a" if i % 2 else "b"} for i in range(len(embeddings))])
+
+    assert index.matrix.dtype == np.float16
+    assert index.matrix.flags["C_CONTIGUOUS"]
+    np.testing.assert_allclose(np.linalg.norm(index.matrix.astype(np.float32), axis=1), 1.0, rtol=1e-3)
+
+    pairwise = np.array([service.calculate_similarity(query, row) for row in embeddings])
+    matches = index.search(query, limit=3)
+    assert [payload["row"] for payload, _ in matches] == list(np.argsort(-pairwise)[:3])
+    np.testing.assert_allclose([score for _, score in matches], np.sort(pairwise)[::-1][:3], atol=1e-3)
+
+    mask = np.array([payload["user_id"] == "a" for payload in index.payloads])
+    assert all(payload["user_id"] == "a" for payload, _ in index.search(query, limit=10, mask=mask))
+
+    threshold = float(np.sort(pairwise)[-3:-1].mean())
+    assert len(index.search(query, limit=10, score_threshold=threshold)) == 2
+
+
+def test_embedding_index_half_precision_matches_float32(embeddings, query, monkeypatch):
+    """Blocked float16 scoring agrees with a float32 index."""
+    monkeypatch.setattr(embedding_module, "_SCORE_BLOCK_ROWS", 7)
+    payloads = [{"row": i} for i in range(len(embeddings))]
+    half = EmbeddingIndex()
+    half.add(embeddings, payloads)
+    full = EmbeddingIndex(dtype=np.float32)
+    full.add(embeddings, payloads)
+
+    assert half.matrix.nbytes * 2 == full.matrix.nbytes
+    half_matches = half.search(query, limit=5)
+    full_matches = full.search(query, limit=5)
+    assert [p["row"] for p, _ in half_matches] == [p["row"] for p, _ in full_matches]
+    np.testing.assert_allclose(
+        [score for _, score in half_matches], [score for _, score in full_matches], atol=1e-3
+    )
+
+
+def test_embedding_index_remove(embeddings):
+    """Removing by payload key drops the matching rows."""
+    index = EmbeddingIndex()
+    index.add(embeddings[:4], [{"document_id": "x"}, {"document_id": "y"}, {"document_id": "x"}, {"document_id": "z"}])
+
+    assert index.remove("document_id", "x") == 2
+    assert len(index) == 2
+    assert index.matrix.shape == (2, 384)
+    assert [payload["document_id"] for payload in index.payloads] == ["y", "z"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_embeddings_share_one_model_call():
+    """Concurrent create_embedding calls are encoded together, each getting its own vector."""
+    calls = []
+
+    def encode(texts, **kwargs):
+        calls.append((list(texts), kwargs))
+        return np.array([[float(len(text)), 0.0] for text in texts], dtype=np.float32)
+
+    service = EmbeddingService()
+    service.embedding_model = SimpleNamespace(encode=encode)
+
+    results = await asyncio.gather(*(service.create_embedding("x" * n + "  ") for n in range(1, 6)))
+
+    assert [result.tolist() for result in results] == [[float(n), 0.0] for n in range(1, 6)]
+    assert all(result.dtype == np.float32 for result in results)
+    assert len(calls) == 1
+    assert calls[0][0] == ["x", "xx", "xxx", "xxxx", "xxxxx"]
+    assert calls[0][1]["convert_to_numpy"] is True and calls[0][1]["normalize_embeddings"] is True
+
+    assert (await service.create_embedding("again")).tolist() == [5.0, 0.0]
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_embedding_batches_are_capped_and_errors_reach_callers(monkeypatch):
+    """Batches hold at most the configured number of texts; encode failures reach every waiter."""
+    sizes = []
+
+    def encode(texts):
+        sizes.append(len(texts))
+        if "boom" in texts:
+            raise RuntimeError("model failed")
+        return np.zeros((len(texts), 2), dtype=np.float32)
+
+    batcher = embedding_module._EmbeddingBatcher(encode, max_batch_size=3)
+
+    await asyncio.gather(*(batcher.submit(str(i)) for i in range(7)))
+    assert sizes == [3, 3, 1]
+
+    with pytest.raises(RuntimeError, match="model failed"):
+        await asyncio.gather(batcher.submit("boom"), batcher.submit("fine"))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cuda, expected_device, halved", [(True, "cuda", True), (False, "cpu", False)])
+async def test_initialize_uses_gpu_half_precision_when_available(monkeypatch, cuda, expected_device, halved):
+    """The model loads on CUDA in half precision when a GPU is present, with float32 outputs."""
+    created = []
+
+    class FakeModel:
+        def __init__(self, name, device):
+            self.device = device
+            self.halved = False
+            created.append(self)
+
+        def half(self):
+            self.halved = True
+            return self
+
+        def encode(self, texts, **kwargs):
+            return np.ones((len(texts), 2), dtype=np.float16) if isinstance(texts, list) else np.ones(2)
+
+    monkeypatch.setattr(embedding_module, "SentenceTransformer", FakeModel)
+    monkeypatch.setattr(embedding_module.torch.cuda, "is_available", lambda: cuda)
+    service = EmbeddingService()
+
+    await service.initialize()
+
+    assert service.device == expected_device
+    assert created[0].device == expected_device and created[0].halved is halved
+    assert service._encode_batch(["a", "b"]).dtype == np.float32
+    batch = service.create_batch_embeddings(["a"])
+    assert batch.dtype == np.float32 and batch.tolist() == [[1.0, 1.0]]
+
+
+def test_embedding_index_int8_matches_float32(embeddings, query):
+    """Per-row int8 quantization ranks like float32 at a quarter of the memory, and removal keeps norms aligned."""
+    payloads = [{"row": i} for i in range(len(embeddings))]
+    quantized = EmbeddingIndex(dtype=np.int8)
+    quantized.add(embeddings, payloads)
+    full = EmbeddingIndex(dtype=np.float32)
+    full.add(embeddings, payloads)
+
+    assert quantized.matrix.dtype == np.int8
+    assert quantized.matrix.nbytes * 4 == full.matrix.nbytes
+    assert np.abs(quantized.matrix).max(axis=1).tolist() == [127] * len(embeddings)
+    int8_matches = quantized.search(query, limit=5)
+    full_matches = full.search(query, limit=5)
+    assert [p["row"] for p, _ in int8_matches] == [p["row"] for p, _ in full_matches]
+    np.testing.assert_allclose(
+        [score for _, score in int8_matches], [score for _, score in full_matches], atol=1e-2
+    )
+
+    quantized.retain(np.arange(len(embeddings)) % 2 == 0)
+    assert quantized.row_norms.shape == (len(quantized),)
+    assert quantized.search(embeddings[4], limit=1)[0][0]["row"] == 4
+
+
+@pytest.mark.asyncio
+async def test_memory_writes_are_batched_per_collection(monkeypatch):
+    """Concurrent stores are upserted together per collection, and each returns once its batch is applied."""
+    upserts = []
+
+    async def upsert(**kwargs):
+        upserts.append((
+            kwargs["collection_name"],
+            [point.payload.get("preview", point.payload.get("content")) for point in kwargs["points"]],
+            kwargs["wait"]
+        ))
+
+    monkeypatch.setattr(
+        embedding_module.db_manager, "get_async_qdrant_client", lambda: SimpleNamespace(upsert=upsert)
+    )
+    service = embedding_module.VectorMemoryService()
+    service.embedding_service.embedding_model = SimpleNamespace(
+        encode=lambda texts, **kwargs: np.ones((len(texts), 384), dtype=np.float32)
+    )
+
+    await asyncio.gather(
+        *(service.store_conversation_memory(str(i), "u1", "s1", f"message {i}", "user") for i in range(3)),
+        service.store_user_context("u1", "farm", "Nyeri, SL28")
+    )
+    assert sorted(upserts) == [
+        ("conversation_embeddings", ["message 0", "message 1", "message 2"], True),
+        ("user_context_embeddings", ["Nyeri, SL28"], True),
+    ]
+
+    await service.store_user_context("u1", "farm", "Altitude 1700 m")
+    assert upserts[-1] == ("user_context_embeddings", ["Altitude 1700 m"], True)
+
+
+@pytest.mark.asyncio
+async def test_write_buffer_flushes_when_full(monkeypatch):
+    """A full buffer is written at once without waiting for the timer."""
+    batches = []
+    monkeypatch.setattr(embedding_module.db_manager, "get_async_qdrant_client", lambda: SimpleNamespace(
+        upsert=AsyncMock(side_effect=lambda **kwargs: batches.append(len(kwargs["points"])))
+    ))
+    buffer = embedding_module._QdrantWriteBuffer(
+        "c", embedding_module.db_manager.get_async_qdrant_client, max_batch_size=2, max_wait_seconds=60
+    )
+
+    written = [buffer.add(embedding_module.PointStruct(id=i, vector=[1.0], payload={})) for i in range(5)]
+    await asyncio.sleep(0)
+    assert batches == [2, 2]
+    assert all(future.done() for future in written[:4]) and not written[4].done()
+
+    await buffer.flush()
+    assert batches == [2, 2, 1] and written[4].done()
+
+
+@pytest.mark.asyncio
+async def test_failed_writes_are_retried_then_reach_the_caller(monkeypatch):
+    """A failing batch is retried; once retries run out every store in it raises."""
+    monkeypatch.setattr(embedding_module, "_WRITE_RETRY_SECONDS", 0)
+    upsert = AsyncMock(side_effect=[ConnectionError("down"), None])
+    buffer = embedding_module._QdrantWriteBuffer("c", lambda: SimpleNamespace(upsert=upsert), max_wait_seconds=0)
+
+    await buffer.add(embedding_module.PointStruct(id=1, vector=[1.0], payload={}))
+    assert upsert.await_count == 2
+
+    upsert.side_effect = ConnectionError("still down")
+    with pytest.raises(ConnectionError):
+        await asyncio.gather(*(
+            buffer.add(embedding_module.PointStruct(id=i, vector=[1.0], payload={})) for i in range(2)
+        ))
+    assert upsert.await_count == 2 + embedding_module._WRITE_ATTEMPTS
+
+
+@pytest.mark.asyncio
+async def test_identical_text_reuses_cached_embedding(monkeypatch):
+    """Texts that clean to the same string are encoded once; the LRU is bounded."""
+    monkeypatch.setattr(embedding_module, "_EMBEDDING_CACHE_SIZE", 2)
+    encoded = []
+
+    def encode(texts, **kwargs):
+        encoded.extend(texts)
+        return np.ones((len(texts), 2), dtype=np.float32)
+
+    service = EmbeddingService()
+    service.embedding_model = SimpleNamespace(encode=encode)
+
+    first = await service.create_embedding("When to  prune?")
+    again = await service.create_embedding("  When to prune? ")
+
+    assert again is first
+    assert not first.flags.writeable
+    assert encoded == ["When to prune?"]
+
+    await service.create_embedding("b")
+    await service.create_embedding("c")
+    await service.create_embedding("When to prune?")
+    assert encoded == ["When to prune?", "b", "c", "When to prune?"]
+
+
+@pytest.mark.asyncio
+async def test_repeated_memories_reuse_their_point(monkeypatch):
+    """Re-storing the same message or identical context reuses the earlier point without a second write."""
+    points = []
+    monkeypatch.setattr(embedding_module.db_manager, "get_async_qdrant_client", lambda: SimpleNamespace(
+        upsert=AsyncMock(side_effect=lambda **kwargs: points.extend(kwargs["points"]))
+    ))
+    service = embedding_module.VectorMemoryService()
+    service.embedding_service.embedding_model = SimpleNamespace(
+        encode=lambda texts, **kwargs: np.ones((len(texts), 384), dtype=np.float32)
+    )
+
+    first = await service.store_conversation_memory("1", "u1", "s1", "How do I mulch?", "user")
+    retry = await service.store_conversation_memory("1", "u1", "s1", "How do I mulch?", "user")
+    other_message = await service.store_conversation_memory("2", "u1", "s2", "How do I mulch?", "user")
+    context = await service.store_user_context("u1", "farm", "How do I mulch?")
+    context_repeat = await service.store_user_context("u1", "farm", "How do I mulch?")
+
+    assert retry == first
+    assert other_message != first
+    assert context_repeat == context != first
+    assert len(points) == 3
+    assert points[1].payload["message_id"] == "2" and points[1].payload["session_id"] == "s2"
+
+
+@pytest.mark.asyncio
+async def test_failed_memory_writes_are_not_remembered(monkeypatch):
+    """A store whose write failed is not treated as stored when the message is retried."""
+    monkeypatch.setattr(embedding_module, "_WRITE_RETRY_SECONDS", 0)
+    upsert = AsyncMock(side_effect=ConnectionError("down"))
+    monkeypatch.setattr(
+        embedding_module.db_manager, "get_async_qdrant_client", lambda: SimpleNamespace(upsert=upsert)
+    )
+    service = embedding_module.VectorMemoryService()
+    service.embedding_service.embedding_model = SimpleNamespace(
+        encode=lambda texts, **kwargs: np.ones((len(texts), 384), dtype=np.float32)
+    )
+
+    with pytest.raises(ConnectionError):
+        await service.store_conversation_memory("1", "u1", "s1", "How do I mulch?", "user")
+    upsert.side_effect = None
+    await service.store_conversation_memory("1", "u1", "s1", "How do I mulch?", "user")
+
+    assert upsert.await_count == embedding_module._WRITE_ATTEMPTS + 1
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "  Prune\tafter\n\nharvest  ",
+    "single",
+    "a b c\x1fd",
+    "word " * 500,
+])
+def test_clean_text_matches_split_join(text):
+    """The regex cleaner gives the same result as the original strip/split/join with truncation."""
+    expected = " ".join(text.strip().split())
+    if len(expected) > 2000:
+        expected = expected[:2000] + "..."
+
+    assert EmbeddingService()._clean_text(text) == expected
+
+
+@pytest.mark.asyncio
+async def test_search_queries_qdrant_with_the_user_filter(monkeypatch):
+    """Every search is a quantized Qdrant query restricted to the user's points; nothing is scrolled in."""
+    query_points = AsyncMock(return_value=SimpleNamespace(
+        points=[SimpleNamespace(payload={"preview": "mulch", "message_id": "m1"}, score=0.9)]
+    ))
+    monkeypatch.setattr(
+        embedding_module.db_manager, "get_async_qdrant_client",
+        lambda: SimpleNamespace(query_points=query_points)
+    )
+    service = embedding_module.VectorMemoryService()
+    service.embedding_service.embedding_model = SimpleNamespace(
+        encode=lambda texts, **kwargs: np.array([[1.0] + [0.0] * 383] * len(texts), dtype=np.float32)
+    )
+
+    first = await service.search_similar_conversations("mulch?", "u1", similarity_threshold=0.5)
+    second = await service.search_similar_conversations("mulch?", "u1", similarity_threshold=0.5)
+
+    assert [r["message_id"] for r in first] == [r["message_id"] for r in second] == ["m1"]
+    kwargs = query_points.await_args.kwargs
+    assert query_points.await_count == 2
+    assert kwargs["query_filter"].must[0].match.value == "u1" and kwargs["score_threshold"] == 0.5
+    assert kwargs["search_params"].quantization.rescore is True
+    assert kwargs["search_params"].quantization.oversampling == 2.0 and kwargs["search_params"].hnsw_ef == 64
+
+
+def test_onnx_backend_mean_pools_and_normalises():
+    """The ONNX path pools token states over the attention mask and returns unit float32 rows."""
+    hidden = np.array([
+        [[1.0, 0.0], [3.0, 4.0], [100.0, 100.0]],
+        [[0.0, 2.0], [0.0, 0.0], [0.0, 0.0]],
+    ], dtype=np.float32)
+    mask = np.array([[1, 1, 0], [1, 0, 0]])
+    fed = {}
+
+    class FakeSession:
+        def get_inputs(self):
+            return [SimpleNamespace(name="input_ids"), SimpleNamespace(name="attention_mask")]
+
+        def run(self, outputs, feed):
+            fed.update(feed)
+            return [hidden]
+
+    service = EmbeddingService()
+    service._onnx_session = FakeSession()
+    service._tokenizer = lambda texts, **kwargs: {
+        "input_ids": np.ones_like(mask), "attention_mask": mask, "token_type_ids": np.zeros_like(mask)
+    }
+
+    result = service._encode_batch(["a", "b"])
+
+    assert set(fed) == {"input_ids", "attention_mask"}
+    assert result.dtype == np.float32
+    np.testing.assert_allclose(result, [[np.sqrt(0.5), np.sqrt(0.5)], [0.0, 1.0]], rtol=1e-6)
+    assert service._encode_onnx([]).shape == (0, service.vector_size)
+
+
+def test_onnx_export_failure_falls_back_to_torch(monkeypatch, tmp_path):
+    """A failed export leaves the PyTorch model in charge."""
+    class FailingExport:
+        @staticmethod
+        def from_pretrained(*args, **kwargs):
+            raise RuntimeError("no network")
+
+    monkeypatch.setattr(embedding_module, "_ONNX_MODEL_DIR", tmp_path)
+    monkeypatch.setattr(embedding_module, "ORTModelForFeatureExtraction", FailingExport, raising=False)
+    service = EmbeddingService()
+
+    service._load_onnx_model()
+
+    assert service._onnx_session is None and service._tokenizer is None
+
+
+@pytest.mark.asyncio
+async def test_user_context_matches_any_requested_type(monkeypatch):
+    """Several context types are OR-ed in one indexed condition, and user_id is not fetched back."""
+    point = SimpleNamespace(payload={"context_type": "farm", "content": "2 ha", "crop": "arabica"})
+    scroll = AsyncMock(return_value=([point], None))
+    monkeypatch.setattr(
+        embedding_module.db_manager, "get_async_qdrant_client", lambda: SimpleNamespace(scroll=scroll)
+    )
+
+    context = await embedding_module.VectorMemoryService().get_user_context("u1", ["farm", "goal"])
+
+    kwargs = scroll.await_args.kwargs
+    user_condition, type_condition = kwargs["scroll_filter"].must
+    assert user_condition.match.value == "u1"
+    assert type_condition.match.any == ["farm", "goal"]
+    assert kwargs["with_payload"].exclude == ["user_id"] and kwargs["with_vectors"] is False
+    assert context == [{"context_type": "farm", "content": "2 ha", "metadata": {"crop": "arabica"}}]
+
+
+@pytest.mark.asyncio
+async def test_conversation_payload_keeps_only_a_preview(monkeypatch):
+    """Conversation points carry a short preview and a content hash instead of the text itself."""
+    points = []
+    monkeypatch.setattr(embedding_module.db_manager, "get_async_qdrant_client", lambda: SimpleNamespace(
+        upsert=AsyncMock(side_effect=lambda **kwargs: points.extend(kwargs["points"])),
+        query_points=AsyncMock(side_effect=lambda **kwargs: SimpleNamespace(
+            points=[SimpleNamespace(payload=point.payload, score=1.0) for point in points]
+        ))
+    ))
+    service = embedding_module.VectorMemoryService()
+    service.embedding_service.embedding_model = SimpleNamespace(
+        encode=lambda texts, **kwargs: np.ones((len(texts), 384), dtype=np.float32)
+    )
+    content = "Shade trees " * 50
+
+    await service.store_conversation_memory("m1", "u1", "s1", content, "user")
+
+    payload = points[0].payload
+    assert "content" not in payload
+    assert payload["preview"] == content[:embedding_module._PREVIEW_CHARS]
+    assert payload["timestamp_epoch"] is None
+    assert len(payload["content_hash"]) == 16
+
+    [result] = await service.search_similar_conversations("shade", "u1", similarity_threshold=0.5)
+    assert result["preview"] == result["content"] == payload["preview"]
+    assert "content_hash" not in result["metadata"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cuda, workers", [(True, 1), (False, min(4, os.cpu_count() or 1))])
+async def test_model_calls_run_on_a_pool_sized_for_the_device(monkeypatch, cuda, workers):
+    """Batched and single-text encodes run on the service's own pool, one thread on a GPU."""
+    threads = []
+
+    class FakeModel:
+        def __init__(self, name, device):
+            pass
+
+        def half(self):
+            return self
+
+        def encode(self, texts, **kwargs):
+            threads.append(threading.current_thread().name)
+            return np.ones((len(texts), 384), dtype=np.float32)
+
+    monkeypatch.setattr(embedding_module, "SentenceTransformer", FakeModel)
+    monkeypatch.setattr(embedding_module, "onnxruntime", None)
+    monkeypatch.setattr(embedding_module.torch.cuda, "is_available", lambda: cuda)
+    service = EmbeddingService()
+    await service.initialize()
+    threads.clear()
+
+    await service.create_embedding("shade")
+    batch = await service.create_batch_embeddings_async(["a", "b"])
+
+    assert service._executor._max_workers == workers
+    assert batch.shape == (2, 384)
+    assert len(threads) == 2 and all(name.startswith("embedding") for name in threads)
+    service._executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_qdrant_client_is_bound_once_and_rebound_on_reload(monkeypatch):
+    """The service looks the client up once; reload_client picks up a reconnected one."""
+    clients = iter([SimpleNamespace(name="first"), SimpleNamespace(name="second")])
+    lookups = []
+    monkeypatch.setattr(
+        embedding_module.db_manager, "get_async_qdrant_client", lambda: lookups.append(1) or next(clients)
+    )
+    service = embedding_module.VectorMemoryService()
+
+    assert service._qdrant_client().name == service._qdrant_client().name == "first"
+    assert service._write_buffers[service.conversation_collection]._get_client().name == "first"
+    await service.reload_client()
+    assert service._qdrant_client().name == "second"
+    assert len(lookups) == 2
+
+
+@pytest.mark.asyncio
+async def test_conversation_timestamps_are_stored_as_epochs(monkeypatch):
+    """The ISO timestamp is parsed once at write time; search results carry the epoch."""
+    points = []
+    monkeypatch.setattr(embedding_module.db_manager, "get_async_qdrant_client", lambda: SimpleNamespace(
+        upsert=AsyncMock(side_effect=lambda **kwargs: points.extend(kwargs["points"])),
+        query_points=AsyncMock(side_effect=lambda **kwargs: SimpleNamespace(
+            points=[SimpleNamespace(payload=point.payload, score=1.0) for point in points]
+        ))
+    ))
+    service = embedding_module.VectorMemoryService()
+    service.embedding_service.embedding_model = SimpleNamespace(
+        encode=lambda texts, **kwargs: np.ones((len(texts), 384), dtype=np.float32)
+    )
+    when = datetime(2024, 6, 1, 12, tzinfo=timezone.utc)
+
+    await service.store_conversation_memory("m1", "u1", "s1", "Mulch", "user", {"timestamp": when.isoformat()})
+
+    payload = points[0].payload
+    assert payload["timestamp_epoch"] == when.timestamp()
+    assert embedding_module._payload_epoch({"timestamp_epoch": 5.0, "timestamp": "bad"}) == 5.0
+
+    [result] = await service.search_similar_conversations("mulch", "u1", similarity_threshold=0.5)
+    assert result["timestamp_epoch"] == when.timestamp()
+    assert "timestamp_epoch" not in result["metadata"]
+
+
+def test_embedding_index_grows_by_doubling(embeddings, query):
+    """Rows appended one at a time reuse spare capacity and search like a bulk-built index."""
+    grown = EmbeddingIndex(dtype=np.int8)
+    for i, row in enumerate(embeddings):
+        grown.add([row], [{"row": i}])
+    bulk = EmbeddingIndex(dtype=np.int8)
+    bulk.add(embeddings, [{"row": i} for i in range(len(embeddings))])
+
+    assert grown._rows.shape[0] == 64 and len(grown) == len(embeddings)
+    np.testing.assert_array_equal(grown.matrix, bulk.matrix)
+    np.testing.assert_array_equal(grown.row_norms, bulk.row_norms)
+    assert grown.search(query, limit=5) == bulk.search(query, limit=5)
@@ -0,0 +1,82 @@
+"""
+Tests for the Cerebras LLM client configuration.
+"""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+
+from app.clients import shared_client
+from app.config import settings
+from app.llm_client import CerebrasClient
+
+
+def test_client_uses_shared_http_client():
+    """The OpenAI SDK client reuses the pooled application HTTP client."""
+    client = CerebrasClient()
+    assert client.client._client is shared_client
+
+
+def test_client_accepts_custom_http_client():
+    """A caller-supplied HTTP client replaces the shared one."""
+    custom = httpx.AsyncClient()
+    client = CerebrasClient(http_client=custom)
+    assert client.client._client is custom
+
+
+def test_llm_timeout_overrides_shared_default():
+    """LLM calls use the configured timeout, not the shared client's 30s default."""
+    client = CerebrasClient()
+    assert client.client.timeout.read == settings.llm_timeout
+    assert shared_client.timeout.read == 30.0
+
+
+@pytest.mark.asyncio
+async def test_generate_response_stream_yields_content_deltas(monkeypatch):
+    """Streaming skips empty deltas and yields text in decode order."""
+    client = CerebrasClient()
+
+    async def chunks():
+        for content in ("Habari", None, " bwana"):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+    create = AsyncMock(return_value=chunks())
+    monkeypatch.setattr(client.client.chat.completions, "create", create)
+
+    streamed = [chunk async for chunk in client.generate_response_stream([{"role": "user", "content": "Hi"}])]
+
+    assert streamed == ["Habari", " bwana"]
+    assert create.await_args.kwargs["stream"] is True
+
+
+@pytest.mark.asyncio
+async def test_response_format_is_forwarded_only_when_requested(monkeypatch):
+    """A JSON response format reaches the API; plain calls send no response_format."""
+    client = CerebrasClient()
+    reply = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="{}"), finish_reason="stop")],
+        model="m", usage=None
+    )
+    create = AsyncMock(return_value=reply)
+    monkeypatch.setattr(client.client.chat.completions, "create", create)
+    messages = [{"role": "user", "content": "Hi"}]
+
+    await client.generate_response(messages, response_format={"type": "json_object"})
+    await client.generate_response(messages)
+
+    assert create.await_args_list[0].kwargs["response_format"] == {"type": "json_object"}
+    assert "response_format" not in create.await_args_list[1].kwargs
+
+
+@pytest.mark.asyncio
+async def test_warm_up_lists_models_and_tolerates_failure(monkeypatch):
+    """Warm-up uses the token-free models endpoint and never raises."""
+    client = CerebrasClient()
+    list_models = AsyncMock(side_effect=httpx.ConnectError("offline"))
+    monkeypatch.setattr(client.client.models, "list", list_models)
+
+    await client.warm_up()
+
+    list_models.assert_awaited_once()
@@ -0,0 +1,258 @@
+"""
+Tests for the conversation memory service.
+"""
+
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+
+from app.services import memory as memory_module
+from app.services.memory import MemoryService
+
+
+@pytest.mark.asyncio
+async def test_user_stats_counts_in_one_query(monkeypatch):
+    """Profile and activity counts come back from a single COUNT(*) query, with no rows loaded."""
+    profile = SimpleNamespace(
+        name="Wanjiru", location="Nyeri", farm_size_acres=2.5, coffee_varieties=["SL28"],
+        farming_experience_years=12, created_at=datetime(2024, 1, 5), updated_at=datetime(2024, 3, 1)
+    )
+    result = SimpleNamespace(one_or_none=lambda: (profile, 4, 37, 2))
+    session = SimpleNamespace(execute=AsyncMock(return_value=result))
+
+    @asynccontextmanager
+    async def get_session():
+        yield session
+
+    monkeypatch.setattr(memory_module.db_manager, "get_postgres_session", get_session)
+
+    stats = await MemoryService().get_user_stats("u1")
+
+    session.execute.assert_awaited_once()
+    sql = str(session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert sql.count("count(*)") == 3
+    assert sql.count("FROM conversation_sessions") == 1
+    assert "count(*) FILTER (WHERE conversation_sessions.last_activity >=" in sql
+    assert stats["total_sessions"] == 4
+    assert stats["total_messages"] == 37
+    assert stats["recent_sessions_7d"] == 2
+    assert stats["farm_size_acres"] == 2.5
+    assert stats["member_since"] == "2024-01-05T00:00:00"
+
+    result.one_or_none = lambda: None
+    assert await MemoryService().get_user_stats("missing") == {}
+
+
+@pytest.mark.asyncio
+async def test_relevant_memories_are_enriched_with_one_query(monkeypatch):
+    """Every hit's message is loaded by a single IN query; hits without a valid id pass through."""
+    known = uuid.uuid4()
+    message = SimpleNamespace(
+        id=known, content="Full text", created_at=datetime(2024, 5, 1), tokens_used=12, model_used="m"
+    )
+    hits = [
+        {"message_id": str(known), "content": "Full"},
+        {"message_id": str(uuid.uuid4()), "content": "Gone"},
+        {"message_id": "not-a-uuid", "content": "Odd"},
+        {"content": "No id"},
+    ]
+    monkeypatch.setattr(
+        memory_module.vector_memory_service, "search_similar_conversations", AsyncMock(return_value=hits)
+    )
+    result = SimpleNamespace(scalars=lambda: [message])
+    session = SimpleNamespace(execute=AsyncMock(return_value=result))
+
+    @asynccontextmanager
+    async def get_session():
+        yield session
+
+    monkeypatch.setattr(memory_module.db_manager, "get_postgres_session", get_session)
+
+    memories = await MemoryService().search_relevant_memories("u1", "mulch", limit=4)
+
+    session.execute.assert_awaited_once()
+    assert " IN " in str(session.execute.await_args.args[0])
+    assert memories[0]["content"] == memories[0]["full_content"] == "Full text"
+    assert memories[0]["created_at"] == "2024-05-01T00:00:00"
+    assert memories[1:] == hits[1:]
+
+
+@pytest.mark.asyncio
+async def test_session_listing_is_cached_until_a_session_is_created(monkeypatch):
+    """Repeated listings are served from memory until the user starts a session or the TTL passes."""
+    rows = [SimpleNamespace(session_id="s1")]
+    session = SimpleNamespace(execute=AsyncMock(return_value=SimpleNamespace(all=lambda: rows)))
+
+    @asynccontextmanager
+    async def get_session():
+        yield session
+
+    monkeypatch.setattr(memory_module.db_manager, "get_postgres_session", get_session)
+    service = MemoryService()
+
+    assert await service.get_user_conversation_sessions("u1") == rows
+    assert await service.get_user_conversation_sessions("u1") == rows
+    assert session.execute.await_count == 1
+    sql = str(session.execute.await_args.args[0])
+    assert "conversation_sessions.message_count" in sql and "conversation_sessions.id" not in sql
+
+    await service.get_user_conversation_sessions("u1", limit=5)
+    assert session.execute.await_count == 2
+
+    service.invalidate_user_sessions("u1")
+    await service.get_user_conversation_sessions("u1")
+    assert session.execute.await_count == 3
+
+    key = ("u1", 20, 30)
+    service._sessions_cache[key] = (
+        service._sessions_cache[key][0] - memory_module._SESSIONS_CACHE_TTL_SECONDS, rows
+    )
+    await service.get_user_conversation_sessions("u1")
+    assert session.execute.await_count == 4
+
+
+def _recording_session(results):
+    """Session stand-in that records executed statements and replays results or errors in order."""
+    executed = []
+
+    async def execute(statement):
+        executed.append(str(statement.compile(dialect=postgresql.dialect())))
+        outcome = results.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    session = SimpleNamespace(execute=execute, commit=AsyncMock(), rollback=AsyncMock())
+
+    @asynccontextmanager
+    async def get_session():
+        yield session
+
+    return session, executed, get_session
+
+
+@pytest.mark.asyncio
+async def test_session_get_or_create_is_one_upsert(monkeypatch):
+    """An existing or new session for a known user takes a single upsert statement."""
+    row = SimpleNamespace(session_id="s1")
+    session, executed, get_session = _recording_session([SimpleNamespace(one=lambda: (row, False))])
+    monkeypatch.setattr(memory_module.db_manager, "get_postgres_session", get_session)
+    service = MemoryService()
+    service._sessions_cache[("u1", 20, 30)] = (0.0, [row])
+
+    assert await service.get_or_create_conversation_session("s1", "u1", {"crop": "SL28"}) is row
+
+    assert ("u1", 20, 30) in service._sessions_cache  # touching an existing session keeps listings
+    assert len(executed) == 1
+    assert "ON CONFLICT (session_id) DO UPDATE" in executed[0]
+    assert "conversation_sessions.context || excluded.context" in executed[0]
+    assert "RETURNING" in executed[0] and "xmax = 0 AS created" in executed[0]
+    session.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_session_upsert_creates_missing_profile(monkeypatch):
+    """A foreign-key failure for a new user creates the profile and retries the upsert."""
+    row = SimpleNamespace(session_id="s1")
+    session, executed, get_session = _recording_session([
+        IntegrityError("INSERT", {}, Exception("violates foreign key constraint")),
+        SimpleNamespace(),
+        SimpleNamespace(one=lambda: (row, True)),
+    ])
+    monkeypatch.setattr(memory_module.db_manager, "get_postgres_session", get_session)
+    service = MemoryService()
+    service._sessions_cache[("new-user", 20, 30)] = (0.0, [])
+
+    assert await service.get_or_create_conversation_session("s1", "new-user") is row
+    assert not service._sessions_cache
+
+    session.rollback.assert_awaited_once()
+    assert executed[1].startswith("INSERT INTO user_profiles")
+    assert "ON CONFLICT (user_id) DO NOTHING" in executed[1]
+    assert executed[2] == executed[0]
+
+
+@pytest.mark.asyncio
+async def test_message_and_embedding_reference_commit_together(monkeypatch):
+    """Embedding starts before the database work and the message and its reference share one commit."""
+    events = []
+    added = []
+    point_id = str(uuid.uuid4())
+
+    async def store_conversation_memory(**kwargs):
+        events.append(("embed", kwargs["message_id"]))
+        await asyncio.sleep(0.01)
+        return point_id
+
+    async def flush():
+        events.append("flush")
+
+    session = SimpleNamespace(add=added.append, flush=flush, commit=AsyncMock(), rollback=AsyncMock())
+
+    @asynccontextmanager
+    async def get_session():
+        yield session
+
+    async def upsert_session(*args):
+        await asyncio.sleep(0.01)
+        events.append("session")
+
+    monkeypatch.setattr(memory_module.db_manager, "get_postgres_session", get_session)
+    monkeypatch.setattr(memory_module.vector_memory_service, "store_conversation_memory", store_conversation_memory)
+    service = MemoryService()
+    monkeypatch.setattr(service, "get_or_create_conversation_session", upsert_session)
+
+    message = await service.store_conversation_message("s1", "u1", "user", "When to mulch?")
+
+    assert events == [("embed", str(message.id)), "session", "flush"]  # embedding overlapped the upsert
+    assert added[0] is message
+    assert added[1].message_id == message.id and added[1].qdrant_point_id == point_id
+    session.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_rolled_back_message_deletes_its_embedding(monkeypatch):
+    """A failed insert rolls back and removes the point written for the message; no session means no embedding."""
+    point_id = str(uuid.uuid4())
+    store = AsyncMock(return_value=point_id)
+    delete = AsyncMock()
+    failed_insert = IntegrityError("INSERT", {}, Exception("violates foreign key constraint"))
+    session = SimpleNamespace(
+        add=lambda row: None, flush=AsyncMock(side_effect=failed_insert), commit=AsyncMock(), rollback=AsyncMock()
+    )
+
+    @asynccontextmanager
+    async def get_session():
+        yield session
+
+    monkeypatch.setattr(memory_module.db_manager, "get_postgres_session", get_session)
+    monkeypatch.setattr(memory_module.vector_memory_service, "store_conversation_memory", store)
+    monkeypatch.setattr(memory_module.vector_memory_service, "delete_conversation_memory", delete)
+    service = MemoryService()
+    monkeypatch.setattr(service, "get_or_create_conversation_session", AsyncMock())
+
+    with pytest.raises(IntegrityError):
+        await service.store_conversation_message("s1", "u1", "user", "When to mulch?")
+
+    session.rollback.assert_awaited_once()
+    delete.assert_awaited_once_with(point_id)
+
+    @asynccontextmanager
+    async def unavailable():
+        raise ConnectionError("database down")
+        yield
+
+    monkeypatch.setattr(memory_module.db_manager, "get_postgres_session", unavailable)
+    store.reset_mock()
+
+    with pytest.raises(ConnectionError):
+        await service.store_conversation_message("s1", "u1", "user", "When to mulch?")
+
+    store.assert_not_called()
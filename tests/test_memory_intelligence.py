@@ -0,0 +1,648 @@
+"""
+Tests for memory insight caching.
+"""
+
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import numpy as np
+import pytest
+from sqlalchemy.exc import ProgrammingError
+
+from app.services import memory_intelligence as memory_intelligence_module
+from app.services.memory_intelligence import MemoryInsight, MemoryIntelligenceService
+
+
+class FakeStream:
+    """Async row iterator standing in for a streamed SQLAlchemy result."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.consumed = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.consumed == len(self.rows):
+            raise StopAsyncIteration
+        self.consumed += 1
+        return self.rows[self.consumed - 1]
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """Service whose database returns one message and whose analysis returns one insight."""
+    executed = []
+
+    class FakeSession:
+        async def stream(self, *args, **kwargs):
+            executed.append(args)
+            return FakeStream([("Coffee rust on SL28", None, "s1")])
+
+    @asynccontextmanager
+    async def fake_session():
+        yield FakeSession()
+
+    monkeypatch.setattr(memory_intelligence_module.db_manager, "get_postgres_session", fake_session)
+
+    service = MemoryIntelligenceService()
+    insight = MemoryInsight(
+        topic="pests", summary="Rust questions", importance_score=0.9,
+        related_conversations=["s1"], first_mentioned=None, last_mentioned=None, frequency=3
+    )
+    service._analyze_conversation_patterns = AsyncMock(return_value=[insight])
+    # Group in Python, as without the generated topics column
+    service._topics_column_ready = False
+    service.executed = executed
+    return service
+
+
+@pytest.mark.asyncio
+async def test_memory_insights_cache_hit(service):
+    """A repeated request for the same user is served without querying again."""
+    first = await service.get_memory_insights("u1", limit=3)
+    second = await service.get_memory_insights("u1", limit=3)
+
+    assert first == second
+    assert len(service.executed) == 1
+    service._analyze_conversation_patterns.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_memory_insights_cache_invalidation(service):
+    """New history for the user forces a rebuild; limits share a ranking, frequency gates do not."""
+    await service.get_memory_insights("u1", limit=3)
+    service.invalidate_user_insights("u1")
+    await service.get_memory_insights("u1", limit=3)
+    await service.get_memory_insights("u1", limit=5)
+    assert len(service.executed) == 2
+
+    await service.get_memory_insights("u1", limit=3, min_frequency=4)
+    assert len(service.executed) == 3
+
+
+def test_to_memory_arrays_precomputes_type_labels():
+    """Memory types come with their display labels so the agent does not re-title them."""
+    arrays = memory_intelligence_module.to_memory_arrays([
+        {"content": "Rust", "memory_type": "problem_solving", "enhanced_relevance": 0.9},
+        {"content": "Hi"},
+    ])
+
+    assert arrays["types"] == ["problem_solving", "general"]
+    assert arrays["type_labels"] == ["Problem_Solving", "General"]
+    assert arrays["relevance"].tolist() == [0.9, 0.0]
+
+
+@pytest.mark.asyncio
+async def test_topic_alignment_embeds_all_memories_in_one_call(service, monkeypatch):
+    """Memories and the query are embedded together; alignment is their cosine similarity."""
+    vectors = np.array([[1.0, 0.0], [0.6, 0.8], [-1.0, 0.0], [1.0, 0.0]], dtype=np.float32)
+    embed = AsyncMock(return_value=vectors)
+    monkeypatch.setattr(service.embedding_service, "create_batch_embeddings_async", embed)
+    monkeypatch.setattr(service, "_bulk_session_msg_counts", AsyncMock(return_value={}))
+    keyword_scan = AsyncMock()
+    monkeypatch.setattr(service, "_calculate_topic_alignment", keyword_scan)
+    memories = [{"content": text, "similarity_score": 0.8} for text in ("rust", "pruning", "prices")]
+
+    enhanced = await service._enhance_memory_relevance(memories, "leaf rust", "u1")
+
+    embed.assert_awaited_once_with(["rust", "pruning", "prices", "leaf rust"])
+    keyword_scan.assert_not_awaited()
+    alignments = {memory["content"]: memory["relevance_factors"]["topic_alignment"] for memory in enhanced}
+    assert alignments == pytest.approx({"rust": 1.0, "pruning": 0.6, "prices": 0.0})
+
+
+@pytest.mark.asyncio
+async def test_topic_alignment_falls_back_to_keywords(service, monkeypatch):
+    """Without a usable embedder each memory is scored by the keyword scan."""
+    monkeypatch.setattr(
+        service.embedding_service, "create_batch_embeddings_async", AsyncMock(side_effect=RuntimeError("no model"))
+    )
+    monkeypatch.setattr(service, "_bulk_session_msg_counts", AsyncMock(return_value={}))
+
+    [memory] = await service._enhance_memory_relevance([{"content": "coffee harvest"}], "harvest time", "u1")
+
+    assert memory["relevance_factors"]["topic_alignment"] == 1.0
+
+
+@pytest.mark.asyncio
+async def test_memories_are_enhanced_concurrently(service, monkeypatch):
+    """Per-memory enhancement steps run at the same time as each other."""
+    running, peak = 0, 0
+    score = service._calculate_enhanced_relevance
+
+    async def relevance(*args, **kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return await score(*args, **kwargs)
+
+    monkeypatch.setattr(
+        service.embedding_service, "create_batch_embeddings_async", AsyncMock(side_effect=RuntimeError)
+    )
+    monkeypatch.setattr(service, "_bulk_session_msg_counts", AsyncMock(return_value={"s2": 3}))
+    monkeypatch.setattr(service, "_calculate_enhanced_relevance", relevance)
+
+    enhanced = await service._enhance_memory_relevance(
+        [{"content": c, "session_id": f"s{i}"} for i, c in enumerate("abc")], "q", "u1"
+    )
+
+    assert peak == 3
+    assert enhanced[0]["content"] == "c" and len(enhanced) == 3
+
+
+@pytest.mark.asyncio
+async def test_session_continuity_uses_one_grouped_query(service, monkeypatch):
+    """Message counts for every candidate session come from a single GROUP BY query."""
+    executed = []
+
+    class FakeSession:
+        async def execute(self, statement, params):
+            executed.append((statement, params))
+            return SimpleNamespace(fetchall=lambda: [("s1", 4), ("s2", 1)])
+
+    @asynccontextmanager
+    async def fake_session():
+        yield FakeSession()
+
+    monkeypatch.setattr(memory_intelligence_module.db_manager, "get_postgres_session", fake_session)
+
+    counts = await service._bulk_session_msg_counts(["s1", None, "s1", "s2", "s3"], "u1")
+    assert await service._bulk_session_msg_counts([None], "u1") == {}
+
+    assert counts == {"s1": 4, "s2": 1}
+    [(statement, params)] = executed
+    assert "GROUP BY session_id" in str(statement) and "ANY(:session_ids)" in str(statement)
+    assert sorted(params["session_ids"]) == ["s1", "s2", "s3"] and params["user_id"] == "u1"
+    scores = [
+        service._calculate_context_continuity({"session_id": sid}, counts)
+        for sid in ("s1", "s2", "s3", None)
+    ]
+    assert scores == [0.8, 0.6, 0.3, 0.3]
+
+
+SAMPLE_TEXTS = [
+    "",
+    "thanks! how do i treat pests and cbd on sl28 in nyeri this season?",
+    "harvest time: harvesting, pruning and spraying maize; the phone price rose",
+    "fertilizer vs fertilize vs fertilizing - ruiru 11 or batian near embu/meru",
+    "pesticide rainfall planting seedlings, drought problem yesterday",
+    "great, we sell robusta to the cooperative",
+]
+
+
+@pytest.mark.parametrize("text", SAMPLE_TEXTS)
+def test_keyword_scan_matches_substring_checks(text):
+    """One regex pass finds exactly the keywords a substring check would, including nested ones."""
+    keywords = set(memory_intelligence_module._CONTAINED_KEYWORDS)
+
+    assert memory_intelligence_module._scan_keywords(text) == {k for k in keywords if k in text}
+
+
+@pytest.mark.asyncio
+async def test_rule_based_analysis_reads_keyword_hits(service):
+    """Topics, type, entities and farming context come from the shared keyword scan."""
+    content = "Thanks! CBD hit my SL28 in Nyeri while harvesting coffee after the rain"
+
+    assert service._extract_farming_topics(content) == ["coffee", "pests", "weather", "harvest"]
+    assert service._classify_memory_type({"content": content}) == "positive_feedback"
+    assert await service._extract_key_entities(content) == ["variety:sl28", "location:nyeri"]
+    assert service._extract_farming_context(content) == {
+        "crop_mentioned": ["coffee"],
+        "activity_type": "harvesting",
+        "season_reference": None,
+        "problem_mentioned": True,
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("text", SAMPLE_TEXTS)
+async def test_keyword_lookups_match_table_order(service, text):
+    """Per-keyword lookups give the same topics, type and entities, in table order, as walking the tables."""
+    topics = [
+        topic for topic, keywords in memory_intelligence_module._FARMING_TOPIC_KEYWORDS.items()
+        if any(keyword in text for keyword in keywords)
+    ]
+    memory_type = next(
+        (kind for kind, keywords in memory_intelligence_module._MEMORY_TYPE_KEYWORDS
+         if any(keyword in text for keyword in keywords)),
+        "general_conversation"
+    )
+    entities = [
+        f"{kind}:{keyword}"
+        for kind, keywords in memory_intelligence_module._ENTITY_KEYWORDS
+        for keyword in keywords
+        if keyword in text
+    ]
+
+    assert service._extract_farming_topics(text) == topics
+    assert service._classify_memory_type({"content": text}) == memory_type
+    assert await service._extract_key_entities(text) == entities
+
+
+@pytest.mark.asyncio
+async def test_enhancement_scans_each_memory_once(service, monkeypatch):
+    """Type, entities and farming context share one lowercase-and-scan per memory."""
+    scanned = []
+    scan = memory_intelligence_module._scan_keywords
+    monkeypatch.setattr(memory_intelligence_module, "_scan_keywords", lambda text: scanned.append(text) or scan(text))
+    monkeypatch.setattr(
+        service.embedding_service, "create_batch_embeddings_async", AsyncMock(return_value=np.ones((2, 2)))
+    )
+    monkeypatch.setattr(service, "_bulk_session_msg_counts", AsyncMock(return_value={}))
+
+    [memory] = await service._enhance_memory_relevance([{"content": "Pruning SL28 in Nyeri"}], "q", "u1")
+
+    assert scanned == ["pruning sl28 in nyeri"]
+    assert memory["key_entities"] == ["variety:sl28", "location:nyeri"]
+    assert memory["farming_context"]["activity_type"] == "pruning"
+
+
+@pytest.mark.asyncio
+async def test_enhancement_annotates_memories_in_place(service, monkeypatch):
+    """Enhanced memories are the caller's dicts, annotated and reordered, not copies."""
+    monkeypatch.setattr(
+        service.embedding_service, "create_batch_embeddings_async",
+        AsyncMock(return_value=np.array([[1.0, 0.0], [0.0, 1.0], [0.0, 1.0]]))
+    )
+    monkeypatch.setattr(service, "_bulk_session_msg_counts", AsyncMock(return_value={}))
+    memories = [{"content": "Soil pH", "embedding": [0.1] * 384}, {"content": "Coffee harvest"}]
+
+    enhanced = await service._enhance_memory_relevance(memories, "harvest", "u1")
+
+    assert [id(memory) for memory in enhanced] == [id(memories[1]), id(memories[0])]
+    assert all("enhanced_relevance" in memory and "farming_context" in memory for memory in memories)
+
+
+@pytest.mark.asyncio
+async def test_keyword_analysis_runs_off_the_event_loop(service, monkeypatch):
+    """The batch's keyword scans happen in a worker thread; memories without text are left as they are."""
+    threads = []
+    scan = memory_intelligence_module._scan_keywords
+    monkeypatch.setattr(
+        memory_intelligence_module, "_scan_keywords",
+        lambda text: threads.append(threading.current_thread()) or scan(text)
+    )
+    monkeypatch.setattr(
+        service.embedding_service, "create_batch_embeddings_async", AsyncMock(return_value=np.ones((3, 2)))
+    )
+    monkeypatch.setattr(service, "_bulk_session_msg_counts", AsyncMock(return_value={}))
+
+    memories = await service._enhance_memory_relevance([{"content": "Coffee"}, {"session_id": "s1"}], "q", "u1")
+
+    assert threads and threading.main_thread() not in threads
+    assert [memory.get("memory_type") for memory in memories] == ["general_conversation", None]
+
+
+@pytest.mark.asyncio
+async def test_keyword_alignment_fallback_reuses_the_content_scan(service, monkeypatch):
+    """Without embeddings, topics for alignment come from the same scan; the query is scanned once."""
+    scanned = []
+    scan = memory_intelligence_module._scan_keywords
+    monkeypatch.setattr(memory_intelligence_module, "_scan_keywords", lambda text: scanned.append(text) or scan(text))
+    monkeypatch.setattr(
+        service.embedding_service, "create_batch_embeddings_async", AsyncMock(side_effect=RuntimeError("no model"))
+    )
+    monkeypatch.setattr(service, "_bulk_session_msg_counts", AsyncMock(return_value={}))
+
+    memories = await service._enhance_memory_relevance(
+        [{"content": "Coffee harvest"}, {"content": "Soil pH"}], "Harvest time", "u1"
+    )
+
+    assert sorted(scanned) == ["coffee harvest", "harvest time", "soil ph"]
+    assert [memory["relevance_factors"]["topic_alignment"] for memory in memories] == [1.0, 0.0]
+
+
+@pytest.mark.asyncio
+async def test_conversation_patterns_group_mentions_by_topic(monkeypatch):
+    """Insights count each topic's mentions and take first/last mentions from the grouped rows."""
+    service = MemoryIntelligenceService()
+    summarised = []
+
+    async def summarise(topic, conversations):
+        summarised.append((topic, [conv["content"] for conv in conversations]))
+        return f"{topic} summary"
+
+    monkeypatch.setattr(service, "_generate_topic_summary", summarise)
+    day = lambda d: datetime(2024, 6, d, tzinfo=timezone.utc)
+    rows = [
+        ("rain ruined drying", day(3), "s1"),
+        ("coffee price", day(9), "s2"),
+        ("more rain", day(1), "s3"),
+        ("coffee rust", day(5), "s1"),
+        ("coffee market", day(7), "s4"),
+    ]
+
+    insights = await service._analyze_conversation_patterns(rows)
+    frequent = await service._analyze_conversation_patterns(rows, min_frequency=3)
+
+    by_topic = {insight.topic: insight for insight in insights}
+    assert set(by_topic) == {"coffee", "weather", "market"}
+    coffee = by_topic["coffee"]
+    assert coffee.frequency == 3
+    assert (coffee.first_mentioned, coffee.last_mentioned) == (day(5), day(9))
+    assert coffee.related_conversations == ["s2", "s4", "s1"]
+    assert by_topic["weather"].related_conversations == ["s1", "s3"]
+    assert [insight.topic for insight in frequent] == ["coffee"]
+    assert ("coffee", ["coffee price", "coffee market", "coffee rust"]) in summarised
+
+
+@pytest.mark.asyncio
+async def test_topic_summaries_are_reused_for_similar_conversations(monkeypatch):
+    """A summary is generated once per semantically equivalent topic history, until it expires."""
+    service = MemoryIntelligenceService()
+    vectors = {"rust on sl28": [1.0, 0.0], "rust on my sl28": [0.99, 0.05], "fertilizer timing": [0.0, 1.0]}
+    monkeypatch.setattr(service.embedding_service, "create_embedding", AsyncMock(
+        side_effect=lambda text: np.array(vectors[text.split("|", 1)[1]], dtype=np.float32)
+    ))
+    generate = AsyncMock(side_effect=lambda messages: {"content": f"summary {generate.await_count}"})
+    monkeypatch.setattr(service.llm_client, "generate_response", generate)
+    conversations = lambda text: [{"content": text, "created_at": datetime(2024, 6, 1)}]
+
+    first = await service._generate_topic_summary("pests", conversations("rust on sl28"))
+    repeat = await service._generate_topic_summary("pests", conversations("rust on my sl28"))
+    other = await service._generate_topic_summary("pests", conversations("fertilizer timing"))
+
+    assert first == repeat == "summary 1" and other == "summary 2"
+    assert generate.await_count == 2
+
+    service._summary_cache["pests"].payloads[0]["created_at"] -= memory_intelligence_module._SUMMARY_CACHE_TTL_SECONDS
+    assert await service._generate_topic_summary("pests", conversations("rust on sl28")) == "summary 3"
+    assert await service._generate_topic_summary("pests", conversations("rust on sl28")) == "summary 3"
+    assert len(service._summary_cache["pests"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_topic_summaries_run_concurrently_within_the_limit(monkeypatch):
+    """Summaries for different topics overlap, never more than the shared limit at once."""
+    monkeypatch.setattr(memory_intelligence_module, "_SUMMARY_CONCURRENCY", 2)
+    service = MemoryIntelligenceService()
+    running, peak = 0, 0
+
+    async def summarise(topic, conversations):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return f"{topic} summary"
+
+    monkeypatch.setattr(service, "_generate_topic_summary", summarise)
+    when = datetime(2024, 6, 1, tzinfo=timezone.utc)
+    rows = [("coffee rain harvest soil price", when, f"s{i}") for i in range(2)]
+
+    insights = await service._analyze_conversation_patterns(rows)
+
+    assert peak == 2
+    assert {insight.topic: insight.summary for insight in insights} == {
+        topic: f"{topic} summary" for topic in ("coffee", "weather", "harvest", "soil", "market")
+    }
+
+
+@pytest.mark.asyncio
+async def test_recency_uses_stored_epoch_without_parsing(service, monkeypatch):
+    """Memories carrying an epoch are aged by subtraction; ISO timestamps still work."""
+    monkeypatch.setattr(service, "_calculate_topic_alignment", AsyncMock(return_value=0.0))
+    now = datetime.now(timezone.utc).timestamp()
+    three_days_ago = now - 3 * 86400 - 60
+
+    from_epoch = await service._calculate_enhanced_relevance(
+        {"content": "x", "timestamp_epoch": three_days_ago, "timestamp": "not parsed"}, "q", "u1",
+        session_counts={}, now_epoch=now
+    )
+    from_iso = await service._calculate_enhanced_relevance(
+        {"content": "x", "timestamp": datetime.fromtimestamp(three_days_ago, timezone.utc).isoformat()}, "q", "u1",
+        session_counts={}
+    )
+    undated = await service._calculate_enhanced_relevance(
+        {"content": "x", "timestamp": None, "similarity_score": 0.5}, "q", "u1", session_counts={}
+    )
+
+    assert from_epoch["recency_score"] == from_iso["recency_score"] == pytest.approx(0.9)
+    assert undated["recency_score"] == 0.0 and undated["total_score"] != undated["semantic_similarity"]
+
+
+@pytest.mark.asyncio
+async def test_iso_timestamps_are_aged_against_the_callers_clock(service, monkeypatch):
+    """ISO-only memories use the batch's now_epoch too; naive timestamps read as UTC."""
+    monkeypatch.setattr(service, "_calculate_topic_alignment", AsyncMock(return_value=0.0))
+    now = datetime(2024, 3, 31, 12, tzinfo=timezone.utc).timestamp()
+
+    scores = [
+        (await service._calculate_enhanced_relevance(
+            {"content": "x", "timestamp": timestamp}, "q", "u1", session_counts={}, now_epoch=now
+        ))["recency_score"]
+        for timestamp in ("2024-03-16T12:00:00", "2024-03-16T15:00:00+03:00", "2024-03-16T12:00:00Z")
+    ]
+
+    assert scores == [pytest.approx(0.5)] * 3
+
+
+def test_fallback_analysis_ranks_topics_by_message_count():
+    """Topics come from one scan per message, most mentioned first."""
+    service = MemoryIntelligenceService()
+    messages = [
+        ("When should I sell?", "user", None, 0),
+        ("Prices rise after harvest; check the market.", "assistant", None, 0),
+        ("Market prices for coffee", "user", None, 0),
+    ]
+
+    analysis = service._fallback_conversation_analysis(messages)
+
+    assert analysis["key_topics"] == ["market", "harvest", "coffee"]
+    assert analysis["summary"] == "Conversation about market, harvest, coffee with 2 farmer questions."
+
+
+@pytest.mark.asyncio
+async def test_insights_are_grouped_in_postgres_when_topics_column_exists(monkeypatch):
+    """Counts and sessions come from a GROUP BY over the topics column; only recent messages are fetched."""
+    day = lambda d: datetime(2024, 6, d, tzinfo=timezone.utc)
+    executed = []
+
+    class FakeSession:
+        async def execute(self, statement, params=None):
+            executed.append((str(statement), params))
+            if "GROUP BY topic" in str(statement):
+                rows = [("coffee", 3, day(1), day(9), ["s2", "s1", "s1"])]
+            elif "row_number()" in str(statement):
+                rows = [("coffee", "coffee price", day(9), "s2"), ("coffee", "coffee rust", day(5), "s1")]
+            else:
+                rows = []
+            return SimpleNamespace(fetchall=lambda: rows)
+
+        async def commit(self):
+            pass
+
+    @asynccontextmanager
+    async def fake_session():
+        yield FakeSession()
+
+    monkeypatch.setattr(memory_intelligence_module.db_manager, "get_postgres_session", fake_session)
+    service = MemoryIntelligenceService()
+    summarise = AsyncMock(return_value="coffee summary")
+    monkeypatch.setattr(service, "_generate_topic_summary", summarise)
+    monkeypatch.setattr(
+        memory_intelligence_module, "_insight_importances", lambda frequencies, *args: np.full(len(frequencies), 0.9)
+    )
+
+    [insight] = await service.get_memory_insights("u1", min_frequency=3)
+
+    assert executed[0][1]["min_frequency"] == 3 and executed[1][1]["topics"] == ["coffee"]
+    assert len(executed) == 2
+    assert (insight.topic, insight.frequency, insight.related_conversations) == ("coffee", 3, ["s2", "s1", "s1"])
+    assert (insight.first_mentioned, insight.last_mentioned) == (day(1), day(9))
+    summarise.assert_awaited_once()
+    assert [conv["content"] for conv in summarise.await_args.args[1]] == ["coffee price", "coffee rust"]
+
+
+@pytest.mark.asyncio
+async def test_insights_fall_back_to_python_without_topics_column(monkeypatch):
+    """A schema without the topics column switches to the Python scan once, without altering the table."""
+    service = MemoryIntelligenceService()
+    missing = ProgrammingError("SELECT", {}, Exception('column "topics" does not exist'))
+    aggregate = AsyncMock(side_effect=missing)
+    scan = AsyncMock(return_value=[])
+    monkeypatch.setattr(service, "_aggregate_topic_insights", aggregate)
+    monkeypatch.setattr(service, "_scan_topic_insights", scan)
+
+    assert await service.get_memory_insights("u1") == []
+    assert await service.get_memory_insights("u2") == []
+
+    aggregate.assert_awaited_once()
+    assert scan.await_count == 2
+
+
+def test_message_topics_match_the_python_scan():
+    """Topics written with a message are the ones the Python scan extracts from its content."""
+    content = "My coffee leaves have rust, when should I spray before harvest?"
+
+    assert memory_intelligence_module.message_topics(content) == list(
+        memory_intelligence_module._content_topics(content)
+    )
+    assert memory_intelligence_module.message_topics(content)
+
+
+def test_insight_importances_count_whole_days():
+    """Topics are scored in one vectorised call, counting whole days for recency and consistency."""
+    now = datetime(2024, 6, 30, 12, tzinfo=timezone.utc).timestamp()
+    day = 86400.0
+    frequencies = np.array([1.0, 4.0, 12.0, 2.0])
+    first = np.array([now - 40 * day, now - 20 * day, now - 3 * day, now - 1.5 * day])
+    last = np.array([now - 35 * day, now - 2.9 * day, now, now - 0.5 * day])
+
+    scores = memory_intelligence_module._insight_importances(frequencies, first, last, now)
+
+    # 12 mentions, mentioned just now, over a 3-day span
+    assert scores[2] == pytest.approx(0.4 + 0.35 + 0.25 * 3 / 14)
+    # 2.9 days since the last mention counts as 2 whole days
+    assert scores[1] == pytest.approx(0.4 * 0.4 + 0.35 * (1 - 2 / 30) + 0.25 * 1.0)
+
+
+@pytest.mark.parametrize("content, expected", [
+    ('{"summary": "ok"}', {"summary": "ok"}),
+    ('Here is the analysis:\n```json\n{"summary": "ok", "key_topics": ["coffee"]}\n```', {"summary": "ok", "key_topics": ["coffee"]}),
+    ("No JSON here", None),
+    ('{"summary": ', None),
+    ('["coffee"]', None),
+])
+def test_llm_json_is_extracted_from_surrounding_text(content, expected):
+    """Replies wrapping the JSON object in prose still parse; anything else is rejected."""
+    assert memory_intelligence_module._parse_llm_json(content) == expected
+
+
+@pytest.mark.asyncio
+async def test_conversation_summary_requests_json_and_parses_wrapped_reply(monkeypatch):
+    """The summary asks for a JSON object and accepts one embedded in prose without falling back."""
+    service = MemoryIntelligenceService()
+    generate = AsyncMock(return_value={"content": 'Sure! {"summary": "Coffee rust", "key_topics": ["pests"]}'})
+    monkeypatch.setattr(service.llm_client, "generate_response", generate)
+    monkeypatch.setattr(service, "_fallback_conversation_analysis", lambda data: {"fallback": True})
+
+    messages = [("Orange powder is spreading under my SL28 leaves after the rains. " * 2, "user", None, None)] * 4
+
+    analysis = await service._generate_conversation_summary(messages)
+
+    assert analysis == {"summary": "Coffee rust", "key_topics": ["pests"]}
+    assert generate.await_args.kwargs["response_format"] == {"type": "json_object"}
+
+
+@pytest.mark.asyncio
+async def test_insight_scan_streams_rows_and_keeps_only_topic_mentions(monkeypatch):
+    """The Python fallback reads rows from a cursor and hands over only messages with topics, scanned once."""
+    rows = [("coffee rust", 2, "s1"), ("hello there", 1, "s2"), ("more rain", 0, "s3")]
+    stream = FakeStream(rows)
+
+    class FakeSession:
+        async def stream(self, statement, params=None):
+            return stream
+
+    @asynccontextmanager
+    async def fake_session():
+        yield FakeSession()
+
+    monkeypatch.setattr(memory_intelligence_module.db_manager, "get_postgres_session", fake_session)
+    service = MemoryIntelligenceService()
+    analyze = AsyncMock(return_value=[])
+    monkeypatch.setattr(service, "_analyze_conversation_patterns", analyze)
+
+    await service._scan_topic_insights("u1", datetime(2024, 1, 1), 2)
+
+    assert stream.consumed == 3
+    assert analyze.await_args.args == ([rows[0], rows[2]], 2)
+    assert analyze.await_args.kwargs == {"row_topics": [("coffee",), ("weather",)]}
+
+
+def test_context_confidence_averages_scores_and_boosts_strong_memories():
+    """Confidence is the mean relevance plus 0.1 per memory above 0.7, boost capped at 0.2."""
+    service = MemoryIntelligenceService()
+
+    assert service._calculate_context_confidence([]) == 0.0
+    assert service._calculate_context_confidence(
+        [{"enhanced_relevance": 0.8}, {"similarity_score": 0.4}, {}]
+    ) == pytest.approx(0.4 + 0.1)
+    assert service._calculate_context_confidence(
+        [{"enhanced_relevance": 0.75}] * 3 + [{"enhanced_relevance": 0.25}]
+    ) == pytest.approx(0.625 + 0.2)
+    assert service._calculate_context_confidence([{"enhanced_relevance": 0.95}] * 2) == 1.0
+
+
+def test_content_topics_are_memoised_by_digest(monkeypatch):
+    """Repeated message texts are served from the LRU without rescanning; the oldest entry is evicted."""
+    monkeypatch.setattr(memory_intelligence_module, "_CONTENT_TOPICS_CACHE_SIZE", 2)
+    monkeypatch.setattr(memory_intelligence_module, "_content_topics_cache", memory_intelligence_module.OrderedDict())
+    scanned = []
+    scan = memory_intelligence_module._scan_keywords
+    monkeypatch.setattr(memory_intelligence_module, "_scan_keywords", lambda text: scanned.append(text) or scan(text))
+    content_topics = memory_intelligence_module._content_topics
+
+    assert content_topics("Coffee rust after rain") == ("coffee", "weather")
+    assert content_topics("Coffee rust after rain") == ("coffee", "weather")
+    content_topics("soil ph")
+    content_topics("coffee rust after rain")
+
+    assert scanned == ["coffee rust after rain", "soil ph", "coffee rust after rain"]
+    assert len(memory_intelligence_module._content_topics_cache) == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("messages", [
+    [("How do I prune coffee? " * 10, "user", None, None)] * 3,
+    [("Coffee rust?", "user", None, None)] * 6,
+])
+async def test_short_conversations_are_summarised_without_the_llm(monkeypatch, messages):
+    """Sessions under four messages or 400 characters get the keyword summary directly."""
+    service = MemoryIntelligenceService()
+    generate = AsyncMock()
+    monkeypatch.setattr(service.llm_client, "generate_response", generate)
+
+    analysis = await service._generate_conversation_summary(messages)
+
+    generate.assert_not_awaited()
+    assert analysis["key_topics"] == ["coffee"]
@@ -0,0 +1,147 @@
+"""
+Tests for weather-based disease and pest risk prediction.
+"""
+
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.services import predictive_analytics as predictive_analytics_module
+from app.services.predictive_analytics import PredictiveAnalyticsService, RiskLevel
+
+
+def scalar_day_risks(factors, forecast):
+    """Per-day risk scores computed one comparison at a time."""
+    risks = []
+    for day in forecast:
+        temp_avg = (day["temperature_range"][0] + day["temperature_range"][1]) / 2
+        day_risk = 0
+        if factors["temperature_range"][0] <= temp_avg <= factors["temperature_range"][1]:
+            day_risk += 0.3
+        if day["rainfall_amount"] > factors["rainfall_threshold"] / 10:
+            day_risk += 0.4
+        if day["rainfall_amount"] > factors["rainfall_threshold"] / 30:
+            day_risk += 0.3
+        risks.append(day_risk)
+    return risks
+
+
+@pytest.mark.asyncio
+async def test_vectorised_risks_match_per_day_scoring():
+    """Risk days, scores and levels agree with scoring each forecast day separately."""
+    service = PredictiveAnalyticsService()
+    forecast = [
+        {"temperature_range": (low, low + 8), "rainfall_amount": rain}
+        for low, rain in [(10, 0.0), (14, 2.0), (16, 6.0), (20, 12.0), (11, 16.0), (24, 1.0), (15, 40.0)]
+    ]
+
+    predictions = await service._predict_disease_pest_risks(forecast)
+
+    assert set(predictions) == set(service.risk_factors)
+    for disease, factors in service.risk_factors.items():
+        risky = [risk for risk in scalar_day_risks(factors, forecast) if risk > 0.5]
+        avg_risk = sum(risky) / len(forecast)
+        assert predictions[disease]["high_risk_days"] == len(risky)
+        assert predictions[disease]["risk_score"] == round(avg_risk, 2)
+        assert predictions[disease]["risk_level"] == service._calculate_risk_level(avg_risk, len(risky)).value
+
+
+@pytest.mark.asyncio
+async def test_empty_forecast_has_no_risk():
+    """Without forecast days every disease is low risk."""
+    predictions = await PredictiveAnalyticsService()._predict_disease_pest_risks([])
+
+    assert all(
+        (prediction["risk_score"], prediction["high_risk_days"], prediction["risk_level"]) == (0, 0, "low")
+        for prediction in predictions.values()
+    )
+
+
+@pytest.mark.parametrize("date, current, following", [
+    (datetime(2024, 3, 14), "dry_season_2", "long_rains"),
+    (datetime(2024, 3, 15), "long_rains", "dry_season_1"),
+    (datetime(2024, 9, 30), "dry_season_1", "short_rains"),
+    (datetime(2024, 12, 31), "short_rains", "dry_season_2"),
+    (datetime(2025, 1, 1), "dry_season_2", "long_rains"),
+])
+def test_seasons_are_found_from_month_day_integers(date, current, following):
+    """Season boundaries are inclusive and the calendar wraps from the last season to the first."""
+    service = PredictiveAnalyticsService()
+
+    assert service._get_current_season(date) == current
+    assert service._get_next_season(date) == following
+
+
+def test_calendar_tables_are_shared_and_parsed_once():
+    """Instances share the module tables; season dates are precomputed as MMDD integers."""
+    first, second = PredictiveAnalyticsService(), PredictiveAnalyticsService()
+
+    assert first.coffee_calendar is second.coffee_calendar is predictive_analytics_module._COFFEE_CALENDAR
+    assert first.risk_factors is second.risk_factors
+    assert predictive_analytics_module._SEASONS[0] == ("long_rains", 315, 531)
+    assert first._days_until_season_end(datetime(2024, 5, 30), "long_rains") == 1
+    assert first._days_until_season_start(datetime(2024, 12, 31), "dry_season_2") == 1
+    assert first._get_prevention_advice("coffee_leaf_rust", RiskLevel.HIGH).startswith("Systemic fungicide")
+
+
+@pytest.mark.asyncio
+async def test_forecast_is_read_once_for_risk_and_yield(monkeypatch):
+    """Full predictions build the temperature and rainfall arrays once and feed both models."""
+    service = PredictiveAnalyticsService()
+    forecast = [{"temperature_range": (16, 26), "rainfall_amount": 20.0}] * 14
+    calls = []
+    build = predictive_analytics_module._forecast_arrays
+    monkeypatch.setattr(predictive_analytics_module, "_forecast_arrays", lambda days: calls.append(days) or build(days))
+    monkeypatch.setattr(service, "_get_weather_predictions", AsyncMock(return_value=forecast))
+    monkeypatch.setattr(service, "_get_activity_recommendations", AsyncMock(return_value=[]))
+
+    predictions = await service.get_farming_predictions(0.4, 36.9)
+
+    assert len(calls) == 1
+    assert predictions["yield_predictions"]["predicted_impact"] == "+35.0%"
+    assert predictions["yield_predictions"] == await service._predict_yield_impacts(forecast, None)
+
+
+@pytest.mark.asyncio
+async def test_independent_sub_predictions_overlap(monkeypatch):
+    """Weather and seasonal lookups run together, then risk, activity and yield predictions run together."""
+    service = PredictiveAnalyticsService()
+    forecast = [{"temperature_range": (16, 26), "rainfall_amount": 20.0}] * 3
+    running, peaks = set(), []
+
+    def overlapping(name, result):
+        async def step(*args, **kwargs):
+            running.add(name)
+            await asyncio.sleep(0.01)
+            peaks.append(set(running))
+            running.discard(name)
+            return result
+        return step
+
+    monkeypatch.setattr(service, "_get_weather_predictions", overlapping("weather", forecast))
+    monkeypatch.setattr(service, "_get_seasonal_predictions", overlapping("seasonal", {}))
+    monkeypatch.setattr(service, "_predict_disease_pest_risks", overlapping("risks", {}))
+    monkeypatch.setattr(service, "_get_activity_recommendations", overlapping("activities", []))
+    monkeypatch.setattr(service, "_predict_yield_impacts", overlapping("yield", {}))
+
+    predictions = await service.get_farming_predictions(0.4, 36.9)
+
+    assert {"weather", "seasonal"} in peaks and {"risks", "activities", "yield"} in peaks
+    assert predictions["weather_predictions"] == forecast
+
+
+@pytest.mark.asyncio
+async def test_malformed_forecast_day_only_fails_the_models_that_read_it(monkeypatch):
+    """A forecast day without rainfall degrades the risk and yield models, not the whole prediction."""
+    service = PredictiveAnalyticsService()
+    forecast = [{"temperature_range": (16, 26), "rainfall_amount": 20.0}, {"temperature_range": (16, 26)}]
+    monkeypatch.setattr(service, "_get_weather_predictions", AsyncMock(return_value=forecast))
+    monkeypatch.setattr(service, "_get_activity_recommendations", AsyncMock(return_value=["mulch"]))
+
+    predictions = await service.get_farming_predictions(0.4, 36.9)
+
+    assert "error" not in predictions
+    assert predictions["weather_predictions"] == forecast
+    assert predictions["activity_recommendations"] == ["mulch"]
@@ -0,0 +1,67 @@
+"""
+Tests for weather lookup caching.
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.services import weather_service as weather_module
+from app.services.weather_service import OpenMeteoWeatherService
+
+CURRENT = {"current": {"temperature_2m": 21.0, "relative_humidity_2m": 70, "precipitation": 0,
+                       "wind_speed_10m": 4.0, "weather_code": 1}}
+DAILY = {"daily": {"time": ["2024-04-02"], "temperature_2m_max": [25.0], "temperature_2m_min": [14.0],
+                   "precipitation_sum": [2.0], "precipitation_probability_max": [40],
+                   "wind_speed_10m_max": [9.0], "weather_code": [3]}}
+
+
+@pytest.fixture
+def requests():
+    return []
+
+
+@pytest.fixture
+def service(requests):
+    async def handler(request):
+        requests.append(request)
+        await asyncio.sleep(0.01)
+        body = DAILY if "daily" in request.url.params else CURRENT
+        return httpx.Response(200, json=body)
+
+    return OpenMeteoWeatherService(client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+@pytest.mark.asyncio
+async def test_nearby_lookups_share_one_request(service, requests):
+    """Coordinates that round to the same grid cell reuse the cached response."""
+    first = await service.get_current_weather(-0.41671, 36.95002)
+    second = await service.get_current_weather(-0.4168, 36.9501)
+
+    assert first is second
+    assert len(requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_are_deduplicated(service, requests):
+    """Concurrent callers for the same key wait for a single fetch."""
+    results = await asyncio.gather(*(service.get_forecast(-0.4167, 36.95, days=3) for _ in range(5)))
+
+    assert all(result == results[0] for result in results)
+    assert len(requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_expires_and_skips_failures(service, requests, monkeypatch):
+    """Entries expire after the TTL, and failed lookups are not cached."""
+    await service.get_forecast(-0.4167, 36.95, days=3)
+    monkeypatch.setattr(weather_module, "_CACHE_TTL_SECONDS", 0)
+    await service.get_forecast(-0.4167, 36.95, days=3)
+    assert len(requests) == 2
+
+    async def failing_fetch():
+        return None
+
+    assert await service._get_cached(("current", 0.0, 0.0, None), failing_fetch) is None
+    assert ("current", 0.0, 0.0, None) not in service._cache